@@ -151,6 +151,18 @@ else:
         }
     }
 
+# Search index epochs and the result-cache generation live in the default cache, so it has to be
+# shared by every worker process. The database table needs `python manage.py createcachetable`;
+# point CACHE_BACKEND/CACHE_LOCATION at Redis or Memcached for larger deployments.
+CACHES = {
+    "default": {
+        "BACKEND": config("CACHE_BACKEND", default="django.core.cache.backends.db.DatabaseCache"),
+        "LOCATION": config("CACHE_LOCATION", default="core_cache"),
+    }
+}
+# Startup refuses a process-local default cache unless this is turned off (single-process runs).
+SHARED_CACHE_REQUIRED = config("SHARED_CACHE_REQUIRED", default=not DEBUG, cast=bool)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -195,6 +207,34 @@ LLM_BASE_URL = config("LLM_BASE_URL", default="http://127.0.0.1:11434/v1").strip
 LLM_API_KEY = config("LLM_API_KEY", default="local-dev-key").strip()
 LLM_MODEL = config("LLM_MODEL", default="gpt-oss-20b").strip()
 GO_RERANKER_URL = config("GO_RERANKER_URL", default="http://127.0.0.1:8088/rank").strip()
+# Workers also rebuild their in-process search structures this often, bounding how long ranking
+# statistics lag edits made by other processes; 0 rebuilds only when the shared epoch changes.
+SEARCH_INDEX_MAX_AGE_SECONDS = config("SEARCH_INDEX_MAX_AGE_SECONDS", default=900, cast=int)
+# Each structure reads the shared epoch, and each worker the catalog generation, at most this often,
+# so lookups like autocomplete do not hit the cache on every keystroke; 0 reads them on every lookup.
+SEARCH_EPOCH_CHECK_SECONDS = config("SEARCH_EPOCH_CHECK_SECONDS", default=5, cast=int)
+# "local" keeps a per-process LRU, "django" uses the configured cache framework, "off" disables caching.
+SEARCH_CACHE_BACKEND = config("SEARCH_CACHE_BACKEND", default="local").strip().lower()
+SEARCH_CACHE_TTL_SECONDS = config("SEARCH_CACHE_TTL_SECONDS", default=60, cast=int)
+SEARCH_CACHE_MAX_ENTRIES = config("SEARCH_CACHE_MAX_ENTRIES", default=512, cast=int)
+# Hybrid and vectorized rerank this many lexical candidates and keep the top `limit`; 0 reranks just `limit`.
+SEARCH_RERANK_POOL = config("SEARCH_RERANK_POOL", default=0, cast=int)
+SEARCH_TYPO_TOLERANCE = config("SEARCH_TYPO_TOLERANCE", default=True, cast=bool)
+SEARCH_PAGE_SIZE = config("SEARCH_PAGE_SIZE", default=24, cast=int)
+SEARCH_MAX_PAGE_SIZE = config("SEARCH_MAX_PAGE_SIZE", default=100, cast=int)
+# The "hedged" strategy races hybrid, inmemory and baseline and answers with the best result set at this deadline.
+SEARCH_HEDGE_BUDGET_MS = config("SEARCH_HEDGE_BUDGET_MS", default=150, cast=int)
+SEARCH_HEDGE_WORKERS = config("SEARCH_HEDGE_WORKERS", default=6, cast=int)
+# Streaming sends the search page shell first, then result cards in batches of SEARCH_STREAM_BATCH_SIZE.
+SEARCH_STREAM_RESULTS = config("SEARCH_STREAM_RESULTS", default=False, cast=bool)
+SEARCH_STREAM_BATCH_SIZE = config("SEARCH_STREAM_BATCH_SIZE", default=24, cast=int)
+SEARCH_STREAM_MAX_RESULTS = config("SEARCH_STREAM_MAX_RESULTS", default=200, cast=int)
+# Batch circulation commits every CIRCULATION_BATCH_CHUNK_SIZE items; 0 runs the whole batch in one transaction.
+CIRCULATION_BATCH_MAX_ITEMS = config("CIRCULATION_BATCH_MAX_ITEMS", default=500, cast=int)
+CIRCULATION_BATCH_CHUNK_SIZE = config("CIRCULATION_BATCH_CHUNK_SIZE", default=0, cast=int)
+# sweep_circulation marks overdue loans and expires lapsed holds this many rows per UPDATE.
+CIRCULATION_SWEEP_BATCH_SIZE = config("CIRCULATION_SWEEP_BATCH_SIZE", default=1000, cast=int)
+CIRCULATION_SWEEP_INTERVAL_SECONDS = config("CIRCULATION_SWEEP_INTERVAL_SECONDS", default=60, cast=int)
 
 AUTH0_ENABLED = config("AUTH0_ENABLED", default=False, cast=bool)
 AUTH0_DOMAIN = config("AUTH0_DOMAIN", default="").strip()
@@ -16,6 +16,14 @@ DATABASES = {
     }
 }
 
+# Cache invalidation runs on commit, which TestCase never reaches
+SEARCH_CACHE_BACKEND = "off"
+
+# Tests run in one process, so the epoch and generation keys can stay in memory
+CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+SHARED_CACHE_REQUIRED = False
+SEARCH_EPOCH_CHECK_SECONDS = 0
+
 # Speed up tests
 PASSWORD_HASHERS = [
     'django.contrib.auth.hashers.MD5PasswordHasher',
@@ -8,9 +8,12 @@ from core.views import (
     ai_concierge,
     auth0_callback,
     auth0_login,
+    autocomplete,
     book_page,
+    circulation_batch,
     checkin,
     checkout,
+    checkout_copy,
     isbn_lookup,
     index,
     logout_view,
@@ -35,7 +38,10 @@ urlpatterns = [
     path('resource.html', resource_view),
     path("api/isbn-lookup/", isbn_lookup, name="isbn_lookup"),
     path("api/ai-concierge/", ai_concierge, name="ai_concierge"),
+    path("api/autocomplete/", autocomplete, name="autocomplete"),
+    path("api/circulation/batch/", circulation_batch, name="circulation_batch"),
     path('checkout/<str:isbn>/', checkout, name='checkout'),
+    path('checkout/copy/<str:barcode>/', checkout_copy, name='checkout_copy'),
     path('checkin/', checkin, name='checkin'),
     path('advanced-search/', AdvancedSearchResults.as_view(), name='advanced_search_results'),
     path('advanced_search_results/', AdvancedSearchResults.as_view()),
@@ -65,9 +65,9 @@ def fallback_concierge(prompt, reading_goal="reading"):
             limit=12,
         )
         candidates = list(response.queryset[:12])
-        ranked = rank_candidates(parsed_intent["search_query"], parsed_intent, candidates)
+        ranked = rank_candidates(parsed_intent["search_query"], parsed_intent, candidates, limit=4)
         books = []
-        for book, _score, reason in ranked[:4]:
+        for book, _score, reason in ranked:
             books.append(
                 {
                     "id": book.id,
@@ -7,3 +7,6 @@ class CoreConfig(AppConfig):
 
     def ready(self):
         from . import signals  # noqa: F401
+        from .discovery.result_cache import require_shared_cache
+
+        require_shared_cache()
@@ -0,0 +1,197 @@
+import bisect
+import heapq
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from core.models import Bookinventory, Loan
+from core.discovery.inverted_index import INDEX_EPOCH_CACHE_KEY, index_is_stale
+
+
+COMPLETION_FIELDS = ("title", "author", "genre")
+MEMOIZED_PREFIXES = 1024
+
+
+def normalize(text):
+    return " ".join((text or "").lower().split())
+
+
+def completion_keys(label):
+    # Every word start is a key, so "hist" completes "Roman History" as well as "History of Rome".
+    normalized = normalize(label)
+    keys = [normalized]
+    for index, char in enumerate(normalized):
+        if char == " " and index + 1 < len(normalized):
+            keys.append(normalized[index + 1 :])
+    return keys
+
+
+class PrefixIndex:
+    def __init__(self):
+        self._keys = []
+        self._targets = []
+        self._labels = {}
+        self._book_targets = {}
+        self._loans = defaultdict(int)
+        self._memo = OrderedDict()
+        self._lock = threading.RLock()
+        self.built_at = None
+        self.checked_at = None
+        self.epoch = None
+
+    def __len__(self):
+        return len(self._keys)
+
+    def build(self, books, loan_counts):
+        with self._lock:
+            self._keys, self._targets = [], []
+            self._labels, self._book_targets = {}, {}
+            self._loans = defaultdict(int, loan_counts)
+            pairs = []
+            for book in books:
+                for target, label in self._register(book):
+                    pairs.extend((key, target) for key in completion_keys(label))
+            pairs.sort()
+            self._keys = [key for key, _target in pairs]
+            self._targets = [target for _key, target in pairs]
+            self._memo.clear()
+            self.built_at = time.monotonic()
+
+    def add(self, book):
+        with self._lock:
+            self._remove(book.pk)
+            for target, label in self._register(book):
+                for key in completion_keys(label):
+                    position = bisect.bisect_right(self._keys, key)
+                    self._keys.insert(position, key)
+                    self._targets.insert(position, target)
+            self._memo.clear()
+
+    def remove(self, book_id):
+        with self._lock:
+            self._remove(book_id)
+            self._memo.clear()
+
+    def record_loan(self, book_id):
+        with self._lock:
+            self._loans[book_id] += 1
+            for target in self._book_targets.get(book_id, ()):
+                self._labels[target]["circulation"] += 1
+            self._memo.clear()
+
+    def complete(self, prefix, limit=8):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            memo_key = (prefix, limit)
+            if memo_key in self._memo:
+                self._memo.move_to_end(memo_key)
+                return self._memo[memo_key]
+
+            start = bisect.bisect_left(self._keys, prefix)
+            end = bisect.bisect_left(self._keys, prefix + "\uffff", lo=start)
+            ranked = heapq.nsmallest(limit, set(self._targets[start:end]), key=self._rank_key)
+            results = [self._describe(target) for target in ranked]
+
+            self._memo[memo_key] = results
+            if len(self._memo) > MEMOIZED_PREFIXES:
+                self._memo.popitem(last=False)
+            return results
+
+    def _register(self, book):
+        registered = []
+        targets = []
+        for field in COMPLETION_FIELDS:
+            label = (getattr(book, field, "") or "").strip()
+            if not label:
+                continue
+            # Titles complete to a specific book; authors and genres aggregate across the shelf.
+            target = ("title", book.pk) if field == "title" else (field, normalize(label))
+            entry = self._labels.get(target)
+            is_new = entry is None
+            if is_new:
+                entry = self._labels[target] = {"label": label, "books": set(), "circulation": 0}
+            entry["books"].add(book.pk)
+            entry["circulation"] += self._loans.get(book.pk, 0)
+            targets.append(target)
+            if is_new:
+                registered.append((target, label))
+        self._book_targets[book.pk] = targets
+        return registered
+
+    def _remove(self, book_id):
+        for target in self._book_targets.pop(book_id, ()):
+            entry = self._labels.get(target)
+            if entry is None:
+                continue
+            entry["books"].discard(book_id)
+            entry["circulation"] -= self._loans.get(book_id, 0)
+            if entry["books"]:
+                continue
+            del self._labels[target]
+            for key in completion_keys(entry["label"]):
+                position = bisect.bisect_left(self._keys, key)
+                while position < len(self._keys) and self._keys[position] == key:
+                    if self._targets[position] == target:
+                        del self._keys[position]
+                        del self._targets[position]
+                        break
+                    position += 1
+
+    def _rank_key(self, target):
+        entry = self._labels[target]
+        return (-entry["circulation"], -len(entry["books"]), entry["label"].lower(), target[0])
+
+    def _describe(self, target):
+        kind, value = target
+        entry = self._labels[target]
+        completion = {"type": kind, "label": entry["label"]}
+        if kind == "title":
+            completion["book_id"] = value
+        else:
+            completion["book_count"] = len(entry["books"])
+        return completion
+
+
+_index = PrefixIndex()
+_build_lock = threading.Lock()
+
+
+def get_autocomplete():
+    if index_is_stale(_index):
+        with _build_lock:
+            if index_is_stale(_index):
+                _build(_index)
+    return _index
+
+
+def reset_autocomplete():
+    with _build_lock:
+        _index.build([], {})
+        _index.built_at = None
+
+
+def autocomplete_book(book):
+    if _index.built_at is not None:
+        _index.add(book)
+
+
+def unautocomplete_book(book_id):
+    if _index.built_at is not None:
+        _index.remove(book_id)
+
+
+def record_loan(book_id):
+    if _index.built_at is not None:
+        _index.record_loan(book_id)
+
+
+def _build(index):
+    index.epoch = cache.get(INDEX_EPOCH_CACHE_KEY)
+    loan_counts = dict(Loan.objects.values_list("inventory_id").annotate(total=Count("id")).order_by())
+    books = Bookinventory.objects.only("id", *COMPLETION_FIELDS).order_by("id").iterator(chunk_size=2000)
+    index.build(books, loan_counts)
@@ -0,0 +1,263 @@
+import threading
+import time
+from collections import defaultdict
+from datetime import date
+
+from django.core.cache import cache
+from django.db import connection
+
+from core.filtering import FTS_TOKEN_RE, plan_filters, plan_text
+from core.models import Bookinventory
+from core.query_language import And, Field, Not, QuerySyntaxError, parse, year_bounds
+from core.discovery.inverted_index import INDEX_EPOCH_CACHE_KEY, index_is_stale
+
+
+VALUE_FIELDS = ("genre", "audience", "language")
+# Availability is left to SQL: circulation moves it with .update() calls that never reach these bitmaps.
+BITMAP_FIELDS = {*VALUE_FIELDS, "published_date"}
+# Bit positions of every byte value, so expanding a bitmap only visits the bytes that have members.
+BYTE_BITS = tuple(tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256))
+
+
+def bitmap_from_ids(ids):
+    ids = list(ids)
+    if not ids:
+        return 0
+    data = bytearray(max(ids) // 8 + 1)
+    for book_id in ids:
+        data[book_id >> 3] |= 1 << (book_id & 7)
+    return int.from_bytes(data, "little")
+
+
+def bitmap_ids(bitmap):
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    return [offset * 8 + bit for offset, byte in enumerate(data) if byte for bit in BYTE_BITS[byte]]
+
+
+def union(bitmaps):
+    result = 0
+    for bitmap in bitmaps:
+        result |= bitmap
+    return result
+
+
+def parse_date(value):
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+
+
+class BitmapIndex:
+    # One Python int per attribute value, bit n set for book id n; filters become & and | over ints.
+    def __init__(self):
+        self._all = 0
+        self._values = {field: defaultdict(int) for field in VALUE_FIELDS}
+        self._years = defaultdict(int)
+        self._rows = {}
+        self._lock = threading.RLock()
+        self.built_at = None
+        self.checked_at = None
+        self.epoch = None
+
+    def __len__(self):
+        return len(self._rows)
+
+    def build(self, rows):
+        with self._lock:
+            self._rows = {row[0]: self._normalize(*row[1:]) for row in rows}
+            members = defaultdict(list)
+            for book_id, (genre, audience, language, published) in self._rows.items():
+                for field, value in zip(VALUE_FIELDS, (genre, audience, language)):
+                    members[field, value].append(book_id)
+                members["year", published.year].append(book_id)
+
+            self._all = bitmap_from_ids(self._rows)
+            self._values = {field: defaultdict(int) for field in VALUE_FIELDS}
+            self._years = defaultdict(int)
+            for (kind, value), ids in members.items():
+                bitmap = bitmap_from_ids(ids)
+                if kind == "year":
+                    self._years[value] = bitmap
+                else:
+                    self._values[kind][value] = bitmap
+            self.built_at = time.monotonic()
+
+    def add(self, book):
+        with self._lock:
+            self._remove(book.pk)
+            row = self._normalize(book.genre, book.audience, book.language, book.published_date)
+            if row[3] is None:
+                return
+            bit = 1 << book.pk
+            self._rows[book.pk] = row
+            self._all |= bit
+            for field, value in zip(VALUE_FIELDS, row):
+                self._values[field][value] |= bit
+            self._years[row[3].year] |= bit
+
+    def remove(self, book_id):
+        with self._lock:
+            self._remove(book_id)
+
+    def match(self, filters, vendor=None):
+        # Returns the bitmap of books passing every filter, or None when one needs SQL (title text, availability).
+        with self._lock:
+            bitmap = self._all
+            for predicate in plan_filters(filters, vendor=vendor):
+                selected = self._select(predicate, filters)
+                if selected is None:
+                    return None
+                bitmap &= selected
+            if filters.get("expression"):
+                try:
+                    selected = self._evaluate(parse(filters["expression"]), vendor)
+                except QuerySyntaxError:
+                    return None
+                if selected is None:
+                    return None
+                bitmap &= selected
+            return bitmap
+
+    def _evaluate(self, node, vendor):
+        # Query-language nodes map onto &, | and complement; free text and title-like fields need SQL.
+        if isinstance(node, Field):
+            return self._select_field(node, vendor)
+        if isinstance(node, Not):
+            child = self._evaluate(node.child, vendor)
+            return None if child is None else self._all & ~child
+        if node is None or not hasattr(node, "children"):
+            return None
+        conjunction = isinstance(node, And)
+        result = self._all if conjunction else 0
+        for child in node.children:
+            selected = self._evaluate(child, vendor)
+            if selected is None:
+                return None
+            result = result & selected if conjunction else result | selected
+        return result
+
+    def _select_field(self, node, vendor):
+        name, value = node.name, node.value.strip().lower()
+        if not value:
+            return self._all
+        if name in ("audience", "language"):
+            return self._values[name].get(value, 0)
+        if name == "genre":
+            genres = self._values["genre"]
+            if node.match == "exact":
+                return genres.get(value, 0)
+            if node.match == "suffix":
+                return union(bitmap for genre, bitmap in genres.items() if genre.endswith(value))
+            if node.match == "text":
+                return self._select_genre(plan_text("genre", value, vendor or connection.vendor).strategy, value)
+            return self._select_genre(node.match, value)
+        if name == "year":
+            bounds = year_bounds(value)
+            if bounds is None:
+                return 0
+            bitmap = self._all
+            for lookup, bound in zip(("gte", "lte"), bounds):
+                if bound is not None:
+                    bitmap &= self._select_dates(lookup, bound)
+            return bitmap
+        return None
+
+    def _select(self, predicate, filters):
+        field, lookup, value = predicate.field, predicate.lookup, predicate.value
+        if field in ("audience", "language") and lookup == "iexact":
+            return self._values[field].get(str(value).strip().lower(), 0)
+        if field == "genre":
+            return self._select_genre(predicate.strategy, str(filters["genre"]).strip().lower())
+        if field == "published_date":
+            return self._select_dates(lookup, parse_date(value))
+        return None
+
+    def _select_genre(self, strategy, needle):
+        genres = self._values["genre"]
+        if strategy == "fts":
+            # Mirrors the FTS5 column filter: every filter token must prefix some token of the genre.
+            tokens = FTS_TOKEN_RE.findall(needle)
+            return union(
+                bitmap
+                for genre, bitmap in genres.items()
+                if all(any(word.startswith(token) for word in FTS_TOKEN_RE.findall(genre)) for token in tokens)
+            )
+        if strategy == "prefix":
+            return union(bitmap for genre, bitmap in genres.items() if genre.startswith(needle))
+        return union(bitmap for genre, bitmap in genres.items() if needle in genre)
+
+    def _select_dates(self, lookup, bound):
+        if bound is None:
+            return None
+        if lookup == "gte":
+            whole_years = union(bitmap for year, bitmap in self._years.items() if year > bound.year)
+            keep = lambda published: published >= bound
+        else:
+            whole_years = union(bitmap for year, bitmap in self._years.items() if year < bound.year)
+            keep = lambda published: published <= bound
+        # Only the boundary year's bucket is checked book by book.
+        boundary = bitmap_ids(self._years.get(bound.year, 0))
+        return whole_years | bitmap_from_ids(book_id for book_id in boundary if keep(self._rows[book_id][3]))
+
+    def _remove(self, book_id):
+        row = self._rows.pop(book_id, None)
+        if row is None:
+            return
+        mask = ~(1 << book_id)
+        self._all &= mask
+        for field, value in zip(VALUE_FIELDS, row):
+            self._values[field][value] &= mask
+            if not self._values[field][value]:
+                del self._values[field][value]
+        self._years[row[3].year] &= mask
+        if not self._years[row[3].year]:
+            del self._years[row[3].year]
+
+    @staticmethod
+    def _normalize(genre, audience, language, published_date):
+        return (
+            (genre or "").strip().lower(),
+            (audience or "").strip().lower(),
+            (language or "").strip().lower(),
+            parse_date(published_date),
+        )
+
+
+_bitmaps = BitmapIndex()
+_build_lock = threading.Lock()
+
+
+def bitmap_queryset():
+    return Bookinventory.objects.values_list("id", *VALUE_FIELDS, "published_date").order_by("id")
+
+
+def get_bitmaps():
+    if index_is_stale(_bitmaps):
+        with _build_lock:
+            if index_is_stale(_bitmaps):
+                _build(_bitmaps)
+    return _bitmaps
+
+
+def reset_bitmaps():
+    with _build_lock:
+        _bitmaps.build([])
+        _bitmaps.built_at = None
+
+
+def bitmap_book(book):
+    if _bitmaps.built_at is not None:
+        _bitmaps.add(book)
+
+
+def unbitmap_book(book_id):
+    if _bitmaps.built_at is not None:
+        _bitmaps.remove(book_id)
+
+
+def _build(index):
+    index.epoch = cache.get(INDEX_EPOCH_CACHE_KEY)
+    index.build(bitmap_queryset().iterator(chunk_size=2000))
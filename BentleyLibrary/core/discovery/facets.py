@@ -0,0 +1,44 @@
+from collections import Counter
+
+from django.db.models import BooleanField, Case, Count, Value, When
+
+
+FACET_FIELDS = ("genre", "audience", "language")
+FACET_VALUE_LIMIT = 12
+# Availability facet values double as available_quantity filter values, so a facet link is just a filter.
+AVAILABILITY_VALUES = {True: ("available", "Available now"), False: ("0", "Checked out")}
+
+
+def facet_counts(queryset):
+    # One GROUP BY over every facet column at once; each facet is a marginal of the combined rows,
+    # so the cost is one query however many facets or values the page shows.
+    rows = (
+        queryset.order_by()
+        .annotate(
+            is_available=Case(
+                When(available_quantity__gt=0, then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            )
+        )
+        .values(*FACET_FIELDS, "is_available")
+        .annotate(total=Count("id"))
+    )
+
+    counters = {field: Counter() for field in (*FACET_FIELDS, "availability")}
+    for row in rows:
+        for field in FACET_FIELDS:
+            if row[field]:
+                counters[field][row[field]] += row["total"]
+        counters["availability"][row["is_available"]] += row["total"]
+
+    facets = {}
+    for field in FACET_FIELDS:
+        ranked = sorted(counters[field].items(), key=lambda item: (-item[1], item[0]))[:FACET_VALUE_LIMIT]
+        facets[field] = [{"value": value, "label": value, "count": count} for value, count in ranked]
+    facets["availability"] = [
+        {"value": AVAILABILITY_VALUES[flag][0], "label": AVAILABILITY_VALUES[flag][1], "count": counters["availability"][flag]}
+        for flag in (True, False)
+        if counters["availability"][flag]
+    ]
+    return facets
@@ -0,0 +1,200 @@
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import connection
+
+from core.filtering import FilterPredicate
+from core.models import Bookinventory
+from core.search import parse_query, tokenize
+
+
+GRAM_SIZE = 3
+MIN_CORRECTABLE_LENGTH = 4
+POSTGRES_SIMILARITY_LIMIT = 0.2
+POSTGRES_CANDIDATE_LIMIT = 25
+
+
+@dataclass
+class QueryRewrite:
+    original: str
+    corrected: str = ""
+    corrections: dict = field(default_factory=dict)
+
+    @property
+    def query(self):
+        return self.corrected or self.original
+
+
+def trigrams(term):
+    padded = f"  {term} "
+    return {padded[index : index + GRAM_SIZE] for index in range(len(padded) - GRAM_SIZE + 1)}
+
+
+def max_edits(term):
+    return 1 if len(term) <= 5 else 2
+
+
+def edit_distance(source, target, limit):
+    # Optimal string alignment distance, so "histroy" -> "history" is one edit; gives up past `limit`.
+    if abs(len(source) - len(target)) > limit:
+        return limit + 1
+    previous_previous = None
+    previous = list(range(len(target) + 1))
+    for row, source_char in enumerate(source, start=1):
+        current = [row] + [0] * len(target)
+        for column, target_char in enumerate(target, start=1):
+            cost = 0 if source_char == target_char else 1
+            current[column] = min(previous[column] + 1, current[column - 1] + 1, previous[column - 1] + cost)
+            if (
+                previous_previous is not None
+                and column > 1
+                and source_char == target[column - 2]
+                and source[row - 2] == target_char
+            ):
+                current[column] = min(current[column], previous_previous[column - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+class TrigramIndex:
+    def __init__(self):
+        self._grams = defaultdict(set)
+
+    def add(self, term):
+        for gram in trigrams(term):
+            self._grams[gram].add(term)
+
+    def remove(self, term):
+        for gram in trigrams(term):
+            terms = self._grams.get(gram)
+            if terms is None:
+                continue
+            terms.discard(term)
+            if not terms:
+                del self._grams[gram]
+
+    def clear(self):
+        self._grams = defaultdict(set)
+
+    def candidates(self, term, max_distance):
+        grams = trigrams(term)
+        shared = defaultdict(int)
+        # Only terms that share a trigram with the input are ever touched.
+        for gram in grams:
+            for candidate in self._grams.get(gram, ()):
+                shared[candidate] += 1
+        # q-gram count filter: one edit (a transposition included) destroys at most GRAM_SIZE + 1 trigrams.
+        return [
+            candidate
+            for candidate, count in shared.items()
+            if abs(len(candidate) - len(term)) <= max_distance
+            and count >= max(len(grams), len(trigrams(candidate))) - max_distance * (GRAM_SIZE + 1)
+        ]
+
+
+def best_correction(term, candidates):
+    limit = max_edits(term)
+    scored = []
+    for candidate, document_frequency in candidates:
+        if candidate == term:
+            continue
+        distance = edit_distance(term, candidate, limit)
+        if distance <= limit:
+            scored.append((distance, -document_frequency, candidate))
+    return min(scored)[2] if scored else None
+
+
+def correctable_terms(query):
+    return [term for term in dict.fromkeys(tokenize(parse_query(query).text)) if len(term) >= MIN_CORRECTABLE_LENGTH and not term.isdigit()]
+
+
+def inmemory_corrections(terms):
+    from .inverted_index import get_index
+
+    index = get_index()
+    corrections = {}
+    for term in terms:
+        if index.document_frequency(term):
+            continue
+        correction = index.suggest(term, max_edits(term))
+        if correction:
+            corrections[term] = correction
+    return corrections
+
+
+def postgres_corrections(terms):
+    corrections = {}
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT word FROM bookinventory_lexicon WHERE word = ANY(%s)", [terms])
+        known = {row[0] for row in cursor.fetchall()}
+        unknown = [term for term in terms if term not in known]
+        if not unknown:
+            return corrections
+        cursor.execute("SELECT set_limit(%s)", [POSTGRES_SIMILARITY_LIMIT])
+        for term in unknown:
+            cursor.execute(
+                """
+                SELECT word, ndoc
+                FROM bookinventory_lexicon
+                WHERE word %% %s
+                ORDER BY similarity(word, %s) DESC
+                LIMIT %s
+                """,
+                [term, term, POSTGRES_CANDIDATE_LIMIT],
+            )
+            correction = best_correction(term, cursor.fetchall())
+            if correction:
+                corrections[term] = correction
+    return corrections
+
+
+def term_matches(term, vendor):
+    # The vocabularies lag writes from other workers, and the lexicon view lags every write until
+    # the next refresh, so a "correction" is only applied once the live catalog confirms no match.
+    if vendor == "sqlite":
+        predicate = FilterPredicate("search_document", "fts", "match", f'"{term}"')
+    elif vendor == "postgresql":
+        predicate = FilterPredicate("search_document", "tsquery", "match", ("plainto_tsquery", term))
+    else:
+        predicate = FilterPredicate("search_document", "contains", "icontains", term)
+    return Bookinventory.objects.filter(predicate.as_q()).exists()
+
+
+def refresh_lexicon():
+    if connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY bookinventory_lexicon")
+
+
+def rewrite_query(query):
+    rewrite = QueryRewrite(original=query)
+    if not query or not getattr(settings, "SEARCH_TYPO_TOLERANCE", True):
+        return rewrite
+
+    terms = correctable_terms(query)
+    if not terms:
+        return rewrite
+    if connection.vendor == "postgresql":
+        rewrite.corrections = postgres_corrections(terms)
+    else:
+        rewrite.corrections = inmemory_corrections(terms)
+    rewrite.corrections = {
+        term: correction
+        for term, correction in rewrite.corrections.items()
+        if not term_matches(term, connection.vendor)
+    }
+    if rewrite.corrections and parse_query(query).constraints:
+        # Correct the words in place so quotes and NEAR/N survive the rewrite.
+        rewrite.corrected = re.sub(
+            r"[A-Za-z0-9]+",
+            lambda match: rewrite.corrections.get(match.group(0).lower(), match.group(0)),
+            query,
+        )
+    elif rewrite.corrections:
+        rewrite.corrected = " ".join(rewrite.corrections.get(term, term) for term in tokenize(query))
+    return rewrite
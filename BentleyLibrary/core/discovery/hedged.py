@@ -0,0 +1,87 @@
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Most preferred first: when several branches have results by the deadline, the earliest one here wins.
+HEDGE_BRANCHES = ("hybrid", "inmemory", "baseline")
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "SEARCH_HEDGE_WORKERS", 6),
+                thread_name_prefix="search-hedge",
+            )
+        return _executor
+
+
+def run_branch(branch, query, filters, limit):
+    from core.search import run_strategy
+
+    try:
+        _queryset, ranked_ids, _strategy = run_strategy(query, filters, branch, limit)
+        return list(ranked_ids)
+    finally:
+        # Pool threads outlive the request, so never leave their connections open.
+        connections.close_all()
+
+
+def preferred_branch(results):
+    for branch in HEDGE_BRANCHES:
+        if results.get(branch):
+            return branch
+    return None
+
+
+def hedged_search(query, filters, limit, budget_ms=None):
+    if budget_ms is None:
+        budget_ms = getattr(settings, "SEARCH_HEDGE_BUDGET_MS", 150)
+    deadline = time.monotonic() + budget_ms / 1000
+    # With nothing usable at the deadline, branches get one more budget before the request answers inline.
+    cutoff = deadline + budget_ms / 1000
+    executor = get_executor()
+    futures = {executor.submit(run_branch, branch, query, filters, limit): branch for branch in HEDGE_BRANCHES}
+
+    results = {}
+    pending = set(futures)
+    while pending and not results.get(HEDGE_BRANCHES[0]):
+        now = time.monotonic()
+        if now >= deadline and preferred_branch(results):
+            break
+        remaining = (deadline if now < deadline else cutoff) - now
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            branch = futures[future]
+            try:
+                results[branch] = future.result()
+            except Exception:
+                logger.exception("Hedged search branch %s failed", branch)
+                results[branch] = None
+    for future in pending:
+        # Queued losers never start, so they cannot crowd out the next request's branches.
+        future.cancel()
+
+    winner = preferred_branch(results)
+    if winner:
+        return results[winner], winner
+    answered = [branch for branch in HEDGE_BRANCHES if results.get(branch) is not None]
+    if answered:
+        return [], answered[0]
+    # Every branch failed or is still stuck (e.g. a saturated pool); answer on the request thread.
+    from core.search import run_strategy
+
+    _queryset, ranked_ids, _strategy = run_strategy(query, filters, HEDGE_BRANCHES[0], limit)
+    return list(ranked_ids), "inline"
@@ -0,0 +1,317 @@
+import heapq
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.models import Bookinventory
+from core.search import parse_query, tokenize
+from core.discovery.fuzzy import TrigramIndex, best_correction
+
+
+# Mirrors the A/B/C/D weights used by postgres_search_vector and ts_rank's defaults.
+FIELD_WEIGHTS = {
+    "title": 1.0,
+    "author": 1.0,
+    "publisher": 0.4,
+    "genre": 0.4,
+    "description": 0.2,
+    "summary": 0.2,
+    "search_document": 0.1,
+}
+FIELDS = tuple(FIELD_WEIGHTS)
+FIELD_BOOSTS = tuple(FIELD_WEIGHTS.values())
+INDEXED_FIELDS = set(FIELD_WEIGHTS) | {"subtitle", "isbn", "language", "audience", "metadata"}
+INDEX_EPOCH_CACHE_KEY = "search:inmemory-index-epoch"
+BM25_K1 = 1.2
+BM25_B = 0.75
+# search_document repeats the other fields, so phrase positions are only kept for the source fields.
+POSITIONAL_FIELDS = tuple(field for field in FIELDS if field != "search_document")
+# Positions are offset per field so that a phrase never spans the end of one field and the start of the next.
+FIELD_POSITION_STRIDE = 1_000_000
+
+
+class InvertedIndex:
+    def __init__(self):
+        # token -> {book_id: per-field term frequencies, in FIELDS order}
+        self._postings = defaultdict(dict)
+        # token -> largest length-independent weighted frequency seen, for MaxScore bounds
+        self._peak_frequencies = {}
+        # token -> {book_id: sorted token positions across POSITIONAL_FIELDS}
+        self._positions = defaultdict(dict)
+        self._documents = {}
+        self._length_totals = [0] * len(FIELDS)
+        self._vocabulary = TrigramIndex()
+        self._lock = threading.RLock()
+        self.built_at = None
+        self.checked_at = None
+        self.epoch = None
+
+    def __len__(self):
+        return len(self._documents)
+
+    def __contains__(self, book_id):
+        return book_id in self._documents
+
+    @property
+    def term_count(self):
+        return len(self._postings)
+
+    def document_frequency(self, token):
+        return len(self._postings.get(token, ()))
+
+    def average_field_lengths(self):
+        total_documents = len(self._documents) or 1
+        return [total / total_documents for total in self._length_totals]
+
+    def build(self, books):
+        with self._lock:
+            self._postings = defaultdict(dict)
+            self._peak_frequencies = {}
+            self._positions = defaultdict(dict)
+            self._documents = {}
+            self._length_totals = [0] * len(FIELDS)
+            self._vocabulary.clear()
+            for book in books:
+                self._add(book)
+            self.built_at = time.monotonic()
+
+    def add(self, book):
+        with self._lock:
+            self._remove(book.pk)
+            self._add(book)
+
+    def remove(self, book_id):
+        with self._lock:
+            self._remove(book_id)
+
+    def suggest(self, term, max_distance):
+        with self._lock:
+            candidates = self._vocabulary.candidates(term, max_distance)
+            return best_correction(term, [(candidate, len(self._postings[candidate])) for candidate in candidates])
+
+    def search(self, query, limit=None, allowed=None):
+        with self._lock:
+            parsed = parse_query(query)
+            terms = self._query_terms(parsed.text)
+            if not terms:
+                return []
+            if parsed.constraints:
+                # Phrase and NEAR narrow the candidates through the positional postings before any scoring.
+                matching = self.matching_documents(parsed.constraints)
+                allowed = matching if allowed is None else matching & allowed
+                if not allowed:
+                    return []
+
+            averages = self.average_field_lengths()
+            remaining = [0.0] * (len(terms) + 1)
+            for position in range(len(terms) - 1, -1, -1):
+                remaining[position] = remaining[position + 1] + terms[position][1]
+
+            scores = {}
+            threshold = 0.0
+            for position, (idf, _bound, postings) in enumerate(terms):
+                if limit and len(scores) >= limit and remaining[position] < threshold:
+                    # MaxScore: the rest of the terms cannot lift an unseen book into the top k,
+                    # so only books still in contention are looked up instead of walking postings.
+                    scores = {
+                        book_id: score for book_id, score in scores.items() if score + remaining[position] >= threshold
+                    }
+                    for book_id in scores:
+                        frequencies = postings.get(book_id)
+                        if frequencies:
+                            scores[book_id] += self._term_score(idf, frequencies, book_id, averages)
+                else:
+                    for book_id, frequencies in self._allowed_postings(postings, allowed):
+                        scores[book_id] = scores.get(book_id, 0.0) + self._term_score(idf, frequencies, book_id, averages)
+                if limit and len(scores) >= limit:
+                    threshold = heapq.nlargest(limit, scores.values())[-1]
+
+            sort_key = lambda item: (-item[1], self._documents[item[0]][0], item[0])
+            if limit:
+                return heapq.nsmallest(limit, scores.items(), key=sort_key)
+            return sorted(scores.items(), key=sort_key)
+
+    def matching_documents(self, constraints):
+        matching = None
+        for constraint in constraints:
+            positions = [self._positions.get(term) for term in constraint.terms]
+            if not all(positions):
+                return set()
+            candidates = set(min(positions, key=len))
+            for term_positions in positions:
+                candidates.intersection_update(term_positions)
+            if matching is not None:
+                candidates &= matching
+            check = self._has_phrase if constraint.kind == "phrase" else self._has_near
+            matching = {
+                book_id
+                for book_id in candidates
+                if check([term_positions[book_id] for term_positions in positions], constraint.distance)
+            }
+            if not matching:
+                return matching
+        return matching
+
+    @staticmethod
+    def _has_phrase(positions, _distance):
+        following = [set(term_positions) for term_positions in positions[1:]]
+        return any(
+            all(start + offset in term_positions for offset, term_positions in enumerate(following, start=1))
+            for start in positions[0]
+        )
+
+    @staticmethod
+    def _has_near(positions, distance):
+        # Merge the two sorted position lists; "within N" means at most N tokens in between.
+        left, right = positions
+        i = j = 0
+        while i < len(left) and j < len(right):
+            if left[i] != right[j] and abs(left[i] - right[j]) <= distance + 1:
+                return True
+            if left[i] < right[j]:
+                i += 1
+            else:
+                j += 1
+        return False
+
+    @staticmethod
+    def _allowed_postings(postings, allowed):
+        # Filtered-out books are skipped before scoring, walking whichever side is smaller.
+        if allowed is None:
+            return postings.items()
+        if len(allowed) < len(postings):
+            return ((book_id, postings[book_id]) for book_id in allowed if book_id in postings)
+        return ((book_id, frequencies) for book_id, frequencies in postings.items() if book_id in allowed)
+
+    def _query_terms(self, query):
+        total_documents = len(self._documents)
+        terms = []
+        for token in set(tokenize(query)):
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+            document_frequency = len(postings)
+            idf = math.log(1 + (total_documents - document_frequency + 0.5) / (document_frequency + 0.5))
+            peak = self._peak_frequencies[token]
+            terms.append((idf, idf * peak / (BM25_K1 + peak), postings))
+        # Highest-impact terms first so the top-k threshold rises before the common terms are reached.
+        terms.sort(key=lambda term: term[1], reverse=True)
+        return terms
+
+    def _term_score(self, idf, frequencies, book_id, averages):
+        lengths = self._documents[book_id][1]
+        weighted = 0.0
+        for field_index, frequency in enumerate(frequencies):
+            if frequency:
+                normalization = 1 - BM25_B + BM25_B * lengths[field_index] / averages[field_index]
+                weighted += FIELD_BOOSTS[field_index] * frequency / normalization
+        return idf * weighted / (BM25_K1 + weighted)
+
+    def _add(self, book):
+        field_counts = [Counter(tokenize(getattr(book, field, ""))) for field in FIELDS]
+        lengths = tuple(sum(counts.values()) for counts in field_counts)
+        tokens = set().union(*field_counts)
+        for token in tokens:
+            frequencies = tuple(counts.get(token, 0) for counts in field_counts)
+            if token not in self._postings:
+                self._vocabulary.add(token)
+            self._postings[token][book.pk] = frequencies
+            # Field length normalization never divides by less than (1 - b), which keeps this a true upper bound.
+            peak = sum(boost * frequency for boost, frequency in zip(FIELD_BOOSTS, frequencies)) / (1 - BM25_B)
+            if peak > self._peak_frequencies.get(token, 0.0):
+                self._peak_frequencies[token] = peak
+        for field_index, length in enumerate(lengths):
+            self._length_totals[field_index] += length
+        positions = defaultdict(list)
+        for field_index, field in enumerate(POSITIONAL_FIELDS):
+            for position, token in enumerate(tokenize(getattr(book, field, ""))):
+                positions[token].append(field_index * FIELD_POSITION_STRIDE + position)
+        for token, token_positions in positions.items():
+            self._positions[token][book.pk] = tuple(token_positions)
+        self._documents[book.pk] = ((book.title or "").lower(), lengths, tuple(tokens))
+
+    def _remove(self, book_id):
+        document = self._documents.pop(book_id, None)
+        if not document:
+            return
+        for field_index, length in enumerate(document[1]):
+            self._length_totals[field_index] -= length
+        for token in document[2]:
+            token_positions = self._positions.get(token)
+            if token_positions is not None:
+                token_positions.pop(book_id, None)
+                if not token_positions:
+                    del self._positions[token]
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(book_id, None)
+            if not postings:
+                del self._postings[token]
+                self._peak_frequencies.pop(token, None)
+                self._vocabulary.remove(token)
+
+
+_index = InvertedIndex()
+_build_lock = threading.Lock()
+
+
+def index_queryset():
+    return Bookinventory.objects.only("id", *FIELD_WEIGHTS).order_by("id")
+
+
+def index_is_stale(index):
+    if index.built_at is None:
+        return True
+    now = time.monotonic()
+    max_age = getattr(settings, "SEARCH_INDEX_MAX_AGE_SECONDS", 0)
+    if max_age and now - index.built_at > max_age:
+        return True
+    # The epoch lives in the shared cache, often a database table, so it is read at most once per interval.
+    interval = getattr(settings, "SEARCH_EPOCH_CHECK_SECONDS", 0)
+    if interval and index.checked_at is not None and now - index.checked_at < interval:
+        return False
+    index.checked_at = now
+    return index.epoch != cache.get(INDEX_EPOCH_CACHE_KEY)
+
+
+def get_index():
+    if index_is_stale(_index):
+        with _build_lock:
+            if index_is_stale(_index):
+                _build(_index)
+    return _index
+
+
+def rebuild_index(broadcast=True):
+    with _build_lock:
+        if broadcast:
+            # Other workers compare this epoch on their next search and rebuild their own copy.
+            cache.set(INDEX_EPOCH_CACHE_KEY, time.time_ns(), None)
+        _build(_index)
+    return _index
+
+
+def reset_index():
+    with _build_lock:
+        _index.build([])
+        _index.built_at = None
+
+
+def index_book(book):
+    if _index.built_at is not None:
+        _index.add(book)
+
+
+def unindex_book(book_id):
+    if _index.built_at is not None:
+        _index.remove(book_id)
+
+
+def _build(index):
+    index.epoch = cache.get(INDEX_EPOCH_CACHE_KEY)
+    index.build(index_queryset().iterator(chunk_size=2000))
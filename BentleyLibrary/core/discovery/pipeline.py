@@ -13,7 +13,7 @@ class SearchPipelineResponse:
     rescue: Optional[dict]
 
 
-def run_search_pipeline(query="", reading_goal="reading", filters=None, limit=200):
+def run_search_pipeline(query="", reading_goal="reading", filters=None, limit=200, include_facets=False):
     reading_goal = (reading_goal or "reading").strip().lower()
     if reading_goal not in {"reading", "research"}:
         reading_goal = "reading"
@@ -23,7 +23,13 @@ def run_search_pipeline(query="", reading_goal="reading", filters=None, limit=20
         filters["audience"] = "Upper School"
 
     strategy = "indexed" if reading_goal == "research" else "auto"
-    response = search_books(query=query, filters=filters, strategy=strategy, limit=limit)
+    response = search_books(
+        query=query,
+        filters=filters,
+        strategy=strategy,
+        limit=limit,
+        include_facets=include_facets,
+    )
     rescue = search_rescue(query, reading_goal=reading_goal) if query else None
     return SearchPipelineResponse(
         response=response,
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+
+
+CATALOG_GENERATION_CACHE_KEY = "search:catalog-generation"
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+class LocalMemoryBackend:
+    def __init__(self, max_entries=512, ttl_seconds=60):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else 0
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DjangoCacheBackend:
+    def __init__(self, alias="default", ttl_seconds=60):
+        self.cache = caches[alias]
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value, self.ttl_seconds or None)
+
+    def clear(self):
+        self.cache.clear()
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+stats = CacheStats()
+_backends = {}
+_backends_lock = threading.Lock()
+# (read_at, generation) from the last catalog_generation() read in this process.
+_generation = None
+
+
+def get_result_cache():
+    backend_name = getattr(settings, "SEARCH_CACHE_BACKEND", "local")
+    if backend_name == "off":
+        return None
+
+    ttl_seconds = getattr(settings, "SEARCH_CACHE_TTL_SECONDS", 60)
+    config = (
+        backend_name,
+        ttl_seconds,
+        getattr(settings, "SEARCH_CACHE_MAX_ENTRIES", 512),
+        getattr(settings, "SEARCH_CACHE_ALIAS", "default"),
+    )
+    with _backends_lock:
+        if config not in _backends:
+            if backend_name == "django":
+                _backends[config] = DjangoCacheBackend(alias=config[3], ttl_seconds=ttl_seconds)
+            else:
+                _backends[config] = LocalMemoryBackend(max_entries=config[2], ttl_seconds=ttl_seconds)
+        return _backends[config]
+
+
+def require_shared_cache():
+    # The catalog generation and the index epochs live in the default cache; a per-process cache
+    # would let one worker's checkout leave the others serving stale availability.
+    if not getattr(settings, "SHARED_CACHE_REQUIRED", True):
+        return
+    backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    if backend in PROCESS_LOCAL_CACHES:
+        raise ImproperlyConfigured(
+            f"The default cache ({backend}) is local to one process; configure a shared CACHE_BACKEND "
+            "or set SHARED_CACHE_REQUIRED=False for single-process deployments."
+        )
+
+
+def catalog_generation():
+    # Memoized like the index epochs: a bump from another worker is seen within SEARCH_EPOCH_CHECK_SECONDS.
+    global _generation
+    interval = getattr(settings, "SEARCH_EPOCH_CHECK_SECONDS", 0)
+    now = time.monotonic()
+    memo = _generation
+    if interval and memo is not None and now - memo[0] < interval:
+        return memo[1]
+    generation = cache.get_or_set(CATALOG_GENERATION_CACHE_KEY, 1, None)
+    _generation = (now, generation)
+    return generation
+
+
+def bump_catalog_generation():
+    global _generation
+    _generation = None
+    try:
+        cache.incr(CATALOG_GENERATION_CACHE_KEY)
+    except ValueError:
+        cache.set(CATALOG_GENERATION_CACHE_KEY, 2, None)
+
+
+def result_cache_key(query, filters, strategy, limit):
+    payload = json.dumps(
+        {
+            "query": " ".join((query or "").lower().split()),
+            "filters": {key: str(value) for key, value in sorted((filters or {}).items()) if value},
+            "strategy": strategy,
+            "limit": limit,
+        },
+        sort_keys=True,
+    )
+    digest = hashlib.sha1(payload.encode("utf-8")).hexdigest()
+    return f"search:results:v4:{catalog_generation()}:{digest}"
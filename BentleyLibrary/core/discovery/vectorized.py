@@ -0,0 +1,217 @@
+import json
+import threading
+import time
+
+from django.core.cache import cache
+
+from core.models import Bookinventory
+from core.search import vector_score
+from core.discovery.inverted_index import INDEX_EPOCH_CACHE_KEY, index_is_stale
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is listed in requirements.txt
+    np = None
+
+
+# Once this many books have changed since the last build, the next search compacts them back into the matrix.
+COMPACT_AFTER_CHANGES = 256
+
+
+def numpy_available():
+    return np is not None
+
+
+class CatalogMatrix:
+    def __init__(self):
+        self.vocabulary = {}
+        self.book_ids = np.zeros(0, dtype=np.int64) if np else None
+        self.row_of = {}
+        self.col_ptr = np.zeros(1, dtype=np.int64) if np else None
+        self.row_indices = np.zeros(0, dtype=np.int64) if np else None
+        self.values = np.zeros(0, dtype=np.float64) if np else None
+        self.norms = np.zeros(0, dtype=np.float64) if np else None
+        self.live = np.zeros(0, dtype=bool) if np else None
+        self.available = np.zeros(0, dtype=bool) if np else None
+        self.overrides = {}
+        self.built_at = None
+        self.checked_at = None
+        self.epoch = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return int(self.live.sum()) + sum(1 for entry in self.overrides.values() if entry)
+
+    @classmethod
+    def from_rows(cls, rows):
+        matrix = cls()
+        matrix.build(rows)
+        return matrix
+
+    def build(self, rows):
+        vocabulary = {}
+        book_ids = []
+        norms = []
+        available = []
+        entry_rows = []
+        entry_cols = []
+        entry_values = []
+        for book_id, search_terms, search_terms_norm, available_quantity in rows:
+            if isinstance(search_terms, str):
+                search_terms = json.loads(search_terms)
+            row = len(book_ids)
+            book_ids.append(book_id)
+            norms.append(search_terms_norm or 0.0)
+            available.append(available_quantity > 0)
+            for token, count in (search_terms or {}).items():
+                entry_rows.append(row)
+                entry_cols.append(vocabulary.setdefault(token, len(vocabulary)))
+                entry_values.append(count)
+
+        self.load_arrays(
+            vocabulary,
+            np.array(book_ids, dtype=np.int64),
+            np.array(entry_rows, dtype=np.int64),
+            np.array(entry_cols, dtype=np.int64),
+            np.array(entry_values, dtype=np.float64),
+            np.array(norms, dtype=np.float64),
+            np.array(available, dtype=bool),
+        )
+
+    def load_arrays(self, vocabulary, book_ids, entry_rows, entry_cols, entry_values, norms, available):
+        # Column-major (CSC) layout: a query only touches the posting slices of its own terms.
+        order = np.argsort(entry_cols, kind="stable")
+        with self._lock:
+            self.vocabulary = vocabulary
+            self.book_ids = book_ids
+            self.row_of = {int(book_id): row for row, book_id in enumerate(book_ids.tolist())}
+            self.col_ptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(entry_cols, minlength=len(vocabulary)), out=self.col_ptr[1:])
+            self.row_indices = entry_rows[order]
+            self.values = entry_values[order]
+            self.norms = norms
+            self.live = np.ones(len(book_ids), dtype=bool)
+            self.available = available
+            self.overrides = {}
+            self.built_at = time.monotonic()
+
+    def update(self, book_id, search_terms, search_terms_norm, available_quantity):
+        with self._lock:
+            row = self.row_of.get(book_id)
+            if row is not None:
+                self.live[row] = False
+            self.overrides[book_id] = (search_terms, search_terms_norm, available_quantity > 0)
+
+    def remove(self, book_id):
+        with self._lock:
+            row = self.row_of.get(book_id)
+            if row is not None:
+                self.live[row] = False
+            self.overrides[book_id] = None
+
+    @property
+    def needs_compaction(self):
+        return len(self.overrides) >= COMPACT_AFTER_CHANGES
+
+    def semantic_scores(self, query_terms, query_norm):
+        scores = np.zeros(len(self.book_ids), dtype=np.float64)
+        if not query_norm:
+            return scores
+        for token, count in query_terms.items():
+            column = self.vocabulary.get(token)
+            if column is None:
+                continue
+            start, end = self.col_ptr[column], self.col_ptr[column + 1]
+            # Each book appears once per column, so fancy-indexed += is safe here.
+            scores[self.row_indices[start:end]] += np.minimum(self.values[start:end], count)
+        np.divide(scores, self.norms * query_norm, out=scores, where=self.norms > 0)
+        scores[~self.live] = 0.0
+        return scores
+
+    def candidate_scores(self, query_terms, query_norm, book_ids):
+        with self._lock:
+            catalog_scores = self.semantic_scores(query_terms, query_norm)
+            rows = np.array([self.row_of.get(book_id, -1) for book_id in book_ids], dtype=np.int64)
+            scores = np.where(rows >= 0, catalog_scores[rows], 0.0)
+            for position, book_id in enumerate(book_ids):
+                if book_id in self.overrides:
+                    entry = self.overrides[book_id]
+                    scores[position] = vector_score(query_terms, query_norm, entry[0], entry[1]) if entry else 0.0
+        return scores
+
+    def rank_candidates(self, query_terms, query_norm, book_ids, lexical_scores, available_quantities, limit=None):
+        if not len(book_ids):
+            return []
+        lexical = np.asarray(lexical_scores, dtype=np.float64)
+        meaning = self.candidate_scores(query_terms, query_norm, book_ids)
+        freshness = np.where(np.asarray(available_quantities) > 0, 0.1, 0.0)
+        combined = lexical * 0.65 + meaning * 0.3 + freshness * 0.05
+        order = top_k_indices(combined, limit)
+        return np.asarray(book_ids, dtype=np.int64)[order].tolist()
+
+
+def top_k_indices(scores, limit=None):
+    if limit is None or limit >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    if limit <= 0:
+        return np.zeros(0, dtype=np.int64)
+    # argpartition finds the k-th best score in linear time; ties at that score keep
+    # their earliest positions so the result matches a stable full sort.
+    kth = -np.partition(-scores, limit - 1)[limit - 1]
+    above = np.flatnonzero(scores > kth)
+    tied = np.flatnonzero(scores == kth)[: limit - len(above)]
+    selected = np.concatenate([above, tied])
+    return selected[np.lexsort((selected, -scores[selected]))]
+
+
+_matrix = CatalogMatrix() if np else None
+_build_lock = threading.Lock()
+
+
+def matrix_rows():
+    return (
+        Bookinventory.objects.order_by("id")
+        .values_list("id", "search_terms", "search_terms_norm", "available_quantity")
+        .iterator(chunk_size=2000)
+    )
+
+
+def get_matrix():
+    if _matrix is None:
+        return None
+    if index_is_stale(_matrix) or _matrix.needs_compaction:
+        with _build_lock:
+            if index_is_stale(_matrix) or _matrix.needs_compaction:
+                _build(_matrix)
+    return _matrix
+
+
+def rebuild_matrix():
+    if _matrix is None:
+        return None
+    with _build_lock:
+        _build(_matrix)
+    return _matrix
+
+
+def reset_matrix():
+    if _matrix is None:
+        return
+    with _build_lock:
+        _matrix.build([])
+        _matrix.built_at = None
+
+
+def matrix_book(book):
+    if _matrix is not None and _matrix.built_at is not None:
+        _matrix.update(book.pk, book.search_terms, book.search_terms_norm, book.available_quantity)
+
+
+def unmatrix_book(book_id):
+    if _matrix is not None and _matrix.built_at is not None:
+        _matrix.remove(book_id)
+
+
+def _build(matrix):
+    matrix.epoch = cache.get(INDEX_EPOCH_CACHE_KEY)
+    matrix.build(matrix_rows())
@@ -0,0 +1,107 @@
+import re
+from dataclasses import dataclass
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+
+TEXT_FILTER_FIELDS = ("title", "author", "publisher", "genre")
+FTS_TOKEN_RE = re.compile(r"[a-z0-9]+")
+ISBN_SEPARATOR_RE = re.compile(r"[\s-]")
+AVAILABLE_WORDS = {"yes", "true", "on", "available", "ready"}
+# pg_trgm needs at least one full trigram before its GIN index can narrow anything down.
+TRIGRAM_MIN_LENGTH = 3
+
+
+@dataclass(frozen=True)
+class FilterPredicate:
+    field: str
+    strategy: str
+    lookup: str
+    value: object
+
+    def as_q(self):
+        if self.strategy == "fts":
+            return Q(id__in=RawSQL("SELECT rowid FROM bookinventory_fts WHERE bookinventory_fts MATCH %s", [self.value]))
+        if self.strategy == "tsquery":
+            # search_vector is a raw column kept by a trigger, so it is reached through a subquery.
+            function, text = self.value
+            sql = f"SELECT id FROM bookinventory WHERE search_vector @@ {function}('english', %s)"
+            return Q(id__in=RawSQL(sql, [text]))
+        return Q(**{f"{self.field}__{self.lookup}": self.value})
+
+
+def isbn13_from_isbn10(isbn10):
+    digits = "978" + isbn10[:9]
+    total = sum(int(digit) * (1 if index % 2 == 0 else 3) for index, digit in enumerate(digits))
+    return digits + str((10 - total % 10) % 10)
+
+
+def plan_available_quantity(value):
+    value = str(value).strip().lower()
+    if value in AVAILABLE_WORDS:
+        return FilterPredicate("available_quantity", "range", "gt", 0)
+    if not value.isdigit():
+        return None
+    if int(value) == 0:
+        return FilterPredicate("available_quantity", "exact", "exact", 0)
+    # "1" from the shelf links and the concierge means "has a copy ready", not "exactly one copy".
+    return FilterPredicate("available_quantity", "range", "gte", int(value))
+
+
+def plan_isbn(value, vendor):
+    normalized = ISBN_SEPARATOR_RE.sub("", str(value)).upper()
+    if re.fullmatch(r"\d{13}", normalized):
+        return FilterPredicate("isbn", "exact", "exact", normalized)
+    if re.fullmatch(r"\d{9}[\dX]", normalized):
+        return FilterPredicate("isbn", "exact", "in", [normalized, isbn13_from_isbn10(normalized)])
+    if vendor == "postgresql" and len(normalized) >= TRIGRAM_MIN_LENGTH:
+        return FilterPredicate("isbn", "trigram", "icontains", normalized)
+    return FilterPredicate("isbn", "prefix", "startswith", normalized)
+
+
+def plan_text(field, value, vendor):
+    value = str(value).strip()
+    if vendor == "postgresql":
+        if len(value) >= TRIGRAM_MIN_LENGTH:
+            return FilterPredicate(field, "trigram", "icontains", value)
+        return FilterPredicate(field, "prefix", "istartswith", value)
+    if vendor == "sqlite":
+        tokens = FTS_TOKEN_RE.findall(value.lower())
+        if tokens:
+            expression = " AND ".join(f'"{token}"*' for token in tokens)
+            return FilterPredicate(field, "fts", "match", f"{{{field}}} : ({expression})")
+    return FilterPredicate(field, "contains", "icontains", value)
+
+
+def plan_filters(filters, vendor=None):
+    vendor = vendor or connection.vendor
+    plan = []
+    if filters.get("published_date_start"):
+        plan.append(FilterPredicate("published_date", "range", "gte", filters["published_date_start"]))
+    if filters.get("published_date_end"):
+        plan.append(FilterPredicate("published_date", "range", "lte", filters["published_date_end"]))
+    if filters.get("available_quantity"):
+        predicate = plan_available_quantity(filters["available_quantity"])
+        if predicate:
+            plan.append(predicate)
+    if filters.get("isbn"):
+        plan.append(plan_isbn(filters["isbn"], vendor))
+    for field in TEXT_FILTER_FIELDS:
+        if filters.get(field):
+            plan.append(plan_text(field, filters[field], vendor))
+    for field in ("audience", "language"):
+        if filters.get(field):
+            plan.append(FilterPredicate(field, "exact", "iexact", filters[field]))
+    return plan
+
+
+def compile_filters(queryset, filters, vendor=None):
+    for predicate in plan_filters(filters, vendor=vendor):
+        queryset = queryset.filter(predicate.as_q())
+    if filters.get("expression"):
+        from .query_language import compile_query
+
+        queryset = queryset.filter(compile_query(filters["expression"], vendor=vendor))
+    return queryset
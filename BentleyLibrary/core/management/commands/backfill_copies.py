@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.services.inventory import backfill_copies
+
+
+class Command(BaseCommand):
+    help = "Create the missing BookCopy rows for every title with fewer copies than its quantity."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        created = backfill_copies(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Provisioned {created} copies."))
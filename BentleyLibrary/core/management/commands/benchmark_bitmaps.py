@@ -0,0 +1,97 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.discovery.bitmaps import BitmapIndex, bitmap_ids, bitmap_queryset
+from core.management.commands.benchmark_search import summarize
+from core.models import Bookinventory
+from core.search import apply_filters
+
+
+SYNTHETIC_GENRES = ("History", "Fantasy", "Biography", "Science", "Poetry", "Mystery", "Art History", "Computing")
+SYNTHETIC_AUDIENCES = ("General", "Middle School", "Upper School")
+SYNTHETIC_LANGUAGES = ("English", "Spanish", "French", "Latin")
+FILTER_SETS = [
+    {"genre": "history"},
+    {"audience": "Upper School", "available_quantity": "available"},
+    {"language": "Spanish", "published_date_start": "2005-06-01", "published_date_end": "2015-12-31"},
+    {"genre": "science", "audience": "Middle School", "language": "English", "available_quantity": "2"},
+]
+
+
+def synthetic_books(count, seed=7):
+    rng = random.Random(seed)
+    for index in range(count):
+        quantity = rng.randint(1, 4)
+        yield Bookinventory(
+            title=f"Synthetic Volume {index}",
+            author=f"Author {index % 997}",
+            isbn=f"{979_000_000_0000 + index:013d}",
+            published_date=date(1950, 1, 1) + timedelta(days=rng.randrange(27000)),
+            publisher="Benchmark Press",
+            genre=rng.choice(SYNTHETIC_GENRES),
+            audience=rng.choice(SYNTHETIC_AUDIENCES),
+            language=rng.choice(SYNTHETIC_LANGUAGES),
+            quantity=quantity,
+            available_quantity=rng.randint(0, quantity),
+        )
+
+
+def time_runs(runs, callable_):
+    timings = []
+    result = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = callable_()
+        timings.append((time.perf_counter() - started) * 1000)
+    return result, timings
+
+
+class Command(BaseCommand):
+    help = "Compare the in-process bitmap filter index with the SQL filter chain on a padded catalog."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=100_000)
+        parser.add_argument("--runs", type=int, default=15)
+
+    def handle(self, *args, **options):
+        # Synthetic padding lives in a transaction that is always rolled back.
+        with transaction.atomic():
+            missing = options["books"] - Bookinventory.objects.count()
+            if missing > 0:
+                started = time.perf_counter()
+                Bookinventory.objects.bulk_create(synthetic_books(missing), batch_size=2000)
+                self.stdout.write(f"padded catalog with {missing} synthetic books in {time.perf_counter() - started:.1f}s")
+            self.run(options["runs"])
+            transaction.set_rollback(True)
+
+    def run(self, runs):
+        index = BitmapIndex()
+        started = time.perf_counter()
+        index.build(bitmap_queryset().iterator(chunk_size=2000))
+        build_ms = (time.perf_counter() - started) * 1000
+        self.stdout.write(f"backend={connection.vendor} books={len(index)} bitmap build={build_ms:.0f} ms")
+
+        base = Bookinventory.objects.all()
+        for filters in FILTER_SETS:
+            self.stdout.write("")
+            self.stdout.write(self.style.MIGRATE_HEADING(f"Filters: {filters}"))
+            sql_ids, sql_timings = time_runs(runs, lambda: list(apply_filters(base, filters).values_list("id", flat=True)))
+            rows = [("sql", sql_timings, sql_ids)]
+            if index.match(filters) is None:
+                # Availability and text filters are left to SQL, so there is nothing to compare.
+                rows[0] = ("sql-only", sql_timings, sql_ids)
+                bitmap_result = None
+            else:
+                bitmap_result, bitmap_timings = time_runs(runs, lambda: bitmap_ids(index.match(filters)))
+                rows.append(("bitmap", bitmap_timings, bitmap_result))
+            for label, timings, ids in rows:
+                _avg_ms, median_ms, p95_ms = summarize(timings)
+                self.stdout.write(
+                    f"{label:>10} | hits={len(ids):>6} | p50={median_ms:>8.2f} ms | p95={p95_ms:>8.2f} ms"
+                )
+            if bitmap_result is not None and sorted(sql_ids) != bitmap_result:
+                self.stdout.write(self.style.WARNING("bitmap and SQL disagree on the matching books"))
@@ -0,0 +1,96 @@
+import re
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.filtering import plan_filters
+from core.management.commands.benchmark_search import summarize
+from core.models import Bookinventory
+from core.search import apply_filters
+
+
+# SQLite reports a full walk of the table (or of a whole index) as "SCAN bookinventory ...";
+# PostgreSQL reports it as "Seq Scan". Anything else is a seek, a bitmap probe, or an FTS lookup.
+FULL_SCAN_RE = re.compile(r"\bSCAN bookinventory\b(?!_fts)|Seq Scan on bookinventory\b")
+
+
+def legacy_filters(queryset, filters):
+    # The pre-planner behaviour: every text filter became icontains and availability was an exact count.
+    for field, value in filters.items():
+        if not value:
+            continue
+        if field == "published_date_start":
+            queryset = queryset.filter(published_date__gte=value)
+        elif field == "published_date_end":
+            queryset = queryset.filter(published_date__lte=value)
+        elif field == "available_quantity":
+            queryset = queryset.filter(available_quantity=value)
+        elif field == "audience":
+            queryset = queryset.filter(audience__iexact=value)
+        else:
+            queryset = queryset.filter(**{f"{field}__icontains": value})
+    return queryset
+
+
+def uses_index(plan):
+    return not FULL_SCAN_RE.search(plan)
+
+
+def sample_filters():
+    book = Bookinventory.objects.exclude(author="").order_by("id").first()
+    title_word = next((word for word in re.findall(r"[A-Za-z]{4,}", book.title)), book.title)
+    return [
+        {"isbn": book.isbn},
+        {"title": title_word},
+        {"author": book.author.split()[-1]},
+        {"genre": book.genre} if book.genre else {"publisher": book.publisher},
+        {"available_quantity": "1"},
+    ]
+
+
+class Command(BaseCommand):
+    help = "Compare query plans and latency of the legacy icontains filters against the planned filter predicates."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--filter", action="append", dest="filters", help="field=value, repeatable")
+        parser.add_argument("--runs", type=int, default=25)
+
+    def handle(self, *args, **options):
+        if not Bookinventory.objects.exists():
+            raise CommandError("No books found. Run seed_demo_library first.")
+
+        filter_sets = sample_filters()
+        if options["filters"]:
+            filter_sets = []
+            for raw_filter in options["filters"]:
+                field, separator, value = raw_filter.partition("=")
+                if not separator:
+                    raise CommandError(f"Expected field=value, got {raw_filter!r}.")
+                filter_sets.append({field.strip(): value.strip()})
+
+        self.stdout.write(f"backend={connection.vendor}")
+        base = Bookinventory.objects.all()
+        for filters in filter_sets:
+            self.stdout.write("")
+            self.stdout.write(self.style.MIGRATE_HEADING(f"Filters: {filters}"))
+            for predicate in plan_filters(filters):
+                self.stdout.write(f"  plan {predicate.field}: {predicate.strategy} ({predicate.lookup})")
+
+            for label, build in [("legacy", legacy_filters), ("planned", apply_filters)]:
+                queryset = build(base, filters).values_list("id", flat=True)
+                plan = queryset.explain()
+                timings = []
+                for _ in range(options["runs"]):
+                    started = time.perf_counter()
+                    hit_count = len(list(queryset[:50]))
+                    timings.append((time.perf_counter() - started) * 1000)
+
+                _avg_ms, median_ms, p95_ms = summarize(timings)
+                access = "index" if uses_index(plan) else "scan"
+                self.stdout.write(
+                    f"{label:>10} | hits={hit_count:>3} | access={access:<5} | "
+                    f"p50={median_ms:>7.2f} ms | p95={p95_ms:>7.2f} ms"
+                )
+                for line in plan.splitlines():
+                    self.stdout.write(f"{'':>12}{line.strip()}")
@@ -1,19 +1,43 @@
 import statistics
 import time
+from itertools import islice
 
+from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.test.utils import override_settings
 
+from core.discovery.result_cache import get_result_cache, stats as cache_stats
+from core.discovery.vectorized import numpy_available
 from core.models import Bookinventory
-from core.search import search_books
+from core.search import order_by_ranked_ids, search_books
+
+
+def case_when_ordering(queryset, ranked_ids):
+    preserved = Case(
+        *[When(pk=pk, then=Value(position)) for position, pk in enumerate(ranked_ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=ranked_ids).order_by(preserved)
+
+
+def summarize(timings):
+    avg_ms = statistics.mean(timings)
+    median_ms = statistics.median(timings)
+    p95_ms = sorted(timings)[max(0, int(len(timings) * 0.95) - 1)]
+    return avg_ms, median_ms, p95_ms
 
 
 class Command(BaseCommand):
-    help = "Benchmark baseline, indexed, and hybrid search latency."
+    help = "Benchmark baseline, indexed, hybrid, in-memory, and vectorized search latency."
 
     def add_arguments(self, parser):
         parser.add_argument("--query", action="append", dest="queries")
         parser.add_argument("--runs", type=int, default=25)
         parser.add_argument("--limit", type=int, default=25)
+        parser.add_argument("--fetch-size", action="append", type=int, dest="fetch_sizes")
+        parser.add_argument("--vector-size", action="append", type=int, dest="vector_sizes")
 
     def handle(self, *args, **options):
         if not Bookinventory.objects.exists():
@@ -23,22 +47,115 @@ class Command(BaseCommand):
         runs = options["runs"]
         limit = options["limit"]
 
-        for query in queries:
-            self.stdout.write("")
-            self.stdout.write(self.style.MIGRATE_HEADING(f'Query: "{query}"'))
-            for strategy in ["baseline", "indexed", "hybrid"]:
+        # Strategies are compared uncached; the result cache gets its own section below.
+        with override_settings(SEARCH_CACHE_BACKEND="off"):
+            for query in queries:
+                self.stdout.write("")
+                self.stdout.write(self.style.MIGRATE_HEADING(f'Query: "{query}"'))
+                for strategy in ["baseline", "indexed", "hybrid", "inmemory", "vectorized", "hedged"]:
+                    timings = []
+                    hit_count = 0
+                    for _ in range(runs):
+                        started = time.perf_counter()
+                        response = search_books(query=query, strategy=strategy, limit=limit)
+                        hit_count = len(list(response.queryset[:limit]))
+                        timings.append((time.perf_counter() - started) * 1000)
+
+                    avg_ms, median_ms, p95_ms = summarize(timings)
+                    self.stdout.write(
+                        f"{strategy:>10} | hits={hit_count:>3} | avg={avg_ms:>7.2f} ms | "
+                        f"p50={median_ms:>7.2f} ms | p95={p95_ms:>7.2f} ms"
+                    )
+
+        self.benchmark_result_cache(queries, runs, limit)
+        self.benchmark_ranked_fetch(options["fetch_sizes"] or [50, 200, 1000], runs)
+        self.benchmark_vectorized(options["vector_sizes"] or [10000, 100000], runs, limit)
+
+    def benchmark_result_cache(self, queries, runs, limit):
+        self.stdout.write("")
+        self.stdout.write(self.style.MIGRATE_HEADING("Result cache (auto strategy)"))
+        backend_name = "local" if settings.SEARCH_CACHE_BACKEND == "off" else settings.SEARCH_CACHE_BACKEND
+        with override_settings(SEARCH_CACHE_BACKEND=backend_name):
+            get_result_cache().clear()
+            cache_stats.reset()
+            timings = {"hit": [], "miss": []}
+            for query in queries:
+                for _ in range(runs):
+                    started = time.perf_counter()
+                    response = search_books(query=query, strategy="auto", limit=limit)
+                    list(response.queryset[:limit])
+                    timings[response.cache_status].append((time.perf_counter() - started) * 1000)
+
+        snapshot = cache_stats.snapshot()
+        self.stdout.write(f"backend={backend_name} | cache hits={snapshot['hits']} | cache misses={snapshot['misses']}")
+        for status in ["miss", "hit"]:
+            if timings[status]:
+                _avg_ms, median_ms, p95_ms = summarize(timings[status])
+                self.stdout.write(f"{status:>10} | p50={median_ms:>7.2f} ms | p95={p95_ms:>7.2f} ms")
+
+    def benchmark_ranked_fetch(self, sizes, runs):
+        self.stdout.write("")
+        self.stdout.write(self.style.MIGRATE_HEADING("Ranked fetch: CASE/WHEN ordering vs pk__in + reorder"))
+        queryset = Bookinventory.objects.all()
+        for size in sizes:
+            # Reverse the natural order so both paths actually have to reorder rows.
+            ranked_ids = list(queryset.order_by("-id").values_list("id", flat=True)[:size])
+            results = {}
+            for label, build in [("case_when", case_when_ordering), ("ranked_fetch", order_by_ranked_ids)]:
                 timings = []
-                hit_count = 0
                 for _ in range(runs):
                     started = time.perf_counter()
-                    response = search_books(query=query, strategy=strategy, limit=limit)
-                    hit_count = len(list(response.queryset[:limit]))
+                    list(build(queryset, ranked_ids))
                     timings.append((time.perf_counter() - started) * 1000)
+                results[label] = summarize(timings)
+
+            before, after = results["case_when"], results["ranked_fetch"]
+            speedup = before[1] / after[1] if after[1] else 0.0
+            self.stdout.write(
+                f"ids={size:>5} (fetched {len(ranked_ids):>5}) | case_when p50={before[1]:>7.2f} ms "
+                f"p95={before[2]:>7.2f} ms | ranked_fetch p50={after[1]:>7.2f} ms "
+                f"p95={after[2]:>7.2f} ms | speedup={speedup:>5.2f}x"
+            )
+
+    def benchmark_vectorized(self, sizes, runs, limit):
+        from core.management.commands.evaluate_search import SYNTHETIC_BATCH_SIZE, synthetic_catalog
+        from core.management.commands.evaluate_search import Command as EvaluateCommand
+
+        self.stdout.write("")
+        self.stdout.write(self.style.MIGRATE_HEADING("Vectorized vs hybrid search over a synthetic catalog"))
+        if not numpy_available():
+            self.stdout.write(self.style.WARNING("NumPy is not installed; skipping."))
+            return
+
+        for size in sizes:
+            # Padding lives in a transaction that is always rolled back, like benchmark_bitmaps.
+            EvaluateCommand.reset_engines()
+            try:
+                with transaction.atomic(), override_settings(SEARCH_CACHE_BACKEND="off"):
+                    books, queries = synthetic_catalog(max(size - Bookinventory.objects.count(), 0), 5, seed=42)
+                    while chunk := list(islice(books, SYNTHETIC_BATCH_SIZE)):
+                        Bookinventory.objects.bulk_create(chunk)
+                    queries = [entry["query"] for entry in queries] or ["python"]
+                    for strategy in ["vectorized", "hybrid"]:
+                        # The first search builds the in-process engines from scratch, so it is reported apart.
+                        EvaluateCommand.reset_engines()
+                        started = time.perf_counter()
+                        search_books(query=queries[0], strategy=strategy, limit=limit)
+                        build_ms = (time.perf_counter() - started) * 1000
+                        timings = []
+                        for _ in range(runs):
+                            for query in queries:
+                                started = time.perf_counter()
+                                response = search_books(query=query, strategy=strategy, limit=limit)
+                                list(response.queryset[:limit])
+                                timings.append((time.perf_counter() - started) * 1000)
 
-                avg_ms = statistics.mean(timings)
-                median_ms = statistics.median(timings)
-                p95_ms = sorted(timings)[max(0, int(len(timings) * 0.95) - 1)]
-                self.stdout.write(
-                    f"{strategy:>8} | hits={hit_count:>3} | avg={avg_ms:>7.2f} ms | "
-                    f"p50={median_ms:>7.2f} ms | p95={p95_ms:>7.2f} ms"
-                )
+                        _avg_ms, median_ms, p95_ms = summarize(timings)
+                        throughput = 1000 / median_ms if median_ms else 0.0
+                        self.stdout.write(
+                            f"books={size:>7} | {response.strategy:>10} | first={build_ms:>8.2f} ms | "
+                            f"p50={median_ms:>7.2f} ms | p95={p95_ms:>7.2f} ms | throughput={throughput:>8.1f} queries/s"
+                        )
+                    transaction.set_rollback(True)
+            finally:
+                EvaluateCommand.reset_engines()
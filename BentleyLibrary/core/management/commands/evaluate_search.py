@@ -1,9 +1,40 @@
 import json
+import math
+import random
+import time
+from datetime import date, timedelta
+from itertools import islice
 from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
 
+from core.discovery.autocomplete import reset_autocomplete
+from core.discovery.bitmaps import reset_bitmaps
+from core.discovery.inverted_index import reset_index
 from core.discovery.pipeline import run_search_pipeline
+from core.discovery.vectorized import reset_matrix
+from core.management.commands.benchmark_search import summarize
+from core.models import Bookinventory
+from core.search import search_books
+
+
+EVALUATION_DIR = Path(__file__).resolve().parents[2] / "evaluation"
+STRATEGIES = ["pipeline", "baseline", "indexed", "hybrid", "inmemory", "vectorized", "hedged", "auto"]
+# Hedged fans out to worker connections, so it is only evaluated when asked for.
+DEFAULT_STRATEGIES = [strategy for strategy in STRATEGIES if strategy != "hedged"]
+METRIC_K = 10
+# Made-up syllables keep synthetic series names out of any real catalog's vocabulary.
+SERIES_SYLLABLES = ("ka", "lo", "mi", "ru", "ze", "ta", "vo", "ni", "pe", "su", "da", "fi", "go", "ha", "ju", "xe")
+SYNTHETIC_TOPICS = (
+    "astronomy", "botany", "chemistry", "geology", "poetry", "sculpture", "navigation", "architecture",
+    "medicine", "economics", "philosophy", "cartography", "ecology", "mythology", "robotics", "typography",
+)
+SYNTHETIC_GENRES = ("History", "Science", "Fiction", "Biography", "Technology", "Art")
+BOOKS_PER_SERIES = 10
+# Synthetic books are generated and inserted this many at a time, so --books 1000000 never holds them all.
+SYNTHETIC_BATCH_SIZE = 2000
 
 
 def recall_at_k(results, expected_titles, k=5):
@@ -23,36 +54,217 @@ def precision_at_k(results, expected_titles, k=3):
     return hits / min(k, len(top_titles))
 
 
+def ndcg_at_k(titles, judgments, k=METRIC_K):
+    gains = [judgments.get(title, 0) for title in titles[:k]]
+    dcg = sum((2**gain - 1) / math.log2(rank + 2) for rank, gain in enumerate(gains))
+    ideal = sorted(judgments.values(), reverse=True)[:k]
+    ideal_dcg = sum((2**gain - 1) / math.log2(rank + 2) for rank, gain in enumerate(ideal))
+    return dcg / ideal_dcg if ideal_dcg else 0.0
+
+
+def reciprocal_rank(titles, judgments, k=METRIC_K):
+    for rank, title in enumerate(titles[:k], start=1):
+        if judgments.get(title, 0) > 0:
+            return 1 / rank
+    return 0.0
+
+
+def judgments_for(entry):
+    # Graded "judgments" win; plain "expected_titles" count as relevance 1.
+    judgments = dict(entry.get("judgments") or {})
+    for title in entry.get("expected_titles", []):
+        judgments.setdefault(title, 1)
+    return judgments
+
+
+def series_name(number):
+    syllables = []
+    for _ in range(5):
+        number, digit = divmod(number, len(SERIES_SYLLABLES))
+        syllables.append(SERIES_SYLLABLES[digit])
+    return "".join(syllables)
+
+
+def synthetic_catalog(count, query_count, seed):
+    # Yields unsaved books and fills `queries` with graded judgments: the series plus the
+    # title topic is relevance 2, the series plus the description topic is relevance 1.
+    rng = random.Random(seed)
+    series_count = max(count // BOOKS_PER_SERIES, 1)
+    judged = {name: {} for name in map(series_name, rng.sample(range(series_count), min(query_count, series_count)))}
+    queries = []
+
+    def books():
+        for index in range(count):
+            series = series_name(rng.randrange(series_count))
+            primary, secondary = rng.sample(SYNTHETIC_TOPICS, 2)
+            quantity = rng.randint(1, 4)
+            book = Bookinventory(
+                title=f"{series.title()} {primary.title()} Studies {index}",
+                author=f"Author {index % 997}",
+                isbn=f"{979_100_000_0000 + index:013d}",
+                published_date=date(1950, 1, 1) + timedelta(days=rng.randrange(27000)),
+                publisher="Evaluation Press",
+                genre=rng.choice(SYNTHETIC_GENRES),
+                quantity=quantity,
+                available_quantity=rng.randint(0, quantity),
+                description=f"Notes on {secondary} from the {series} collection.",
+            )
+            book.search_document = book.build_search_document()
+            book.search_terms, book.search_terms_norm = book.build_search_terms()
+            if series in judged:
+                judged[series].setdefault(primary, {})[book.title] = 2
+                judged[series].setdefault(secondary, {}).setdefault(book.title, 1)
+            yield book
+
+        query_rng = random.Random(seed + 1)
+        for series, topics in judged.items():
+            if topics:
+                topic = query_rng.choice(sorted(topics))
+                queries.append({"query": f"{series} {topic}", "judgments": topics[topic]})
+
+    return books(), queries
+
+
 class Command(BaseCommand):
-    help = "Evaluate search quality on a small labeled query set."
+    help = "Evaluate relevance (nDCG@10, MRR, recall) and latency for every search strategy against a baseline."
 
     def add_arguments(self, parser):
+        parser.add_argument("--dataset", default=str(EVALUATION_DIR / "queries.json"))
+        parser.add_argument("--books", type=int, default=0, help="Evaluate on a synthetic catalog of this size instead.")
+        parser.add_argument("--queries", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=7)
+        parser.add_argument("--strategy", action="append", dest="strategies", choices=STRATEGIES)
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--warmup", type=int, default=1, help="Untimed passes over the queries per strategy.")
+        parser.add_argument("--baseline", default=str(EVALUATION_DIR / "baseline.json"))
+        parser.add_argument("--write-baseline", action="store_true")
         parser.add_argument(
-            "--dataset",
-            default=str(Path(__file__).resolve().parents[2] / "evaluation" / "queries.json"),
+            "--require-baseline", action="store_true", help="Fail instead of warning when there is no baseline, e.g. in CI."
+        )
+        parser.add_argument("--quality-tolerance", type=float, default=0.02)
+        parser.add_argument("--latency-tolerance", type=float, default=0.25)
+        parser.add_argument(
+            "--latency-slack-ms", type=float, default=2.0, help="Absolute p95 allowance on top of --latency-tolerance."
         )
 
     def handle(self, *args, **options):
-        dataset_path = Path(options["dataset"])
-        queries = json.loads(dataset_path.read_text())
-        recall_scores = []
-        precision_scores = []
+        strategies = options["strategies"] or DEFAULT_STRATEGIES
+        if options["books"]:
+            report = self.evaluate_synthetic(options, strategies)
+        else:
+            queries = json.loads(Path(options["dataset"]).read_text())
+            report = self.evaluate(queries, strategies, options["runs"], options["warmup"])
+
+        baseline_path = Path(options["baseline"])
+        key = f"synthetic-{options['books']}" if options["books"] else Path(options["dataset"]).name
+        if options["write_baseline"]:
+            stored = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+            stored[key] = report
+            baseline_path.write_text(json.dumps(stored, indent=2, sort_keys=True) + "\n")
+            self.stdout.write(f"baseline written to {baseline_path} [{key}]")
+        else:
+            stored = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+            if key not in stored:
+                message = f"No baseline for [{key}] in {baseline_path}; run with --write-baseline first."
+                if options["require_baseline"]:
+                    raise CommandError(message)
+                self.stdout.write(self.style.WARNING(message))
+                return
+            self.check_baseline(report, stored[key], options)
+
+    def evaluate_synthetic(self, options, strategies):
+        if "hedged" in strategies:
+            # Hedged branches run on worker connections that cannot see the uncommitted synthetic rows.
+            raise CommandError("The hedged strategy needs a committed catalog; drop it when using --books.")
+        # Synthetic rows live in a transaction that is always rolled back; the live catalog is
+        # deleted inside it so results only depend on the seed, and the in-process engines are
+        # reset on both sides so none of them outlive it.
+        self.reset_engines()
+        try:
+            with transaction.atomic():
+                _total, deleted = Bookinventory.objects.all().delete()
+                if deleted.get(Bookinventory._meta.label):
+                    self.stdout.write(f"set aside {deleted[Bookinventory._meta.label]} live books for the run")
+                books, queries = synthetic_catalog(options["books"], options["queries"], options["seed"])
+                started = time.perf_counter()
+                while chunk := list(islice(books, SYNTHETIC_BATCH_SIZE)):
+                    Bookinventory.objects.bulk_create(chunk)
+                self.stdout.write(f"synthetic catalog of {options['books']} books in {time.perf_counter() - started:.1f}s")
+                report = self.evaluate(queries, strategies, options["runs"], options["warmup"])
+                transaction.set_rollback(True)
+        finally:
+            self.reset_engines()
+        return report
 
-        for entry in queries:
+    def evaluate(self, queries, strategies, runs, warmup=1):
+        report = {}
+        with override_settings(SEARCH_CACHE_BACKEND="off"):
+            for strategy in strategies:
+                # First calls build the in-process engines and warm the database cache; keep them out of p95.
+                for _ in range(warmup):
+                    for entry in queries:
+                        list(self.run(strategy, entry)[:METRIC_K])
+                scores = {"ndcg@10": [], "mrr": [], "recall@10": [], "recall@5": [], "precision@3": []}
+                timings = []
+                for entry in queries:
+                    judgments = judgments_for(entry)
+                    for _ in range(max(runs, 1)):
+                        started = time.perf_counter()
+                        results = list(self.run(strategy, entry)[:METRIC_K])
+                        timings.append((time.perf_counter() - started) * 1000)
+                    titles = [book.title for book in results]
+                    relevant = [title for title, grade in judgments.items() if grade > 0]
+                    scores["ndcg@10"].append(ndcg_at_k(titles, judgments))
+                    scores["mrr"].append(reciprocal_rank(titles, judgments))
+                    scores["recall@10"].append(recall_at_k(results, relevant, k=METRIC_K))
+                    scores["recall@5"].append(recall_at_k(results, relevant, k=5))
+                    scores["precision@3"].append(precision_at_k(results, relevant, k=3))
+
+                metrics = {name: round(sum(values) / len(values), 4) if values else 0.0 for name, values in scores.items()}
+                _avg_ms, median_ms, p95_ms = summarize(timings) if timings else (0.0, 0.0, 0.0)
+                metrics.update({"p50_ms": round(median_ms, 2), "p95_ms": round(p95_ms, 2)})
+                report[strategy] = metrics
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"{strategy:>10} | queries={len(queries)} ndcg@10={metrics['ndcg@10']:.3f} "
+                        f"mrr={metrics['mrr']:.3f} recall@10={metrics['recall@10']:.2f} "
+                        f"recall@5={metrics['recall@5']:.2f} precision@3={metrics['precision@3']:.2f} | "
+                        f"p50={median_ms:.2f} ms p95={p95_ms:.2f} ms"
+                    )
+                )
+        return report
+
+    def run(self, strategy, entry):
+        if strategy == "pipeline":
             pipeline = run_search_pipeline(
                 query=entry["query"],
                 reading_goal=entry.get("reading_goal", "reading"),
-                filters={},
-                limit=10,
-            )
-            results = list(pipeline.response.queryset[:10])
-            recall_scores.append(recall_at_k(results, entry.get("expected_titles", []), k=5))
-            precision_scores.append(precision_at_k(results, entry.get("expected_titles", []), k=3))
-
-        avg_recall = sum(recall_scores) / len(recall_scores) if recall_scores else 0.0
-        avg_precision = sum(precision_scores) / len(precision_scores) if precision_scores else 0.0
-        self.stdout.write(
-            self.style.SUCCESS(
-                f"queries={len(queries)} recall@5={avg_recall:.2f} precision@3={avg_precision:.2f}"
+                filters=entry.get("filters", {}),
+                limit=METRIC_K,
             )
-        )
+            return pipeline.response.queryset
+        return search_books(query=entry["query"], filters=entry.get("filters", {}), strategy=strategy, limit=METRIC_K).queryset
+
+    def check_baseline(self, report, baseline, options):
+        regressions = []
+        for strategy, metrics in report.items():
+            expected = baseline.get(strategy)
+            if not expected:
+                self.stdout.write(self.style.WARNING(f"{strategy} has no baseline entry; it was not checked"))
+                continue
+            for name in ("ndcg@10", "mrr", "recall@10"):
+                if metrics[name] < expected[name] - options["quality_tolerance"]:
+                    regressions.append(f"{strategy} {name} {metrics[name]:.3f} < baseline {expected[name]:.3f}")
+            allowed_ms = expected["p95_ms"] * (1 + options["latency_tolerance"]) + options["latency_slack_ms"]
+            if metrics["p95_ms"] > allowed_ms:
+                regressions.append(f"{strategy} p95 {metrics['p95_ms']:.2f} ms > baseline {expected['p95_ms']:.2f} ms")
+        if regressions:
+            raise CommandError("Search regressed past the baseline:\n" + "\n".join(regressions))
+        self.stdout.write("no regressions against the baseline")
+
+    @staticmethod
+    def reset_engines():
+        reset_index()
+        reset_matrix()
+        reset_autocomplete()
+        reset_bitmaps()
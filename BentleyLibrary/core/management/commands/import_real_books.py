@@ -4,6 +4,7 @@ from django.core.management.base import BaseCommand
 
 from core.models import BookCopy, Bookinventory, HoldRequest, Loan, Log
 from core.openlibrary import search_real_books
+from core.services.inventory import provision_copies
 
 
 COLLECTIONS = [
@@ -49,6 +50,7 @@ class Command(BaseCommand):
                     continue
 
                 quantity = random.randint(1, 4)
+                # Created empty so the post_save signal leaves the copies to the REAL- barcodes below.
                 book = Bookinventory.objects.create(
                     title=parsed.title,
                     subtitle=parsed.subtitle,
@@ -60,19 +62,17 @@ class Command(BaseCommand):
                     language=parsed.language,
                     audience=parsed.audience,
                     shelf_location=f"{genre[:2].upper()}-{created % 24 + 1:02d}",
-                    quantity=quantity,
-                    available_quantity=quantity,
+                    quantity=0,
+                    available_quantity=0,
                     description=parsed.description,
                     summary=parsed.summary,
                     image_url=parsed.image_url,
                     metadata=parsed.metadata,
                 )
-
-                for copy_index in range(1, quantity + 1):
-                    BookCopy.objects.create(
-                        inventory=book,
-                        barcode=f"REAL-{book.isbn}-{copy_index:04d}",
-                    )
+                book.quantity = quantity
+                provision_copies(book, prefix="REAL")
+                # Re-saving the recounted quantities refreshes the in-process search structures.
+                book.save(update_fields=["quantity", "available_quantity"])
 
                 seen.add(parsed.isbn)
                 created += 1
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.discovery.fuzzy import refresh_lexicon
+from core.discovery.inverted_index import rebuild_index
+from core.discovery.vectorized import rebuild_matrix
+
+
+class Command(BaseCommand):
+    help = "Rebuild the in-process search indexes and tell running workers to refresh theirs."
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        index = rebuild_index()
+        matrix = rebuild_matrix()
+        refresh_lexicon()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Indexed {len(index)} books and {index.term_count} terms in {elapsed_ms:.2f} ms."
+            )
+        )
+        if matrix is None:
+            self.stdout.write(self.style.WARNING("NumPy is not installed; skipped the vectorized catalog matrix."))
+        else:
+            self.stdout.write(f"Catalog matrix: {len(matrix)} rows x {len(matrix.vocabulary)} terms.")
+        if connection.vendor == "postgresql":
+            self.stdout.write("Refreshed the typo-correction lexicon.")
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services.inventory import reconcile_inventory_counts
+
+
+class Command(BaseCommand):
+    help = "Compare quantity and available_quantity counters with the copy records and report or repair drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="Recount drifted books from their copy records.")
+        parser.add_argument("--fail-on-drift", action="store_true", help="Exit non-zero when drift is found.")
+
+    def handle(self, *args, **options):
+        drifted = reconcile_inventory_counts(fix=options["fix"])
+        for book, quantity, available in drifted:
+            self.stdout.write(
+                f"{book.isbn} {book.title}: quantity {book.quantity} -> {quantity}, "
+                f"available {book.available_quantity} -> {available}"
+            )
+        verb = "Repaired" if options["fix"] else "Found"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(drifted)} drifted books."))
+        if drifted and options["fail_on_drift"] and not options["fix"]:
+            raise CommandError(f"{len(drifted)} books have drifted inventory counts.")
@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.services.circulation import sweep_circulation
+
+
+class Command(BaseCommand):
+    help = "Mark past-due loans overdue and expire lapsed ready holds, releasing their copies."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.CIRCULATION_SWEEP_BATCH_SIZE)
+        parser.add_argument("--loop", action="store_true", help="Keep sweeping every --interval seconds.")
+        parser.add_argument("--interval", type=int, default=settings.CIRCULATION_SWEEP_INTERVAL_SECONDS)
+
+    def handle(self, *args, **options):
+        while True:
+            counts = sweep_circulation(batch_size=options["batch_size"])
+            self.stdout.write(
+                self.style.SUCCESS(f"Marked {counts['overdue']} loans overdue, expired {counts['expired_holds']} holds.")
+            )
+            if not options["loop"]:
+                return
+            time.sleep(max(options["interval"], 1))
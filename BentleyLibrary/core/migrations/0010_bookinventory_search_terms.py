@@ -0,0 +1,84 @@
+import math
+import re
+from collections import Counter
+
+from django.db import migrations, models
+
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def backfill_search_terms(apps, schema_editor):
+    Bookinventory = apps.get_model("core", "Bookinventory")
+    batch = []
+    for book in Bookinventory.objects.only("id", "search_document").iterator(chunk_size=1000):
+        counts = Counter(TOKEN_RE.findall((book.search_document or "").lower()))
+        book.search_terms = dict(counts)
+        book.search_terms_norm = math.sqrt(sum(count * count for count in counts.values()))
+        batch.append(book)
+        if len(batch) >= 1000:
+            Bookinventory.objects.bulk_update(batch, ["search_terms", "search_terms_norm"])
+            batch = []
+    if batch:
+        Bookinventory.objects.bulk_update(batch, ["search_terms", "search_terms_norm"])
+
+
+FTS_COLUMNS = "title, subtitle, author, publisher, isbn, genre, description, summary, search_document"
+
+
+def restore_sqlite_fts(apps, schema_editor):
+    # SQLite rebuilds bookinventory to add the JSON column, which drops the FTS5 sync triggers.
+    if schema_editor.connection.vendor != "sqlite":
+        return
+
+    new_values = ", ".join(f"new.{column.strip()}" for column in FTS_COLUMNS.split(","))
+    old_values = ", ".join(f"old.{column.strip()}" for column in FTS_COLUMNS.split(","))
+    schema_editor.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS bookinventory_ai AFTER INSERT ON bookinventory BEGIN
+            INSERT INTO bookinventory_fts(rowid, {FTS_COLUMNS})
+            VALUES (new.id, {new_values});
+        END
+        """
+    )
+    schema_editor.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS bookinventory_ad AFTER DELETE ON bookinventory BEGIN
+            INSERT INTO bookinventory_fts(bookinventory_fts, rowid, {FTS_COLUMNS})
+            VALUES ('delete', old.id, {old_values});
+        END
+        """
+    )
+    schema_editor.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS bookinventory_au AFTER UPDATE ON bookinventory BEGIN
+            INSERT INTO bookinventory_fts(bookinventory_fts, rowid, {FTS_COLUMNS})
+            VALUES ('delete', old.id, {old_values});
+            INSERT INTO bookinventory_fts(rowid, {FTS_COLUMNS})
+            VALUES (new.id, {new_values});
+        END
+        """
+    )
+    schema_editor.execute("INSERT INTO bookinventory_fts(bookinventory_fts) VALUES ('rebuild')")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_productevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bookinventory",
+            name="search_terms",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name="bookinventory",
+            name="search_terms_norm",
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.RunPython(restore_sqlite_fts, migrations.RunPython.noop),
+        migrations.RunPython(backfill_search_terms, migrations.RunPython.noop),
+    ]
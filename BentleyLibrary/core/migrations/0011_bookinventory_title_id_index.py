@@ -0,0 +1,21 @@
+# Generated by Django 4.2.1 on 2026-10-18 04:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_bookinventory_search_terms'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='bookinventory',
+            name='book_title_idx',
+        ),
+        migrations.AddIndex(
+            model_name='bookinventory',
+            index=models.Index(fields=['title', 'id'], name='book_title_id_idx'),
+        ),
+    ]
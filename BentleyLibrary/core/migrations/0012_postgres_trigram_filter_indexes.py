@@ -0,0 +1,41 @@
+from django.db import migrations
+
+
+TRIGRAM_FIELDS = ("title", "author", "publisher", "genre", "isbn")
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for field in TRIGRAM_FIELDS:
+        # Django compiles icontains to UPPER(column::text) LIKE UPPER(...), so index that expression.
+        schema_editor.execute(
+            f"""
+            CREATE INDEX IF NOT EXISTS bookinventory_{field}_trgm_idx
+            ON bookinventory
+            USING GIN ((UPPER({field}::text)) gin_trgm_ops)
+            """
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    for field in TRIGRAM_FIELDS:
+        schema_editor.execute(f"DROP INDEX IF EXISTS bookinventory_{field}_trgm_idx")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0011_bookinventory_title_id_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            create_trigram_indexes,
+            drop_trigram_indexes,
+        ),
+    ]
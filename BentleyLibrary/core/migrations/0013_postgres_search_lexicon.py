@@ -0,0 +1,46 @@
+from django.db import migrations
+
+
+def create_search_lexicon(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # The 'simple' config keeps words unstemmed, so typo corrections are real catalog words.
+    schema_editor.execute(
+        """
+        CREATE MATERIALIZED VIEW IF NOT EXISTS bookinventory_lexicon AS
+        SELECT word, ndoc
+        FROM ts_stat($$SELECT to_tsvector('simple', coalesce(search_document, '')) FROM bookinventory$$)
+        """
+    )
+    schema_editor.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS bookinventory_lexicon_word_idx ON bookinventory_lexicon (word)"
+    )
+    schema_editor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS bookinventory_lexicon_trgm_idx
+        ON bookinventory_lexicon
+        USING GIN (word gin_trgm_ops)
+        """
+    )
+
+
+def drop_search_lexicon(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute("DROP MATERIALIZED VIEW IF EXISTS bookinventory_lexicon")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0012_postgres_trigram_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            create_search_lexicon,
+            drop_search_lexicon,
+        ),
+    ]
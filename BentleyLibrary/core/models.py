@@ -50,13 +50,15 @@ class Bookinventory(models.Model):
     image_url = models.URLField(max_length=500, blank=True, default="")
     metadata = models.JSONField(blank=True, default=dict)
     search_document = models.TextField(blank=True, default="")
+    search_terms = models.JSONField(blank=True, default=dict)
+    search_terms_norm = models.FloatField(default=0.0)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         db_table = "bookinventory"
         indexes = [
-            models.Index(fields=["title"], name="book_title_idx"),
+            models.Index(fields=["title", "id"], name="book_title_id_idx"),
             models.Index(fields=["author"], name="book_author_idx"),
             models.Index(fields=["publisher"], name="book_publisher_idx"),
             models.Index(fields=["isbn"], name="book_isbn_idx"),
@@ -84,8 +86,17 @@ class Bookinventory(models.Model):
         ]
         return " ".join(str(part).strip() for part in parts if part).strip()
 
+    def build_search_terms(self):
+        from .search import term_vector
+
+        return term_vector(self.search_document)
+
     def save(self, *args, **kwargs):
         self.search_document = self.build_search_document()
+        self.search_terms, self.search_terms_norm = self.build_search_terms()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "search_document" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "search_terms", "search_terms_norm"}
         super().save(*args, **kwargs)
 
     @property
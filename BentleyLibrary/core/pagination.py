@@ -0,0 +1,99 @@
+import hashlib
+import json
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+
+from .search import order_by_ranked_ids
+
+
+CURSOR_SALT = "core.pagination.cursor"
+
+
+@dataclass
+class CursorPage:
+    items: list
+    next_cursor: str
+    page_size: int
+
+    @property
+    def has_next(self):
+        return bool(self.next_cursor)
+
+
+def page_size_from(value):
+    default = getattr(settings, "SEARCH_PAGE_SIZE", 24)
+    maximum = getattr(settings, "SEARCH_MAX_PAGE_SIZE", 100)
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
+
+
+def cursor_scope(*parts):
+    # Fingerprints the query and filters a cursor was issued for, so it never resumes another list.
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def encode_cursor(kind, scope, values):
+    return signing.dumps([kind, scope, *values], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token, kind, scope):
+    if not token:
+        return None
+    try:
+        payload = signing.loads(token, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        return None
+    # A cursor from another query or page type starts over instead of skipping rows.
+    if not isinstance(payload, list) or payload[:2] != [kind, scope]:
+        return None
+    return payload[2:]
+
+
+def keyset_page(queryset, cursor, page_size, scope="", order_field="title"):
+    queryset = queryset.order_by(order_field, "id")
+    position = decode_cursor(cursor, "keyset", scope)
+    if position:
+        value, last_id = position
+        queryset = queryset.filter(Q(**{f"{order_field}__gt": value}) | Q(**{order_field: value, "id__gt": last_id}))
+
+    rows = list(queryset[: page_size + 1])
+    items = rows[:page_size]
+    next_cursor = None
+    if len(rows) > page_size:
+        last = items[-1]
+        next_cursor = encode_cursor("keyset", scope, [getattr(last, order_field), last.pk])
+    return CursorPage(items=items, next_cursor=next_cursor, page_size=page_size)
+
+
+def ranked_page(queryset, ranked_ids, cursor, page_size, scope=""):
+    start = 0
+    position = decode_cursor(cursor, "ranked", scope)
+    if position:
+        rank, last_id = position
+        if rank < len(ranked_ids) and ranked_ids[rank] == last_id:
+            start = rank + 1
+        elif last_id in ranked_ids:
+            start = ranked_ids.index(last_id) + 1
+        else:
+            # The ranking moved under us and the last book fell out; resume at the same depth.
+            start = rank + 1
+
+    page_ids = ranked_ids[start : start + page_size]
+    items = list(order_by_ranked_ids(queryset, page_ids)) if page_ids else []
+    next_cursor = None
+    if start + page_size < len(ranked_ids):
+        next_cursor = encode_cursor("ranked", scope, [start + len(page_ids) - 1, page_ids[-1]])
+    return CursorPage(items=items, next_cursor=next_cursor, page_size=page_size)
+
+
+def page_query_string(request, cursor):
+    params = request.GET.copy()
+    params["cursor"] = cursor
+    return params.urlencode()
@@ -0,0 +1,106 @@
+import re
+from dataclasses import asdict, dataclass, field
+
+from django.db import connection
+
+from .filtering import ISBN_SEPARATOR_RE
+from .search import parse_query, rerank_pool, tokenize
+
+
+ISBN_QUERY_RE = re.compile(r"\d{9}[\dX]|\d{13}")
+# Costs are in rough "postings or rows touched" units; only their ratios matter.
+ISBN_LOOKUP_COST = 1.0
+HYBRID_CANDIDATE_COST = 4.0
+VECTORIZED_CANDIDATE_COST = 1.0
+VECTORIZED_SETUP_COST = 40.0
+MIN_SELECTIVITY = 0.001
+
+
+@dataclass
+class QueryPlan:
+    query_class: str
+    strategy: str
+    estimated_cost: float
+    statistics: dict = field(default_factory=dict)
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def filter_selectivity(filters):
+    if not any(filters.values()):
+        return 1.0
+    from .discovery.bitmaps import get_bitmaps
+
+    bitmaps = get_bitmaps()
+    bitmap = bitmaps.match(filters)
+    if bitmap is None:
+        # Text filters the bitmaps cannot answer; assume they keep a tenth of the shelf.
+        return 0.1
+    return bitmap.bit_count() / len(bitmaps) if len(bitmaps) else 1.0
+
+
+def reranking_costs(postings, candidates):
+    from .discovery.vectorized import numpy_available
+
+    costs = {"hybrid": postings + candidates * HYBRID_CANDIDATE_COST}
+    if numpy_available():
+        costs["vectorized"] = postings + VECTORIZED_SETUP_COST + candidates * VECTORIZED_CANDIDATE_COST
+    return costs
+
+
+def postgres_term_statistics(terms):
+    # The lexicon view and the planner's row estimate answer from the database, so PostgreSQL
+    # workers never build the in-process index just to read document frequencies.
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = 'bookinventory'::regclass")
+        catalog_size = cursor.fetchone()[0]
+        cursor.execute("SELECT word, ndoc FROM bookinventory_lexicon WHERE word = ANY(%s)", [terms])
+        known = dict(cursor.fetchall())
+    return catalog_size, {term: known.get(term, 0) for term in terms}
+
+
+def term_statistics(terms):
+    if connection.vendor == "postgresql":
+        return postgres_term_statistics(terms)
+    from .discovery.inverted_index import get_index
+
+    index = get_index()
+    return len(index), {term: index.document_frequency(term) for term in terms}
+
+
+def plan_query(query, filters, limit):
+    query = (query or "").strip()
+    normalized = ISBN_SEPARATOR_RE.sub("", query).upper()
+    if ISBN_QUERY_RE.fullmatch(normalized):
+        return QueryPlan("isbn", "isbn", ISBN_LOOKUP_COST, {"isbn": normalized})
+
+    selectivity = filter_selectivity(filters)
+    statistics = {"filter_selectivity": round(selectivity, 4)}
+    if not query:
+        # An ordered browse walks the title index until `limit` rows pass the filters.
+        rows = limit / max(selectivity, MIN_SELECTIVITY)
+        return QueryPlan("browse", "browse", round(rows, 2), statistics)
+
+    terms = list(dict.fromkeys(tokenize(parse_query(query).text)))
+    catalog_size, frequencies = term_statistics(terms)
+    statistics["catalog_size"] = catalog_size
+    postings = sum(frequencies.values())
+    statistics["document_frequencies"] = frequencies
+    pool = rerank_pool(limit)
+
+    if len(terms) == 1 and 0 < postings <= pool:
+        # Every match fits in one page of BM25 results, so reranking cannot change which books come back.
+        # "indexed" keeps the prefix fallback for when the statistics lag the catalog.
+        return QueryPlan("rare_token", "indexed", float(postings), statistics)
+
+    if len(terms) == 1 and postings == 0:
+        # Unknown to the index; only hybrid's prefix and substring fallbacks can still match.
+        return QueryPlan("unknown_token", "hybrid", float(catalog_size * selectivity), statistics)
+
+    candidates = min(postings * selectivity, pool)
+    costs = reranking_costs(postings, candidates)
+    strategy = min(costs, key=costs.get)
+    query_class = "phrase" if len(terms) > 1 else "common_token"
+    statistics["candidate_costs"] = {name: round(cost, 2) for name, cost in costs.items()}
+    return QueryPlan(query_class, strategy, round(costs[strategy], 2), statistics)
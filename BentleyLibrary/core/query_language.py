@@ -0,0 +1,299 @@
+import re
+from dataclasses import dataclass
+from datetime import date
+from functools import lru_cache, reduce
+from operator import and_, or_
+
+from django.db import connection
+from django.db.models import Q
+
+from .filtering import FTS_TOKEN_RE, FilterPredicate, plan_available_quantity, plan_isbn, plan_text
+
+
+FIELD_ALIASES = {
+    "title": "title",
+    "author": "author",
+    "by": "author",
+    "publisher": "publisher",
+    "genre": "genre",
+    "subject": "genre",
+    "description": "description",
+    "audience": "audience",
+    "language": "language",
+    "lang": "language",
+    "isbn": "isbn",
+    "year": "year",
+    "available": "available",
+}
+KEYWORDS = {"AND", "OR", "NOT"}
+LEXER_RE = re.compile(
+    r"""
+    \s*(?:
+        (?P<open>\()
+      | (?P<close>\))
+      | (?P<minus>-(?=\S))
+      | (?P<field>[A-Za-z_]+):(?P<value>"[^"]*"?|[^\s()"]+)
+      | (?P<phrase>"[^"]*"?)
+      | (?P<word>[^\s()"]+)
+    )
+    """,
+    re.VERBOSE,
+)
+YEAR_RANGE_RE = re.compile(r"(\d{4})?\.\.(\d{4})?")
+
+
+class QuerySyntaxError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Term:
+    text: str
+    phrase: bool = False
+
+    def to_query(self):
+        return f'"{self.text}"' if self.phrase else self.text
+
+
+@dataclass(frozen=True)
+class Field:
+    # match: "text" (index-planned), "exact", "prefix", "suffix" or "contains".
+    name: str
+    value: str
+    match: str = "text"
+
+    def to_query(self):
+        value = f'"{self.value}"' if re.search(r'[\s()"]', self.value) else self.value
+        marker = {"exact": "=", "suffix": "*", "contains": "~"}.get(self.match, "")
+        if self.match == "prefix":
+            return f"{self.name}:{value}*"
+        return f"{self.name}:{marker}{value}"
+
+
+@dataclass(frozen=True)
+class Not:
+    child: object
+
+    def to_query(self):
+        return f"-{self.child.to_query()}"
+
+
+@dataclass(frozen=True)
+class And:
+    children: tuple
+
+    def to_query(self):
+        return "(" + " ".join(child.to_query() for child in self.children) + ")"
+
+
+@dataclass(frozen=True)
+class Or:
+    children: tuple
+
+    def to_query(self):
+        return "(" + " OR ".join(child.to_query() for child in self.children) + ")"
+
+
+def field_node(name, raw_value):
+    value = raw_value.strip('"')
+    match = "text"
+    if value.startswith("="):
+        match, value = "exact", value[1:]
+    elif value.startswith("~"):
+        match, value = "contains", value[1:]
+    elif value.startswith("*"):
+        match, value = "suffix", value[1:]
+    elif value.endswith("*"):
+        match, value = "prefix", value[:-1]
+    return Field(FIELD_ALIASES[name.lower()], value.strip(), match)
+
+
+def lex(query):
+    tokens = []
+    position = 0
+    query = query or ""
+    while position < len(query):
+        match = LEXER_RE.match(query, position)
+        if not match or match.end() == position:
+            break
+        position = match.end()
+        kind = match.lastgroup
+        if kind == "value":
+            name = match.group("field")
+            if name.lower() in FIELD_ALIASES:
+                tokens.append(("field", field_node(name, match.group("value"))))
+            else:
+                tokens.append(("term", Term(match.group(0).strip())))
+        elif kind == "phrase":
+            tokens.append(("term", Term(match.group("phrase").strip('"'), phrase=True)))
+        elif kind == "word":
+            word = match.group("word")
+            tokens.append(("keyword", word) if word in KEYWORDS else ("term", Term(word)))
+        elif kind:
+            tokens.append((kind, match.group(kind)))
+    return tokens
+
+
+class Parser:
+    # query := or ; or := and ("OR" and)* ; and := unary ("AND"? unary)* ; unary := ("-" | "NOT") unary | atom
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def parse(self):
+        node = self.parse_or()
+        if self.position < len(self.tokens):
+            raise QuerySyntaxError("Unbalanced parentheses in query.")
+        return node
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek() == ("keyword", "OR"):
+            self.take()
+            children.append(self.parse_and())
+        children = [child for child in children if child is not None]
+        if not children:
+            return None
+        return children[0] if len(children) == 1 else Or(tuple(children))
+
+    def parse_and(self):
+        children = []
+        while True:
+            kind, value = self.peek()
+            if kind is None or kind == "close" or (kind, value) == ("keyword", "OR"):
+                break
+            if (kind, value) == ("keyword", "AND"):
+                self.take()
+                continue
+            node = self.parse_unary()
+            if node is not None:
+                children.append(node)
+        if not children:
+            return None
+        return children[0] if len(children) == 1 else And(tuple(children))
+
+    def parse_unary(self):
+        kind, value = self.take()
+        if kind == "minus" or (kind, value) == ("keyword", "NOT"):
+            child = self.parse_unary()
+            return Not(child) if child is not None else None
+        if kind == "open":
+            node = self.parse_or()
+            if self.take()[0] != "close":
+                raise QuerySyntaxError("Unbalanced parentheses in query.")
+            return node
+        if kind == "close":
+            raise QuerySyntaxError("Unbalanced parentheses in query.")
+        return value
+
+
+@lru_cache(maxsize=256)
+def parse(query):
+    return Parser(lex(query)).parse()
+
+
+def walk(node):
+    yield node
+    for child in getattr(node, "children", ()) or ((node.child,) if isinstance(node, Not) else ()):
+        yield from walk(child)
+
+
+def is_structured(node):
+    return any(isinstance(part, (Field, Not)) for part in walk(node))
+
+
+def split_query(query):
+    # Plain words and phrases stay in the ranked text; fields and negations become a filter expression.
+    try:
+        node = parse(query)
+    except QuerySyntaxError:
+        return query, ""
+    if node is None or not is_structured(node):
+        return query, ""
+    if isinstance(node, Or):
+        return "", node.to_query()
+    parts = node.children if isinstance(node, And) else (node,)
+    text = [part for part in parts if isinstance(part, Term)]
+    expression = [part for part in parts if not isinstance(part, Term)]
+    expression = expression[0] if len(expression) == 1 else And(tuple(expression))
+    return " ".join(part.to_query() for part in text), expression.to_query()
+
+
+def year_bounds(value):
+    match = YEAR_RANGE_RE.fullmatch(value)
+    if match:
+        start, end = match.groups()
+    elif re.fullmatch(r"\d{4}", value):
+        start = end = value
+    else:
+        return None
+    return (date(int(start), 1, 1) if start else None, date(int(end), 12, 31) if end else None)
+
+
+def full_text_q(term, vendor):
+    tokens = FTS_TOKEN_RE.findall(term.text.lower())
+    if not tokens:
+        # Punctuation-only terms have nothing to match.
+        return Q(pk__in=[])
+    if vendor == "postgresql":
+        function = "phraseto_tsquery" if term.phrase else "plainto_tsquery"
+        return FilterPredicate("search_document", "tsquery", "match", (function, term.text)).as_q()
+    if vendor == "sqlite":
+        expression = f'"{" ".join(tokens)}"' if term.phrase else " AND ".join(f'"{token}"*' for token in tokens)
+        return FilterPredicate("search_document", "fts", "match", expression).as_q()
+    return Q(search_document__icontains=term.text)
+
+
+def field_q(node, vendor):
+    name, value, match = node.name, node.value, node.match
+    nothing = Q(pk__in=[])
+    if not value:
+        return Q()
+    if name == "year":
+        bounds = year_bounds(value)
+        if bounds is None:
+            return nothing
+        start, end = bounds
+        return Q(**({"published_date__gte": start} if start else {})) & Q(**({"published_date__lte": end} if end else {}))
+    if name == "available":
+        predicate = plan_available_quantity(value)
+        return predicate.as_q() if predicate else nothing
+    if name in ("audience", "language") or match == "exact":
+        return Q(**{f"{name}__iexact": value})
+    if match == "prefix":
+        return Q(**{f"{name}__istartswith": value})
+    if match == "suffix":
+        return Q(**{f"{name}__iendswith": value})
+    if name == "isbn":
+        predicate = plan_isbn(value, vendor)
+        # Partial ISBNs are matched anywhere, as the catalog builder always has.
+        return Q(isbn__icontains=predicate.value) if predicate.strategy == "prefix" else predicate.as_q()
+    if match == "contains":
+        return Q(**{f"{name}__icontains": value})
+    return plan_text(name, value, vendor).as_q()
+
+
+def compile_node(node, vendor=None):
+    vendor = vendor or connection.vendor
+    if node is None:
+        return Q()
+    if isinstance(node, Term):
+        return full_text_q(node, vendor)
+    if isinstance(node, Field):
+        return field_q(node, vendor)
+    if isinstance(node, Not):
+        return ~compile_node(node.child, vendor)
+    combine = and_ if isinstance(node, And) else or_
+    return reduce(combine, (compile_node(child, vendor) for child in node.children))
+
+
+def compile_query(query, vendor=None):
+    return compile_node(parse(query), vendor=vendor)
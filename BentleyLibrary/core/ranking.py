@@ -0,0 +1,49 @@
+import heapq
+import itertools
+
+
+# Keeps the k best-scoring items; ties go to the item pushed first, like a stable sort.
+class TopK:
+    def __init__(self, k):
+        self.k = k
+        self._heap = []
+        self._sequence = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    @property
+    def full(self):
+        return self.k is not None and len(self._heap) >= self.k
+
+    @property
+    def threshold(self):
+        # Candidates whose best possible score cannot beat this can be skipped before scoring.
+        return self._heap[0][0] if self.full else float("-inf")
+
+    def can_admit(self, upper_bound):
+        return not self.full or upper_bound > self.threshold
+
+    def push(self, score, item):
+        entry = (score, -next(self._sequence), item)
+        if not self.full:
+            heapq.heappush(self._heap, entry)
+            return True
+        if entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+            return True
+        return False
+
+    def results(self):
+        return [(item, score) for score, _sequence, item in sorted(self._heap, key=lambda entry: entry[:2], reverse=True)]
+
+
+def top_k(scored, k=None):
+    if k is None:
+        return sorted(scored, key=lambda pair: pair[1], reverse=True)
+    if k <= 0:
+        return []
+    selector = TopK(k)
+    for item, score in scored:
+        selector.push(score, item)
+    return selector.results()
@@ -6,6 +6,8 @@ from urllib.request import Request, urlopen
 
 from django.conf import settings
 
+from .ranking import TopK
+
 
 TOKEN_RE = re.compile(r"[a-z0-9]+")
 
@@ -32,11 +34,18 @@ def candidate_payload(book):
     }
 
 
-def fallback_rank(query, intent, books):
+def fallback_rank(query, intent, books, limit=None):
     query_tokens = Counter(tokenize(query))
     intent_tokens = Counter(tokenize(" ".join(intent.get("tags", [])) + " " + intent.get("course_focus", "")))
-    ranked = []
+    # Token overlap can never exceed the query's own token counts, which bounds a book's score before tokenizing it.
+    match_ceiling = sum(query_tokens.values()) * 1.4 + sum(intent_tokens.values()) * 1.1
+    selector = TopK(limit)
     for book in books:
+        availability = 1.5 if book.available_quantity > 0 else 0.2
+        freshness = 0.2 if book.published_date and book.published_date.year >= 2010 else 0.0
+        if not selector.can_admit(match_ceiling + availability + freshness):
+            continue
+
         haystack = " ".join(
             [
                 book.title,
@@ -50,18 +59,15 @@ def fallback_rank(query, intent, books):
         document_tokens = Counter(tokenize(haystack))
         lexical = sum(min(query_tokens[token], document_tokens[token]) for token in query_tokens)
         intent_score = sum(min(intent_tokens[token], document_tokens[token]) for token in intent_tokens)
-        availability = 1.5 if book.available_quantity > 0 else 0.2
-        freshness = 0.2 if book.published_date and book.published_date.year >= 2010 else 0.0
         score = lexical * 1.4 + intent_score * 1.1 + availability + freshness
         reason = "Strong topic match"
         if book.available_quantity > 0:
             reason += " and available now"
         else:
             reason += " with strong shelf relevance"
-        ranked.append((book, score, reason))
+        selector.push(score, (book, reason))
 
-    ranked.sort(key=lambda item: item[1], reverse=True)
-    return ranked
+    return [(book, score, reason) for (book, reason), score in selector.results()]
 
 
 def go_rank(query, intent, books):
@@ -98,5 +104,8 @@ def go_rank(query, intent, books):
     return ranked or None
 
 
-def rank_candidates(query, intent, books):
-    return go_rank(query, intent, books) or fallback_rank(query, intent, books)
+def rank_candidates(query, intent, books, limit=None):
+    ranked = go_rank(query, intent, books)
+    if ranked:
+        return ranked[:limit]
+    return fallback_rank(query, intent, books, limit=limit)
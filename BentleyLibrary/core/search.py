@@ -1,16 +1,27 @@
+import json
 import math
 import re
 import time
 from collections import Counter
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
+from django.conf import settings
 from django.db import connection
-from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models import Q
 
+from .discovery import result_cache
+from .filtering import compile_filters, plan_isbn
 from .models import Bookinventory
+from .ranking import TopK
 
 
 TOKEN_RE = re.compile(r"[a-z0-9]+")
+MAX_PK_IN_IDS = 2000
+PHRASE_RE = re.compile(r'"([^"]*)"?')
+# Upper-case only, as in FTS5, so "near" stays an ordinary word in titles like "Near Eastern Art".
+NEAR_RE = re.compile(r"([A-Za-z0-9]+)\s+NEAR(?:/(\d+))?\s+([A-Za-z0-9]+)")
+DEFAULT_NEAR_DISTANCE = 10
+MAX_NEAR_DISTANCE = 20
 
 
 @dataclass
@@ -19,6 +30,14 @@ class SearchResponse:
     strategy: str
     latency_ms: float
     ranked_ids: list
+    cache_status: str = "bypass"
+    cache_stats: dict = field(default_factory=dict)
+    corrected_query: str = ""
+    corrections: dict = field(default_factory=dict)
+    winning_branch: str = ""
+    facets: dict = field(default_factory=dict)
+    facet_latency_ms: float = 0.0
+    plan: object = None
 
 
 def postgres_search_vector():
@@ -39,64 +58,179 @@ def tokenize(text):
     return TOKEN_RE.findall((text or "").lower())
 
 
-def semantic_score(query, document):
-    query_tokens = tokenize(query)
-    document_tokens = tokenize(document)
-    if not query_tokens or not document_tokens:
+@dataclass(frozen=True)
+class ProximityConstraint:
+    # "phrase": terms adjacent and in order; "near": two terms at most `distance` tokens apart.
+    kind: str
+    terms: tuple
+    distance: int = 0
+
+
+@dataclass(frozen=True)
+class ParsedQuery:
+    text: str
+    constraints: tuple = ()
+
+    @property
+    def free_terms(self):
+        constrained = {term for constraint in self.constraints for term in constraint.terms}
+        return [term for term in dict.fromkeys(tokenize(self.text)) if term not in constrained]
+
+
+def parse_query(query):
+    constraints = []
+
+    def phrase(match):
+        terms = tuple(tokenize(match.group(1)))
+        if terms:
+            constraints.append(ProximityConstraint("phrase", terms))
+        return f" {' '.join(terms)} "
+
+    def near(match):
+        distance = min(int(match.group(2) or DEFAULT_NEAR_DISTANCE), MAX_NEAR_DISTANCE)
+        terms = (match.group(1).lower(), match.group(3).lower())
+        constraints.append(ProximityConstraint("near", terms, distance))
+        return f" {terms[0]} {terms[1]} "
+
+    text = NEAR_RE.sub(near, PHRASE_RE.sub(phrase, query or ""))
+    return ParsedQuery(" ".join(tokenize(text)), tuple(constraints))
+
+
+def fts5_expression(parsed):
+    clauses = []
+    free_terms = parsed.free_terms
+    if free_terms:
+        clauses.append(f"({' OR '.join(free_terms)})")
+    for constraint in parsed.constraints:
+        quoted = " ".join(f'"{term}"' for term in constraint.terms)
+        if constraint.kind == "phrase":
+            clauses.append(f'"{" ".join(constraint.terms)}"')
+        else:
+            clauses.append(f"NEAR({quoted}, {constraint.distance})")
+    return " AND ".join(clauses)
+
+
+def postgres_near_tsquery(constraint):
+    # <k> pins the exact gap, so "within N tokens, either order" is a disjunction over the gaps.
+    left, right = constraint.terms
+    gaps = range(1, constraint.distance + 2)
+    return " | ".join(f"{a} <{gap}> {b}" for gap in gaps for a, b in ((left, right), (right, left)))
+
+
+def postgres_tsquery(parsed):
+    # Returns the SQL tsquery expression and its params; the free terms keep plainto_tsquery's OR-less AND.
+    parts, params = [], []
+    if parsed.free_terms:
+        parts.append("plainto_tsquery('english', %s)")
+        params.append(" ".join(parsed.free_terms))
+    for constraint in parsed.constraints:
+        if constraint.kind == "phrase":
+            parts.append("phraseto_tsquery('english', %s)")
+            params.append(" ".join(constraint.terms))
+        else:
+            parts.append("to_tsquery('english', %s)")
+            params.append(postgres_near_tsquery(constraint))
+    return " && ".join(parts) or "plainto_tsquery('english', '')", params
+
+
+def term_vector(text):
+    counts = Counter(tokenize(text))
+    norm = math.sqrt(sum(count * count for count in counts.values()))
+    return dict(counts), norm
+
+
+def vector_score(query_terms, query_norm, document_terms, document_norm):
+    if not query_norm or not document_norm:
         return 0.0
+    overlap = sum(min(count, document_terms.get(token, 0)) for token, count in query_terms.items())
+    return overlap / (query_norm * document_norm)
 
-    query_counts = Counter(query_tokens)
-    document_counts = Counter(document_tokens)
-    overlap = sum(min(query_counts[token], document_counts[token]) for token in query_counts)
-    norm = math.sqrt(sum(count * count for count in query_counts.values())) * math.sqrt(
-        sum(count * count for count in document_counts.values())
-    )
-    if not norm:
-        return 0.0
-    return overlap / norm
+
+def semantic_score(query, document):
+    return vector_score(*term_vector(query), *term_vector(document))
 
 
 def apply_filters(queryset, filters):
-    published_date_start = filters.get("published_date_start")
-    published_date_end = filters.get("published_date_end")
-    available_quantity = filters.get("available_quantity")
-    title = filters.get("title")
-    author = filters.get("author")
-    publisher = filters.get("publisher")
-    isbn = filters.get("isbn")
-    genre = filters.get("genre")
-    audience = filters.get("audience")
-
-    if published_date_start:
-        queryset = queryset.filter(published_date__gte=published_date_start)
-    if published_date_end:
-        queryset = queryset.filter(published_date__lte=published_date_end)
-    if available_quantity:
-        queryset = queryset.filter(available_quantity=available_quantity)
-    if title:
-        queryset = queryset.filter(title__icontains=title)
-    if author:
-        queryset = queryset.filter(author__icontains=author)
-    if publisher:
-        queryset = queryset.filter(publisher__icontains=publisher)
-    if isbn:
-        queryset = queryset.filter(isbn__icontains=isbn)
-    if genre:
-        queryset = queryset.filter(genre__icontains=genre)
-    if audience:
-        queryset = queryset.filter(audience__iexact=audience)
-    return queryset
+    return compile_filters(queryset, filters)
+
+
+class RankedResults:
+    def __init__(self, queryset, ranked_ids):
+        self.queryset = queryset
+        self.ranked_ids = list(ranked_ids)
+        self._result_cache = None
+
+    def __iter__(self):
+        return iter(self._results())
+
+    def __len__(self):
+        return len(self._results())
+
+    def __bool__(self):
+        return bool(self._results())
+
+    def __getitem__(self, item):
+        if self._result_cache is not None or not isinstance(item, slice):
+            return self._results()[item]
+
+        start, stop = item.start or 0, item.stop
+        if item.step or start < 0 or stop is None or stop < 0:
+            return self._results()[item]
+        return self._hydrate(stop)[start:stop]
+
+    def __repr__(self):
+        return f"<RankedResults ids={self.ranked_ids[:10]!r}{'...' if len(self.ranked_ids) > 10 else ''}>"
+
+    def count(self):
+        return len(self)
+
+    def exists(self):
+        return bool(self._hydrate(1))
+
+    def none(self):
+        return self.queryset.none()
+
+    def filter(self, *args, **kwargs):
+        return RankedResults(self.queryset.filter(*args, **kwargs), self.ranked_ids)
+
+    def exclude(self, *args, **kwargs):
+        return RankedResults(self.queryset.exclude(*args, **kwargs), self.ranked_ids)
+
+    def values(self, *fields):
+        return self.queryset.filter(pk__in=self.ranked_ids).values(*fields)
+
+    def values_list(self, *fields, **kwargs):
+        return self.queryset.filter(pk__in=self.ranked_ids).values_list(*fields, **kwargs)
+
+    def _results(self):
+        if self._result_cache is None:
+            self._result_cache = self._fetch(self.ranked_ids)
+        return self._result_cache
+
+    def _hydrate(self, count):
+        # Rows can drop out when the queryset is narrowed after ranking, so keep
+        # fetching the next window of ids until the page is full.
+        rows = []
+        position = 0
+        while len(rows) < count and position < len(self.ranked_ids):
+            window = self.ranked_ids[position : position + count - len(rows)]
+            rows.extend(self._fetch(window))
+            position += len(window)
+        if position >= len(self.ranked_ids):
+            self._result_cache = rows
+        return rows
+
+    def _fetch(self, ids):
+        if not ids:
+            return []
+        rows = self.queryset.in_bulk(ids)
+        return [rows[pk] for pk in ids if pk in rows]
 
 
 def order_by_ranked_ids(queryset, ranked_ids):
     if not ranked_ids:
         return queryset.none()
-
-    preserved = Case(
-        *[When(pk=pk, then=Value(position)) for position, pk in enumerate(ranked_ids)],
-        output_field=IntegerField(),
-    )
-    return queryset.filter(pk__in=ranked_ids).order_by(preserved)
+    return RankedResults(queryset, ranked_ids)
 
 
 def baseline_queryset(query, filters):
@@ -104,6 +238,15 @@ def baseline_queryset(query, filters):
     if not query:
         return queryset.order_by("title")
 
+    parsed = parse_query(query)
+    if parsed.constraints:
+        # Substring matching on search_document approximates the phrase and NEAR semantics.
+        for constraint in parsed.constraints:
+            terms = [" ".join(constraint.terms)] if constraint.kind == "phrase" else constraint.terms
+            for term in terms:
+                queryset = queryset.filter(search_document__icontains=term)
+        return queryset.order_by("title")
+
     filter_query = (
         Q(title__icontains=query)
         | Q(subtitle__icontains=query)
@@ -117,61 +260,136 @@ def baseline_queryset(query, filters):
     return queryset.filter(filter_query).order_by("title")
 
 
-def sqlite_fts_ids(query, limit):
-    sql = """
+def sqlite_fts_ids(query, queryset=None):
+    # Every book FTS5 matches, best bm25() first. Triggers keep the table current for every
+    # process, so this is the membership answer on SQLite; only ids come back.
+    expression = fts5_expression(parse_query(query))
+    if not expression:
+        return []
+
+    params = [expression]
+    filter_sql = ""
+    if queryset is not None:
+        subquery, subquery_params = queryset.values("id").query.sql_with_params()
+        filter_sql = f"AND rowid IN ({subquery})"
+        params.extend(subquery_params)
+
+    sql = f"""
         SELECT rowid
         FROM bookinventory_fts
-        WHERE bookinventory_fts MATCH ?
+        WHERE bookinventory_fts MATCH %s {filter_sql}
         ORDER BY bm25(bookinventory_fts)
-        LIMIT ?
     """
-    terms = tokenize(query)
-    if not terms:
-        return []
-
-    match_query = " OR ".join(terms)
     with connection.cursor() as cursor:
-        cursor.execute(sql, [match_query, limit])
+        cursor.execute(sql, params)
         return [row[0] for row in cursor.fetchall()]
 
 
-def indexed_queryset(query, filters, limit=50):
-    queryset = apply_filters(Bookinventory.objects.all(), filters)
-    if not query:
-        return queryset.order_by("title"), []
+def database_match_ids(query, queryset=None):
+    # Live membership for backends without an FTS5 table. Substring matches on search_document
+    # are a superset of the tokens BM25F matches, so the index still decides what scores.
+    parsed = parse_query(query)
+    terms = tokenize(parsed.text)
+    if not terms:
+        return []
 
+    queryset = Bookinventory.objects.all() if queryset is None else queryset
+    any_term = Q()
+    for term in terms:
+        any_term |= Q(search_document__icontains=term)
+    queryset = queryset.filter(any_term)
+    for constraint in parsed.constraints:
+        terms = [" ".join(constraint.terms)] if constraint.kind == "phrase" else constraint.terms
+        for term in terms:
+            queryset = queryset.filter(search_document__icontains=term)
+    return list(queryset.values_list("id", flat=True))
+
+
+def index_search(query, limit=None, queryset=None):
+    # BM25F ranking over the books the database says match; pass the filtered queryset to restrict them.
+    from .discovery.inverted_index import get_index, index_queryset
+
+    index = get_index()
+    exhaustive = connection.vendor == "sqlite"
+    matched = sqlite_fts_ids(query, queryset) if exhaustive else database_match_ids(query, queryset)
+
+    # The database decides which books match and the in-process index only orders them, so books
+    # saved by another worker are indexed on sight and deleted ones drop out.
+    unseen = [book_id for book_id in matched if book_id not in index]
+    for start in range(0, len(unseen), MAX_PK_IN_IDS):
+        for book in index_queryset().filter(pk__in=unseen[start : start + MAX_PK_IN_IDS]):
+            index.add(book)
+
+    ranked = index.search(query, limit=limit, allowed=set(matched))
+    if not exhaustive or (limit and len(ranked) >= limit):
+        return ranked
+    # FTS5 matches BM25F cannot score keep their bm25() order after the scored ones.
+    scored = {book_id for book_id, _score in ranked}
+    ranked += [(book_id, 0.0) for book_id in matched if book_id not in scored]
+    return ranked[:limit] if limit else ranked
+
+
+def postgres_candidates(query, queryset, filters, limit, columns=()):
+    parsed = parse_query(query)
+    if not any(filters.values()):
+        tsquery, tsquery_params = postgres_tsquery(parsed)
+        select = ", ".join(["id", f"ts_rank(search_vector, {tsquery}) AS rank", *columns])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT {select}
+                FROM bookinventory
+                WHERE search_vector @@ ({tsquery})
+                ORDER BY rank DESC, title ASC
+                LIMIT %s
+                """,
+                [*tsquery_params, *tsquery_params, limit],
+            )
+            return cursor.fetchall()
+
+    from django.contrib.postgres.search import SearchQuery, SearchRank
+
+    vector = postgres_search_vector()
+    search_query = SearchQuery(" ".join(parsed.free_terms), search_type="plain", config="english")
+    for constraint in parsed.constraints:
+        if constraint.kind == "phrase":
+            search_query &= SearchQuery(" ".join(constraint.terms), search_type="phrase", config="english")
+        else:
+            search_query &= SearchQuery(postgres_near_tsquery(constraint), search_type="raw", config="english")
+    ranked = queryset.annotate(rank=SearchRank(vector, search_query)).filter(rank__gt=0.0)
+    ranked = ranked.order_by("-rank", "title")
+    return list(ranked.values_list("id", "rank", *columns)[:limit])
+
+
+def ranked_columns(ranked, queryset, columns):
+    # Candidate columns are only fetched for the ranked top k, never for every match.
+    ranked_ids = [book_id for book_id, _score in ranked]
+    rows = {row[0]: row[1:] for row in queryset.filter(pk__in=ranked_ids).values_list("id", *columns)}
+    return [(book_id, score, *rows[book_id]) for book_id, score in ranked if book_id in rows]
+
+
+def bm25_candidates(query, queryset, filters, limit, columns=()):
+    # Membership and filters are both answered in SQL, so the ranker only needs the top `limit`.
+    ranked = index_search(query, limit=limit, queryset=queryset if any(filters.values()) else None)
+    if not ranked or not columns:
+        return ranked
+    return ranked_columns(ranked, queryset, columns)
+
+
+def unranked_candidates(queryset, limit, columns=()):
+    return [(row[0], 0.0, *row[1:]) for row in queryset.values_list("id", *columns)[:limit]]
+
+
+def lexical_candidates(query, filters, limit=50, columns=()):
+    queryset = apply_filters(Bookinventory.objects.all(), filters)
     if connection.vendor == "postgresql":
-        from django.contrib.postgres.search import SearchQuery, SearchRank
-
-        if not any(filters.values()):
-            with connection.cursor() as cursor:
-                cursor.execute(
-                    """
-                    SELECT id
-                    FROM bookinventory
-                    WHERE search_vector @@ plainto_tsquery('english', %s)
-                    ORDER BY ts_rank(search_vector, plainto_tsquery('english', %s)) DESC, title ASC
-                    LIMIT %s
-                    """,
-                    [query, query, limit],
-                )
-                ids = [row[0] for row in cursor.fetchall()]
-            return order_by_ranked_ids(queryset, ids), ids
-
-        vector = postgres_search_vector()
-        search_query = SearchQuery(query, search_type="plain", config="english")
-        ranked = queryset.annotate(rank=SearchRank(vector, search_query)).filter(rank__gt=0.0)
-        ranked = ranked.order_by("-rank", "title")
-        ids = list(ranked.values_list("id", flat=True)[:limit])
-        return order_by_ranked_ids(queryset, ids), ids
-
-    if connection.vendor == "sqlite":
-        try:
-            ids = sqlite_fts_ids(query, limit)
-        except Exception:
-            ids = []
-        if ids:
-            return order_by_ranked_ids(queryset, ids), ids
+        return postgres_candidates(query, queryset, filters, limit, columns)
+
+    # SQLite and MySQL share the in-process BM25F ranker so they weigh fields like ts_rank does.
+    rows = bm25_candidates(query, queryset, filters, limit, columns)
+    parsed = parse_query(query)
+    if rows or parsed.constraints:
+        return rows
 
     prefix_query = (
         Q(title__istartswith=query)
@@ -180,54 +398,206 @@ def indexed_queryset(query, filters, limit=50):
         | Q(genre__istartswith=query)
         | Q(isbn__iexact=query)
     )
-    ranked = queryset.filter(prefix_query).order_by("title")
-    ids = list(ranked.values_list("id", flat=True)[:limit])
-    return ranked, ids
+    return unranked_candidates(queryset.filter(prefix_query).order_by("title"), limit, columns)
 
 
-def hybrid_queryset(query, filters, limit=50):
-    queryset = apply_filters(Bookinventory.objects.all(), filters)
-    indexed, indexed_ids = indexed_queryset(query, filters, limit=limit)
-    candidates = list(indexed[:limit]) if indexed_ids else list(baseline_queryset(query, filters)[:limit])
+def indexed_queryset(query, filters, limit=50):
+    if not query:
+        return apply_filters(Bookinventory.objects.all(), filters).order_by("title"), []
+
+    ids = [row[0] for row in lexical_candidates(query, filters, limit=limit)]
+    return order_by_ranked_ids(Bookinventory.objects.all(), ids), ids
 
+
+def inmemory_queryset(query, filters, limit=50):
+    queryset = apply_filters(Bookinventory.objects.all(), filters)
     if not query:
-        ids = [book.id for book in candidates]
-        return order_by_ranked_ids(queryset, ids), ids
+        return queryset.order_by("title"), []
+
+    ranked = index_search(query, limit=limit, queryset=queryset if any(filters.values()) else None)
+    ids = [book_id for book_id, _score in ranked]
+    return order_by_ranked_ids(queryset, ids), ids
+
 
-    scored = []
+def lexical_scores(candidates):
+    top_rank = max((row[1] for row in candidates), default=0.0)
+    if top_rank > 0:
+        return [row[1] / top_rank for row in candidates]
+    # Unranked fallbacks only carry an order, so score by position instead.
     total_candidates = len(candidates) or 1
-    for position, book in enumerate(candidates):
-        lexical_score = 1 - (position / total_candidates)
-        meaning_score = semantic_score(query, book.search_document)
-        freshness_score = 0.1 if book.available_quantity > 0 else 0.0
-        scored.append((book.id, lexical_score * 0.65 + meaning_score * 0.3 + freshness_score * 0.05))
+    return [1 - (position / total_candidates) for position in range(len(candidates))]
 
-    scored.sort(key=lambda item: item[1], reverse=True)
-    ranked_ids = [book_id for book_id, _score in scored]
-    return order_by_ranked_ids(queryset, ranked_ids), ranked_ids
 
+HYBRID_CANDIDATE_COLUMNS = ("search_terms", "search_terms_norm", "available_quantity")
+# Upper bound on what the meaning (at most 1.0) and freshness (at most 0.1) signals add to a hybrid score.
+HYBRID_SIGNAL_CEILING = 0.3 + 0.1 * 0.05
 
-def search_books(query="", filters=None, strategy="auto", limit=50):
-    filters = filters or {}
-    requested_strategy = strategy or "auto"
-    started = time.perf_counter()
 
+def rerank_pool(limit):
+    return max(limit, getattr(settings, "SEARCH_RERANK_POOL", 0))
+
+
+def hybrid_queryset(query, filters, limit=50):
+    if not query:
+        return baseline_queryset(query, filters), []
+
+    pool = rerank_pool(limit)
+    candidates = lexical_candidates(query, filters, limit=pool, columns=HYBRID_CANDIDATE_COLUMNS)
+    if not candidates:
+        candidates = unranked_candidates(
+            baseline_queryset(query, filters), pool, HYBRID_CANDIDATE_COLUMNS
+        )
+
+    query_terms, query_norm = term_vector(parse_query(query).text)
+    selector = TopK(limit)
+    candidate_rows = zip(candidates, lexical_scores(candidates))
+    for (book_id, _rank, search_terms, search_terms_norm, available_quantity), lexical_score in candidate_rows:
+        # Candidates arrive in lexical order and the other signals are capped, so nothing later can place.
+        if not selector.can_admit(lexical_score * 0.65 + HYBRID_SIGNAL_CEILING):
+            break
+        if isinstance(search_terms, str):
+            search_terms = json.loads(search_terms)
+        meaning_score = vector_score(query_terms, query_norm, search_terms, search_terms_norm)
+        freshness_score = 0.1 if available_quantity > 0 else 0.0
+        selector.push(lexical_score * 0.65 + meaning_score * 0.3 + freshness_score * 0.05, book_id)
+
+    ranked_ids = [book_id for book_id, _score in selector.results()]
+    return order_by_ranked_ids(Bookinventory.objects.all(), ranked_ids), ranked_ids
+
+
+def vectorized_queryset(query, filters, limit=50):
+    from .discovery.vectorized import get_matrix
+
+    matrix = get_matrix() if query else None
+    if matrix is None:
+        return hybrid_queryset(query, filters, limit=limit)
+
+    pool = rerank_pool(limit)
+    candidates = lexical_candidates(query, filters, limit=pool, columns=("available_quantity",))
+    if not candidates:
+        candidates = unranked_candidates(baseline_queryset(query, filters), pool, ("available_quantity",))
+
+    ranked_ids = matrix.rank_candidates(
+        *term_vector(parse_query(query).text),
+        [row[0] for row in candidates],
+        lexical_scores(candidates),
+        [row[2] for row in candidates],
+        limit=limit,
+    )
+    return order_by_ranked_ids(Bookinventory.objects.all(), ranked_ids), ranked_ids
+
+
+def isbn_queryset(query, filters, limit=50):
+    predicate = plan_isbn(query, connection.vendor)
+    queryset = apply_filters(Bookinventory.objects.all(), filters).filter(predicate.as_q())
+    ids = list(queryset.order_by("title", "id").values_list("id", flat=True)[:limit])
+    return order_by_ranked_ids(Bookinventory.objects.all(), ids), ids
+
+
+def run_strategy(query, filters, requested_strategy, limit):
+    if requested_strategy == "browse":
+        return baseline_queryset("", filters), [], "browse"
+    if requested_strategy == "isbn":
+        queryset, ranked_ids = isbn_queryset(query, filters, limit=limit)
+        if ranked_ids:
+            return queryset, ranked_ids, "isbn"
+        # A number that is no catalogued ISBN may still appear in a title or description.
+        requested_strategy = "hybrid"
     if requested_strategy == "baseline":
         queryset = baseline_queryset(query, filters)
         ranked_ids = list(queryset.values_list("id", flat=True)[:limit])
         queryset = order_by_ranked_ids(queryset, ranked_ids) if ranked_ids else queryset.none()
-        actual_strategy = "baseline"
-    elif requested_strategy == "indexed":
-        queryset, ranked_ids = indexed_queryset(query, filters, limit=limit)
-        actual_strategy = "indexed"
+        return queryset, ranked_ids, "baseline"
+    if requested_strategy == "indexed":
+        return (*indexed_queryset(query, filters, limit=limit), "indexed")
+    if requested_strategy == "inmemory":
+        return (*inmemory_queryset(query, filters, limit=limit), "inmemory")
+    if requested_strategy == "vectorized":
+        from .discovery.vectorized import numpy_available
+
+        actual_strategy = "vectorized" if numpy_available() else "hybrid"
+        return (*vectorized_queryset(query, filters, limit=limit), actual_strategy)
+
+    actual_strategy = "hybrid" if requested_strategy in {"auto", "hybrid", "hedged"} else "baseline"
+    return (*hybrid_queryset(query, filters, limit=limit), actual_strategy)
+
+
+def search_books(query="", filters=None, strategy="auto", limit=50, include_facets=False):
+    filters = filters or {}
+    requested_strategy = strategy or "auto"
+    started = time.perf_counter()
+
+    # Browse pages are plain ordered querysets, so only ranked queries go through the cache.
+    backend = result_cache.get_result_cache() if query else None
+    cache_key = result_cache.result_cache_key(query, filters, requested_strategy, limit) if backend else None
+    cached = backend.get(cache_key) if backend else None
+
+    if cached is not None:
+        from .planner import QueryPlan
+
+        actual_strategy, ranked_ids = cached["strategy"], cached["ranked_ids"]
+        corrected_query, corrections = cached["corrected_query"], cached["corrections"]
+        winning_branch = cached["winning_branch"]
+        plan = QueryPlan(**cached["plan"]) if cached["plan"] else None
+        queryset = order_by_ranked_ids(Bookinventory.objects.all(), ranked_ids)
+        cache_status = "hit"
     else:
-        actual_strategy = "hybrid" if requested_strategy in {"auto", "hybrid"} else "baseline"
-        queryset, ranked_ids = hybrid_queryset(query, filters, limit=limit)
+        from .discovery.fuzzy import rewrite_query
+        from .planner import plan_query
+
+        rewrite = rewrite_query(query)
+        corrected_query, corrections = rewrite.corrected, rewrite.corrections
+        winning_branch, plan = "", None
+        if requested_strategy == "auto":
+            plan = plan_query(rewrite.query, filters, limit)
+            queryset, ranked_ids, actual_strategy = run_strategy(rewrite.query, filters, plan.strategy, limit)
+        elif requested_strategy == "hedged" and rewrite.query:
+            from .discovery.hedged import hedged_search
+
+            ranked_ids, winning_branch = hedged_search(rewrite.query, filters, limit)
+            queryset, actual_strategy = order_by_ranked_ids(Bookinventory.objects.all(), ranked_ids), "hedged"
+        else:
+            queryset, ranked_ids, actual_strategy = run_strategy(rewrite.query, filters, requested_strategy, limit)
+        cache_status = "bypass"
+        if backend:
+            backend.set(
+                cache_key,
+                {
+                    "strategy": actual_strategy,
+                    "ranked_ids": list(ranked_ids),
+                    "corrected_query": corrected_query,
+                    "corrections": corrections,
+                    "winning_branch": winning_branch,
+                    "plan": plan.as_dict() if plan else None,
+                },
+            )
+            cache_status = "miss"
+
+    if backend:
+        result_cache.stats.record(cache_status == "hit")
 
     latency_ms = (time.perf_counter() - started) * 1000
+
+    facets, facet_latency_ms = {}, 0.0
+    if include_facets:
+        from .discovery.facets import facet_counts
+
+        facet_started = time.perf_counter()
+        # Ranked searches facet the ranked result set; browse pages facet the whole filtered shelf.
+        facets = facet_counts(Bookinventory.objects.filter(id__in=ranked_ids) if query else queryset)
+        facet_latency_ms = (time.perf_counter() - facet_started) * 1000
+
     return SearchResponse(
         queryset=queryset,
         strategy=actual_strategy,
         latency_ms=latency_ms,
         ranked_ids=ranked_ids,
+        cache_status=cache_status,
+        cache_stats=result_cache.stats.snapshot(),
+        corrected_query=corrected_query,
+        corrections=corrections,
+        winning_branch=winning_branch,
+        facets=facets,
+        facet_latency_ms=facet_latency_ms,
+        plan=plan,
     )
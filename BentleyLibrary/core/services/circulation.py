@@ -0,0 +1,389 @@
+import logging
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import connection, transaction
+from django.db.models import Count
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from core.discovery.autocomplete import record_loan
+from core.models import BookCopy, Bookinventory, CopyStatus, HoldRequest, HoldStatus, Loan, LoanStatus, Log
+from core.services.inventory import adjust_available_quantities
+
+logger = logging.getLogger(__name__)
+
+BATCH_ACTIONS = ("checkout", "checkin")
+ACTIVE_LOAN_STATUSES = (LoanStatus.ACTIVE, LoanStatus.OVERDUE)
+IDENTITY_FIELDS = ("first_name", "last_name", "email")
+HOLD_PICKUP_DAYS = 3
+DEFAULT_MAX_ACTIVE_LOANS = 5
+
+
+def lock_rows(queryset, skip_locked=False):
+    # Lock the copy or loan rows themselves, not the inventory rows joined in by select_related.
+    options = {}
+    if skip_locked and connection.features.has_select_for_update_skip_locked:
+        options["skip_locked"] = True
+    if connection.features.has_select_for_update_of:
+        options["of"] = ("self",)
+    return queryset.select_for_update(**options)
+
+
+def claim_available_copy(book):
+    # Copies another desk is already checking out are skipped rather than waited on.
+    available = book.copies.filter(status=CopyStatus.AVAILABLE).order_by("barcode")
+    return lock_rows(available, skip_locked=True).first()
+
+
+def claim_open_loan(book=None, barcode=None):
+    loans = Loan.objects.filter(status__in=ACTIVE_LOAN_STATUSES, returned_at__isnull=True)
+    loans = loans.select_related("copy", "inventory")
+    if barcode:
+        return lock_rows(loans.filter(copy__barcode=barcode)).order_by("checked_out_at").first()
+    return lock_rows(loans.filter(inventory=book), skip_locked=True).order_by("checked_out_at").first()
+
+
+def item_key(item, name):
+    return str(item.get(name) or "").strip()
+
+
+def failure(index, item, error):
+    return {
+        "index": index,
+        "barcode": item_key(item, "barcode"),
+        "isbn": item_key(item, "isbn"),
+        "status": "error",
+        "error": error,
+    }
+
+
+def success(index, copy, **fields):
+    return {"index": index, "barcode": copy.barcode, "isbn": copy.inventory.isbn, "status": "ok", **fields}
+
+
+def process_circulation_batch(action, items, borrower=None, processed_by=None, chunk_size=0, loan_period_days=21):
+    # Each chunk is one transaction; a chunk that fails outright reports every item in it as failed.
+    handler = checkout_batch if action == "checkout" else checkin_batch
+    entries = list(enumerate(items))
+    size = chunk_size if chunk_size and chunk_size > 0 else len(entries) or 1
+    results = []
+    for start in range(0, len(entries), size):
+        chunk = entries[start : start + size]
+        try:
+            with transaction.atomic():
+                results.extend(handler(chunk, borrower or {}, processed_by, loan_period_days))
+        except Exception as exc:
+            logger.error("Error during batch %s: %s", action, str(exc))
+            message = f"An error occurred during {action}. Please try again."
+            results.extend(failure(index, item, message) for index, item in chunk)
+    return sorted(results, key=lambda result: result["index"])
+
+
+def checkout_batch(entries, borrower, processed_by, loan_period_days):
+    results, pending = [], []
+    for index, item in entries:
+        identity = {field: item_key(item, field) or str(borrower.get(field) or "").strip() for field in IDENTITY_FIELDS}
+        if not item_key(item, "barcode") and not item_key(item, "isbn"):
+            results.append(failure(index, item, "A barcode or ISBN is required."))
+            continue
+        if not all(identity.values()):
+            results.append(failure(index, item, "Please fill in all required fields."))
+            continue
+        try:
+            validate_email(identity["email"])
+        except ValidationError:
+            results.append(failure(index, item, "Please enter a valid email address."))
+            continue
+        pending.append((index, item, identity))
+    if not pending:
+        return results
+
+    barcodes = {item_key(item, "barcode") for _index, item, _identity in pending} - {""}
+    isbns = {item_key(item, "isbn") for _index, item, _identity in pending if not item_key(item, "barcode")}
+    copies = BookCopy.objects.filter(barcode__in=barcodes).select_related("inventory")
+    by_barcode = {copy.barcode: copy for copy in lock_rows(copies)}
+    by_isbn = defaultdict(list)
+    if isbns:
+        available = BookCopy.objects.filter(inventory__isbn__in=isbns, status=CopyStatus.AVAILABLE).exclude(
+            barcode__in=barcodes
+        )
+        for copy in lock_rows(available.select_related("inventory").order_by("barcode"), skip_locked=True):
+            by_isbn[copy.inventory.isbn].append(copy)
+    known_isbns = set(Bookinventory.objects.filter(isbn__in=isbns - set(by_isbn)).values_list("isbn", flat=True))
+
+    emails = {identity["email"].lower() for _index, _item, identity in pending}
+    users = {
+        user.email_lower: user
+        for user in get_user_model()
+        .objects.annotate(email_lower=Lower("email"))
+        .filter(email_lower__in=emails)
+        .select_related("library_profile")
+    }
+    active_counts = Counter(
+        dict(
+            Loan.objects.filter(borrower__in=users.values(), status__in=ACTIVE_LOAN_STATUSES)
+            .order_by()
+            .values_list("borrower")
+            .annotate(total=Count("id"))
+        )
+    )
+
+    timestamp = timezone.localtime()
+    due_at = timestamp + timedelta(days=loan_period_days)
+    claimed, planned = set(), []
+    for index, item, identity in pending:
+        barcode, isbn = item_key(item, "barcode"), item_key(item, "isbn")
+        if barcode:
+            copy = by_barcode.get(barcode)
+            if copy is None:
+                results.append(failure(index, item, "No copy found with that barcode."))
+                continue
+            if copy.pk in claimed or copy.status != CopyStatus.AVAILABLE:
+                results.append(failure(index, item, "This copy is not available to check out."))
+                continue
+        else:
+            copy = next((copy for copy in by_isbn.get(isbn, []) if copy.pk not in claimed), None)
+            if copy is None:
+                known = isbn in by_isbn or isbn in known_isbns
+                error = "No copies available to check out." if known else "Book not found in inventory."
+                results.append(failure(index, item, error))
+                continue
+
+        user = users.get(identity["email"].lower())
+        if user is not None:
+            profile = getattr(user, "library_profile", None)
+            limit = profile.max_active_loans if profile else DEFAULT_MAX_ACTIVE_LOANS
+            if active_counts[user.pk] >= limit:
+                results.append(failure(index, item, "Borrower has reached their active loan limit."))
+                continue
+            active_counts[user.pk] += 1
+
+        claimed.add(copy.pk)
+        copy.status = CopyStatus.ON_LOAN
+        copy.due_back_date = due_at.date()
+        copy.last_circulated_at = timestamp
+        loan = Loan(
+            inventory_id=copy.inventory_id,
+            copy=copy,
+            borrower=user,
+            processed_by=processed_by,
+            borrower_email_snapshot=identity["email"],
+            checked_out_at=timestamp,
+            due_at=due_at,
+            status=LoanStatus.ACTIVE,
+        )
+        planned.append((index, copy, loan, identity))
+    if not planned:
+        return results
+
+    loans = Loan.objects.bulk_create([loan for _index, _copy, loan, _identity in planned])
+    if not connection.features.can_return_rows_from_bulk_insert:
+        # MySQL hands back no primary keys from a bulk insert; each copy has exactly one open loan to find.
+        opened = Loan.objects.filter(
+            copy_id__in=[loan.copy_id for loan in loans], checked_out_at=timestamp, returned_at__isnull=True
+        )
+        loan_ids = dict(opened.values_list("copy_id", "id"))
+        for loan in loans:
+            loan.pk = loan_ids[loan.copy_id]
+            loan._state.adding = False
+    Log.objects.bulk_create(
+        [
+            Log(
+                book=copy.inventory,
+                loan=loan,
+                title=copy.inventory.title,
+                author=copy.inventory.author,
+                publisher=copy.inventory.publisher,
+                publication_date=copy.inventory.published_date,
+                isbn=copy.inventory.isbn,
+                borrower_first_name=identity["first_name"],
+                borrower_last_name=identity["last_name"],
+                borrower_email=identity["email"],
+                borrowed_date=timestamp.date(),
+                borrowed_time=timestamp.time().replace(microsecond=0),
+            )
+            for _index, copy, loan, identity in planned
+        ]
+    )
+    BookCopy.objects.bulk_update(
+        [copy for _index, copy, _loan, _identity in planned], ["status", "due_back_date", "last_circulated_at"]
+    )
+    # Every planned copy was AVAILABLE under its row lock, so each one takes one off its title.
+    taken = Counter(copy.inventory_id for _index, copy, _loan, _identity in planned)
+    adjust_available_quantities({book_id: -count for book_id, count in taken.items()})
+    for index, copy, loan, _identity in planned:
+        # bulk_create skips post_save, so the autocomplete popularity signal is replayed here.
+        record_loan(loan.inventory_id)
+        results.append(success(index, copy, loan_id=loan.pk, due_at=due_at.isoformat()))
+    return results
+
+
+def checkin_batch(entries, borrower, processed_by, loan_period_days):
+    results, pending = [], []
+    for index, item in entries:
+        if not item_key(item, "barcode") and not item_key(item, "isbn"):
+            results.append(failure(index, item, "A barcode or ISBN is required."))
+            continue
+        pending.append((index, item))
+    if not pending:
+        return results
+
+    barcodes = {item_key(item, "barcode") for _index, item in pending} - {""}
+    isbns = {item_key(item, "isbn") for _index, item in pending if not item_key(item, "barcode")}
+    open_loans = Loan.objects.filter(status__in=ACTIVE_LOAN_STATUSES, returned_at__isnull=True).select_related(
+        "copy", "inventory"
+    )
+    by_barcode, by_isbn = {}, defaultdict(list)
+    for loan in lock_rows(open_loans.filter(copy__barcode__in=barcodes).order_by("checked_out_at")):
+        by_barcode.setdefault(loan.copy.barcode, loan)
+    if isbns:
+        by_title = open_loans.filter(inventory__isbn__in=isbns).order_by("checked_out_at")
+        for loan in lock_rows(by_title, skip_locked=True):
+            by_isbn[loan.inventory.isbn].append(loan)
+
+    timestamp = timezone.localtime()
+    claimed, returned = set(), []
+    deltas = Counter()
+    for index, item in pending:
+        barcode, isbn = item_key(item, "barcode"), item_key(item, "isbn")
+        if barcode:
+            loan = by_barcode.get(barcode)
+        else:
+            loan = next((loan for loan in by_isbn.get(isbn, []) if loan.pk not in claimed), None)
+        if loan is None or loan.pk in claimed:
+            results.append(failure(index, item, "This book is not checked out."))
+            continue
+        claimed.add(loan.pk)
+        deltas[loan.inventory_id] -= loan.copy.status == CopyStatus.AVAILABLE
+        loan.status = LoanStatus.RETURNED
+        loan.returned_at = timestamp
+        loan.copy.status = CopyStatus.AVAILABLE
+        loan.copy.due_back_date = None
+        loan.copy.last_circulated_at = timestamp
+        returned.append((index, loan))
+    if not returned:
+        return results
+
+    loans = [loan for _index, loan in returned]
+    book_ids = {loan.inventory_id for loan in loans}
+    Loan.objects.bulk_update(loans, ["status", "returned_at"])
+    close_loan_logs(loans, timestamp)
+    ready = fill_pending_holds(loans, book_ids, timestamp)
+    BookCopy.objects.bulk_update([loan.copy for loan in loans], ["status", "due_back_date", "last_circulated_at"])
+    # Copies a pending hold took stay out of available_quantity.
+    for loan in loans:
+        deltas[loan.inventory_id] += loan.copy.status == CopyStatus.AVAILABLE
+    adjust_available_quantities(deltas)
+    for index, loan in returned:
+        results.append(success(index, loan.copy, loan_id=loan.pk, hold_ready=loan.copy.pk in ready))
+    return results
+
+
+def close_loan_logs(loans, timestamp):
+    open_logs = Log.objects.filter(returned_date__isnull=True).order_by("-borrowed_date", "-borrowed_time")
+    by_loan = {}
+    for log in open_logs.filter(loan__in=loans):
+        by_loan.setdefault(log.loan_id, log)
+    # Older rows predate Loan and are matched to their book, as single checkins do.
+    legacy = defaultdict(list)
+    unmatched = {loan.inventory_id for loan in loans if loan.pk not in by_loan}
+    if unmatched:
+        for log in open_logs.filter(book_id__in=unmatched, loan__isnull=True):
+            legacy[log.book_id].append(log)
+    closed = []
+    for loan in loans:
+        log = by_loan.get(loan.pk) or (legacy[loan.inventory_id].pop(0) if legacy[loan.inventory_id] else None)
+        if log:
+            log.returned_date = timestamp.date()
+            log.returned_time = timestamp.time().replace(microsecond=0)
+            closed.append(log)
+    Log.objects.bulk_update(closed, ["returned_date", "returned_time"])
+
+
+def fill_pending_holds(loans, book_ids, timestamp):
+    # Returned copies go straight to the oldest pending holds on their title.
+    returned = defaultdict(list)
+    for loan in loans:
+        returned[loan.inventory_id].append(loan.copy)
+    pending = HoldRequest.objects.filter(inventory_id__in=book_ids, status=HoldStatus.PENDING)
+    holds = lock_rows(pending.order_by("requested_at"))
+    filled, ready = [], set()
+    expires_at = timestamp + timedelta(days=HOLD_PICKUP_DAYS)
+    for hold in holds:
+        copies = returned[hold.inventory_id]
+        if not copies:
+            continue
+        copy = copies.pop(0)
+        hold.status = HoldStatus.READY
+        hold.expires_at = expires_at
+        copy.status = CopyStatus.ON_HOLD
+        copy.due_back_date = expires_at.date()
+        filled.append(hold)
+        ready.add(copy.pk)
+    HoldRequest.objects.bulk_update(filled, ["status", "expires_at"])
+    return ready
+
+
+def mark_overdue_loans(now=None, batch_size=1000):
+    # Walks the (due_at, status) index in id batches so no single UPDATE holds many row locks.
+    now = now or timezone.now()
+    past_due = Loan.objects.filter(status=LoanStatus.ACTIVE, due_at__lt=now).order_by("due_at")
+    marked = 0
+    while True:
+        ids = list(past_due.values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return marked
+        marked += Loan.objects.filter(id__in=ids, status=LoanStatus.ACTIVE).update(status=LoanStatus.OVERDUE)
+
+
+def expire_ready_holds(now=None, batch_size=1000):
+    now = now or timezone.now()
+    expired = 0
+    while True:
+        with transaction.atomic():
+            lapsed = HoldRequest.objects.filter(status=HoldStatus.READY, expires_at__lt=now).order_by("expires_at")
+            holds = list(lock_rows(lapsed.only("id", "inventory_id"), skip_locked=True)[:batch_size])
+            if not holds:
+                return expired
+            HoldRequest.objects.filter(id__in=[hold.id for hold in holds]).update(status=HoldStatus.EXPIRED)
+            release_held_copies(Counter(hold.inventory_id for hold in holds), now)
+        expired += len(holds)
+
+
+def release_held_copies(expired_per_book, now):
+    # Each expired hold frees one ON_HOLD copy of its title, oldest pickup date first. Freed copies
+    # go to the next pending holds; the rest return to AVAILABLE and the counters move by F().
+    held = BookCopy.objects.filter(inventory_id__in=expired_per_book, status=CopyStatus.ON_HOLD)
+    held = lock_rows(held.order_by("due_back_date", "barcode").only("id", "inventory_id"))
+    freed = defaultdict(list)
+    for copy in held:
+        if len(freed[copy.inventory_id]) < expired_per_book[copy.inventory_id]:
+            freed[copy.inventory_id].append(copy.id)
+
+    pending = HoldRequest.objects.filter(inventory_id__in=freed, status=HoldStatus.PENDING).order_by("requested_at")
+    granted, reheld = [], []
+    for hold in lock_rows(pending.only("id", "inventory_id"), skip_locked=True):
+        if freed[hold.inventory_id]:
+            granted.append(hold.id)
+            reheld.append(freed[hold.inventory_id].pop(0))
+
+    expires_at = now + timedelta(days=HOLD_PICKUP_DAYS)
+    HoldRequest.objects.filter(id__in=granted).update(status=HoldStatus.READY, expires_at=expires_at)
+    BookCopy.objects.filter(id__in=reheld).update(due_back_date=expires_at.date())
+    released = [copy_id for copy_ids in freed.values() for copy_id in copy_ids]
+    BookCopy.objects.filter(id__in=released).update(status=CopyStatus.AVAILABLE, due_back_date=None)
+
+    adjust_available_quantities({book_id: len(copy_ids) for book_id, copy_ids in freed.items()})
+    return len(granted), len(released)
+
+
+def sweep_circulation(now=None, batch_size=1000):
+    now = now or timezone.now()
+    return {
+        "overdue": mark_overdue_loans(now, batch_size),
+        "expired_holds": expire_ready_holds(now, batch_size),
+    }
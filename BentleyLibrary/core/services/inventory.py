@@ -0,0 +1,152 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from core.discovery.result_cache import bump_catalog_generation
+from core.models import BookCopy, Bookinventory, CopyStatus, HoldStatus
+
+
+def missing_copies(book, existing, prefix="LIB"):
+    return [
+        BookCopy(inventory=book, barcode=f"{prefix}-{book.isbn}-{index:04d}")
+        for index in range(existing + 1, book.quantity + 1)
+    ]
+
+
+def provision_copies(book, prefix="LIB"):
+    # Runs when inventory is written, so circulation only ever reads copy rows.
+    existing = book.copies.count()
+    if existing >= book.quantity:
+        return 0
+    BookCopy.objects.bulk_create(missing_copies(book, existing, prefix), ignore_conflicts=True)
+    # With ignore_conflicts bulk_create hands back skipped rows too, so count what actually landed.
+    created = book.copies.count() - existing
+    sync_inventory_counts(book)
+    return created
+
+
+def backfill_copies(batch_size=500):
+    # Provisions every under-copied title in batches: one bulk_create and one grouped recount per batch.
+    short = counted_inventory(Bookinventory.objects.all()).filter(copy_total__lt=F("quantity")).order_by("id")
+    created = 0
+    last_id = 0
+    while True:
+        books = list(short.filter(id__gt=last_id).only("id", "isbn", "quantity")[:batch_size])
+        if not books:
+            return created
+        with transaction.atomic():
+            copies = [copy for book in books for copy in missing_copies(book, book.copy_total)]
+            BookCopy.objects.bulk_create(copies, ignore_conflicts=True)
+            recounted = recount_inventory([book.id for book in books])
+            created += sum(book.copy_total for book in recounted) - sum(book.copy_total for book in books)
+        last_id = books[-1].id
+
+
+def sync_inventory_counts(book):
+    # Full recount; circulation keeps the counters current with adjust_available_quantity instead.
+    total_copies = book.copies.count()
+    available_copies = book.copies.filter(status=CopyStatus.AVAILABLE).count()
+    desired_quantity = max(book.quantity, total_copies)
+
+    Bookinventory.objects.filter(pk=book.pk).update(
+        quantity=desired_quantity,
+        available_quantity=available_copies,
+    )
+    book.refresh_from_db(fields=["quantity", "available_quantity"])
+    transaction.on_commit(bump_catalog_generation)
+
+
+def transition_copy(copy, status, **fields):
+    # Saves the copy and returns how the move changes its book's available_quantity.
+    was_available = copy.status == CopyStatus.AVAILABLE
+    copy.status = status
+    for name, value in fields.items():
+        setattr(copy, name, value)
+    copy.save(update_fields=["status", *fields])
+    return int(status == CopyStatus.AVAILABLE) - int(was_available)
+
+
+def adjust_available_quantity(book, delta):
+    # The F() update is atomic on its own, so concurrent desks never need the book row lock for it.
+    if not delta:
+        return
+    Bookinventory.objects.filter(pk=book.pk).update(available_quantity=F("available_quantity") + delta)
+    book.available_quantity += delta
+    transaction.on_commit(bump_catalog_generation)
+
+
+def adjust_available_quantities(deltas):
+    # The batch form of adjust_available_quantity: titles that move by the same amount share one F() UPDATE.
+    by_delta = defaultdict(list)
+    for book_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(book_id)
+    for delta, book_ids in by_delta.items():
+        Bookinventory.objects.filter(pk__in=book_ids).update(available_quantity=F("available_quantity") + delta)
+    if by_delta:
+        transaction.on_commit(bump_catalog_generation)
+
+
+def counted_inventory(queryset):
+    return queryset.annotate(
+        copy_total=Count("copies"),
+        copy_available=Count("copies", filter=Q(copies__status=CopyStatus.AVAILABLE)),
+    )
+
+
+def recount_inventory(book_ids):
+    # One grouped count over the titles' copies, written back with one bulk_update. The book rows are
+    # locked first, as in reconcile_inventory_counts; circulation moves the counters by F() instead.
+    list(Bookinventory.objects.select_for_update().filter(pk__in=book_ids).order_by("pk").values_list("pk"))
+    counted = counted_inventory(Bookinventory.objects.filter(pk__in=book_ids))
+    books = [book for book in counted.only("id", "quantity", "available_quantity") if book.copy_total]
+    for book in books:
+        book.quantity = max(book.quantity, book.copy_total)
+        book.available_quantity = book.copy_available
+    Bookinventory.objects.bulk_update(books, ["quantity", "available_quantity"])
+    transaction.on_commit(bump_catalog_generation)
+    return books
+
+
+def grant_ready_hold(book, available_copy=None):
+    # Holds another desk is already filling are skipped, like copies at checkout.
+    pending = book.holds.filter(status=HoldStatus.PENDING).order_by("requested_at")
+    ready_hold = pending.select_for_update(skip_locked=connection.features.has_select_for_update_skip_locked).first()
+    if not ready_hold:
+        return 0
+    if available_copy is None:
+        available_copy = book.copies.filter(status=CopyStatus.AVAILABLE).order_by("barcode").first()
+    if not available_copy:
+        return 0
+
+    ready_hold.status = HoldStatus.READY
+    ready_hold.expires_at = timezone.now() + timedelta(days=3)
+    ready_hold.save(update_fields=["status", "expires_at"])
+
+    return transition_copy(available_copy, CopyStatus.ON_HOLD, due_back_date=ready_hold.expires_at.date())
+
+
+def inventory_drift(queryset=None):
+    # One grouped pass over copies; yields (book, expected_quantity, expected_available) for every mismatch.
+    queryset = Bookinventory.objects.all() if queryset is None else queryset
+    counted = counted_inventory(queryset).only("id", "isbn", "title", "quantity", "available_quantity")
+    for book in counted.iterator(chunk_size=2000):
+        if not book.copy_total:
+            # Legacy rows without copy records are still counted by hand.
+            continue
+        expected_quantity = max(book.quantity, book.copy_total)
+        if (book.quantity, book.available_quantity) != (expected_quantity, book.copy_available):
+            yield book, expected_quantity, book.copy_available
+
+
+def reconcile_inventory_counts(queryset=None, fix=False):
+    drifted = list(inventory_drift(queryset))
+    if fix:
+        for book, _quantity, _available in drifted:
+            with transaction.atomic():
+                locked = Bookinventory.objects.select_for_update().get(pk=book.pk)
+                sync_inventory_counts(locked)
+    return drifted
@@ -1,9 +1,13 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group, Permission
-from django.db.models.signals import post_migrate, post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_migrate, post_save
 from django.dispatch import receiver
 
-from .models import LibraryProfile, LibraryRole
+from .discovery import autocomplete, bitmaps, inverted_index, vectorized
+from .discovery.result_cache import bump_catalog_generation
+from .models import Bookinventory, LibraryProfile, LibraryRole, Loan
+from .services.inventory import provision_copies
 
 
 ROLE_PERMISSION_MAP = {
@@ -76,3 +80,71 @@ def ensure_default_groups(sender, **kwargs):
 
         permissions = Permission.objects.filter(codename__in=permission_codenames)
         group.permissions.set(permissions)
+
+
+@receiver(post_save, sender=Bookinventory)
+def provision_book_copies(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    # Registered first so the index receivers below see the recounted quantities.
+    if raw or (update_fields and "quantity" not in update_fields):
+        return
+    provision_copies(instance)
+
+
+@receiver(post_save, sender=Bookinventory)
+def refresh_search_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not set(update_fields) & inverted_index.INDEXED_FIELDS:
+        return
+    inverted_index.index_book(instance)
+
+
+@receiver(post_delete, sender=Bookinventory)
+def drop_from_search_index(sender, instance, **kwargs):
+    inverted_index.unindex_book(instance.pk)
+
+
+@receiver(post_save, sender=Bookinventory)
+def refresh_catalog_matrix(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not set(update_fields) & {"search_terms", "search_terms_norm", "available_quantity"}:
+        return
+    vectorized.matrix_book(instance)
+
+
+@receiver(post_delete, sender=Bookinventory)
+def drop_from_catalog_matrix(sender, instance, **kwargs):
+    vectorized.unmatrix_book(instance.pk)
+
+
+@receiver(post_save, sender=Bookinventory)
+def refresh_autocomplete(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not set(update_fields) & set(autocomplete.COMPLETION_FIELDS):
+        return
+    autocomplete.autocomplete_book(instance)
+
+
+@receiver(post_delete, sender=Bookinventory)
+def drop_from_autocomplete(sender, instance, **kwargs):
+    autocomplete.unautocomplete_book(instance.pk)
+
+
+@receiver(post_save, sender=Bookinventory)
+def refresh_filter_bitmaps(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not set(update_fields) & bitmaps.BITMAP_FIELDS:
+        return
+    bitmaps.bitmap_book(instance)
+
+
+@receiver(post_delete, sender=Bookinventory)
+def drop_from_filter_bitmaps(sender, instance, **kwargs):
+    bitmaps.unbitmap_book(instance.pk)
+
+
+@receiver(post_save, sender=Loan)
+def count_loan_for_autocomplete(sender, instance, created, **kwargs):
+    if created:
+        autocomplete.record_loan(instance.inventory_id)
+
+
+@receiver(post_save, sender=Bookinventory)
+@receiver(post_delete, sender=Bookinventory)
+def invalidate_search_results(sender, **kwargs):
+    transaction.on_commit(bump_catalog_generation)
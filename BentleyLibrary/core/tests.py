@@ -1,22 +1,75 @@
 import json
+import tempfile
+import time
+from concurrent.futures import Future
 from datetime import date, timedelta
+from types import SimpleNamespace
 from io import StringIO
+from pathlib import Path
 from uuid import uuid4
-from unittest.mock import patch
+from unittest import skipUnless
+from unittest.mock import PropertyMock, patch
 
 from django.contrib.auth import get_user_model
 from django.core.management import call_command
-from django.http import HttpResponseRedirect
-from django.test import Client, TestCase, override_settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import CommandError
+from django.db import DatabaseError, connection
+from django.db.models import F
+from django.http import HttpResponseRedirect, QueryDict
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
-from .models import BookCopy, Bookinventory, CopyStatus, Loan, LoanStatus, Log, ProductEvent
+from .discovery.autocomplete import get_autocomplete, reset_autocomplete
+from .discovery.bitmaps import bitmap_ids, get_bitmaps, reset_bitmaps
+from .discovery.facets import facet_counts
+from .discovery.fuzzy import edit_distance
+from .discovery.hedged import HEDGE_BRANCHES, hedged_search
+from .discovery.inverted_index import get_index, reset_index
+from .discovery.result_cache import bump_catalog_generation, catalog_generation, get_result_cache, require_shared_cache
+from .discovery.vectorized import np, numpy_available, reset_matrix, top_k_indices
+from .filtering import plan_filters
+from .management.commands.evaluate_search import ndcg_at_k, reciprocal_rank
+from .planner import plan_query
+from .services.circulation import claim_available_copy, lock_rows
+from .services.inventory import provision_copies, reconcile_inventory_counts
+from .query_language import And, Field, Not, Or, Term, compile_query, parse, split_query
+from .models import (
+    BookCopy,
+    Bookinventory,
+    CopyStatus,
+    HoldRequest,
+    HoldStatus,
+    LibraryRole,
+    Loan,
+    LoanStatus,
+    Log,
+    ProductEvent,
+)
+from .ranking import TopK, top_k
+from .reranker import fallback_rank
+from .search import (
+    ProximityConstraint,
+    RankedResults,
+    apply_filters,
+    order_by_ranked_ids,
+    parse_query,
+    postgres_tsquery,
+    search_books,
+    sqlite_fts_ids,
+)
 
 
 class LibraryViewTestCase(TestCase):
     def setUp(self):
         self.client = Client()
+        # The in-process indexes outlive each test's rolled-back transaction.
+        reset_index()
+        reset_matrix()
+        reset_autocomplete()
+        reset_bitmaps()
 
     def create_book(self, **overrides):
         data = {
@@ -32,13 +85,13 @@ class LibraryViewTestCase(TestCase):
         }
         data.update(overrides)
         book = Bookinventory.objects.create(**data)
-        available_quantity = book.available_quantity
-        for index in range(1, book.quantity + 1):
-            BookCopy.objects.create(
-                inventory=book,
-                barcode=f"LIB-{book.isbn}-{index:04d}",
-                status=CopyStatus.AVAILABLE if index <= available_quantity else CopyStatus.ON_LOAN,
-            )
+        # Saving provisions every copy as available; put the rest out on loan to match the fixture.
+        if data["available_quantity"] < book.quantity:
+            book.copies.filter(
+                barcode__gt=f"LIB-{book.isbn}-{data['available_quantity']:04d}"
+            ).update(status=CopyStatus.ON_LOAN)
+            book.available_quantity = data["available_quantity"]
+            book.save(update_fields=["available_quantity"])
         return book
 
     def create_log(self, book, **overrides):
@@ -211,6 +264,339 @@ class CheckinViewTests(LibraryViewTestCase):
         self.assertIsNotNone(log.returned_time)
         self.assertContains(response, "Book checked in successfully.")
 
+    def test_checkin_that_fills_a_hold_nets_out_to_one_counter_update(self):
+        book = self.create_book(quantity=1, available_quantity=0)
+        self.create_log(book)
+        patron = get_user_model().objects.create_user(username="reader", password="pw")
+        hold = HoldRequest.objects.create(inventory=book, requester=patron)
+
+        self.client.post(reverse("checkin"), {"isbn": book.isbn})
+
+        book.refresh_from_db()
+        hold.refresh_from_db()
+        self.assertEqual(hold.status, HoldStatus.READY)
+        self.assertEqual(book.copies.get().status, CopyStatus.ON_HOLD)
+        self.assertEqual(book.available_quantity, 0)
+
+    def test_checkout_and_checkin_update_counters_without_recounting(self):
+        book = self.create_book(quantity=2, available_quantity=2)
+        checkout_form = {"first_name": "Ada", "last_name": "Lovelace", "email": "ada@example.com"}
+
+        with CaptureQueriesContext(connection) as checkout_queries:
+            self.client.post(reverse("checkout", args=[book.isbn]), checkout_form)
+        book.refresh_from_db()
+        self.assertEqual(book.available_quantity, 1)
+
+        with CaptureQueriesContext(connection) as checkin_queries:
+            self.client.post(reverse("checkin"), {"isbn": book.isbn})
+        book.refresh_from_db()
+        self.assertEqual(book.available_quantity, 2)
+
+        for queries in (checkout_queries, checkin_queries):
+            statements = [query["sql"] for query in queries.captured_queries]
+            self.assertFalse([sql for sql in statements if "COUNT(" in sql])
+            self.assertFalse([sql for sql in statements if sql.startswith("INSERT") and '"core_bookcopy"' in sql])
+            self.assertEqual(sum('UPDATE "bookinventory"' in sql for sql in statements), 1)
+
+    def test_checkout_by_barcode_takes_that_copy_without_locking_the_title(self):
+        book = self.create_book(quantity=2, available_quantity=2)
+        form = {"first_name": "Ada", "last_name": "Lovelace", "email": "ada@example.com"}
+
+        self.client.post(reverse("checkout_copy", args=[f"LIB-{book.isbn}-0002"]), form)
+        repeat = self.client.post(reverse("checkout_copy", args=[f"LIB-{book.isbn}-0002"]), form)
+
+        book.refresh_from_db()
+        self.assertEqual(Loan.objects.get().copy.barcode, f"LIB-{book.isbn}-0002")
+        self.assertEqual(book.available_quantity, 1)
+        self.assertContains(repeat, "This copy is not available to check out.")
+
+    def test_copy_claims_lock_only_their_own_rows_and_skip_busy_ones(self):
+        book = self.create_book(quantity=1, available_quantity=1)
+        features = connection.features
+
+        with patch.object(features, "has_select_for_update_skip_locked", True), patch.object(
+            features, "has_select_for_update_of", True
+        ):
+            query = lock_rows(book.copies.select_related("inventory"), skip_locked=True).query
+            waiting = lock_rows(book.copies.all()).query
+
+        self.assertTrue(query.select_for_update)
+        self.assertTrue(query.select_for_update_skip_locked)
+        self.assertEqual(query.select_for_update_of, ("self",))
+        self.assertFalse(waiting.select_for_update_skip_locked)
+        self.assertEqual(claim_available_copy(book).barcode, f"LIB-{book.isbn}-0001")
+
+    def test_checkin_by_barcode_returns_that_copy(self):
+        book = self.create_book(quantity=2, available_quantity=2)
+        form = {"first_name": "Ada", "last_name": "Lovelace", "email": "ada@example.com"}
+        for _ in range(2):
+            self.client.post(reverse("checkout", args=[book.isbn]), form)
+
+        response = self.client.post(reverse("checkin"), {"barcode": f"LIB-{book.isbn}-0002"}, follow=True)
+
+        self.assertContains(response, "Book checked in successfully.")
+        self.assertEqual(
+            dict(book.copies.values_list("barcode", "status")),
+            {f"LIB-{book.isbn}-0001": CopyStatus.ON_LOAN, f"LIB-{book.isbn}-0002": CopyStatus.AVAILABLE},
+        )
+        book.refresh_from_db()
+        self.assertEqual(book.available_quantity, 1)
+
+    def test_saving_inventory_provisions_copies_in_bulk(self):
+        with CaptureQueriesContext(connection) as queries:
+            book = Bookinventory.objects.create(
+                title="Imported Atlas",
+                author="Jane Author",
+                isbn="9780000000040",
+                published_date=date(2020, 1, 1),
+                publisher="Example Press",
+                quantity=40,
+                available_quantity=40,
+            )
+        self.assertEqual(book.copies.count(), 40)
+        statements = [query["sql"] for query in queries.captured_queries]
+        self.assertEqual(sum(sql.startswith("INSERT") and '"core_bookcopy"' in sql for sql in statements), 1)
+
+        book.quantity = 42
+        book.save(update_fields=["quantity"])
+        book.refresh_from_db()
+        self.assertEqual((book.copies.count(), book.quantity, book.available_quantity), (42, 42, 42))
+
+    def test_provision_counts_only_the_copies_it_inserted(self):
+        book = self.create_book(quantity=2, available_quantity=2)
+        # The lowest barcode is gone, so the next one to provision (0002) already exists.
+        book.copies.get(barcode=f"LIB-{book.isbn}-0001").delete()
+
+        self.assertEqual(provision_copies(book), 0)
+        book.quantity = 3
+        self.assertEqual(provision_copies(book), 1)
+
+    def test_import_real_books_keeps_real_barcodes(self):
+        parsed = SimpleNamespace(
+            title="Dune",
+            subtitle="",
+            author="Frank Herbert",
+            isbn="9780441172719",
+            published_date=date(1965, 8, 1),
+            publisher="Chilton",
+            genre="Sci-Fi",
+            language="English",
+            audience="Upper School",
+            description="Desert planet",
+            summary="",
+            image_url="",
+            metadata={},
+        )
+        with patch("core.management.commands.import_real_books.search_real_books", return_value=[parsed]):
+            call_command("import_real_books", per_topic=1, stdout=StringIO())
+
+        book = Bookinventory.objects.get(isbn=parsed.isbn)
+        barcodes = list(book.copies.order_by("barcode").values_list("barcode", flat=True))
+        self.assertEqual(barcodes, [f"REAL-{book.isbn}-{index:04d}" for index in range(1, book.quantity + 1)])
+        self.assertEqual(book.available_quantity, book.quantity)
+
+    def test_backfill_copies_provisions_legacy_titles(self):
+        legacy = self.create_book(quantity=3, available_quantity=3)
+        legacy.copies.all().delete()
+        Bookinventory.objects.filter(pk=legacy.pk).update(quantity=3, available_quantity=3)
+
+        out = StringIO()
+        call_command("backfill_copies", stdout=out)
+
+        self.assertIn("Provisioned 3 copies", out.getvalue())
+        self.assertEqual(legacy.copies.filter(status=CopyStatus.AVAILABLE).count(), 3)
+
+    def test_reconcile_inventory_reports_and_repairs_drift(self):
+        book = self.create_book(quantity=2, available_quantity=2)
+        steady = self.create_book(quantity=1, available_quantity=1)
+        Bookinventory.objects.filter(pk=book.pk).update(available_quantity=0)
+
+        out = StringIO()
+        call_command("reconcile_inventory", stdout=out)
+        self.assertIn(f"{book.isbn} Python 101: quantity 2 -> 2, available 0 -> 2", out.getvalue())
+        self.assertNotIn(steady.isbn, out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("reconcile_inventory", fail_on_drift=True, stdout=StringIO())
+
+        call_command("reconcile_inventory", fix=True, stdout=StringIO())
+        book.refresh_from_db()
+        self.assertEqual(book.available_quantity, 2)
+        out = StringIO()
+        call_command("reconcile_inventory", stdout=out)
+        self.assertIn("Found 0 drifted books.", out.getvalue())
+
+
+class CirculationBatchTests(LibraryViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.librarian = get_user_model().objects.create_user(username="desk", password="pw")
+        self.librarian.library_profile.role = LibraryRole.LIBRARIAN
+        self.librarian.library_profile.save(update_fields=["role"])
+        self.client.force_login(self.librarian)
+        self.borrower = {"first_name": "Ada", "last_name": "Lovelace", "email": "ada@example.com"}
+
+    def post_batch(self, **payload):
+        return self.client.post(reverse("circulation_batch"), json.dumps(payload), content_type="application/json")
+
+    def test_batch_requires_circulation_staff(self):
+        patron = get_user_model().objects.create_user(username="patron", password="pw")
+        self.client.force_login(patron)
+
+        response = self.post_batch(action="checkout", items=[{"isbn": "9780306406157"}])
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_batch_checkout_reports_each_item_and_moves_each_counter_once(self):
+        atlas = self.create_book(title="Atlas", quantity=2, available_quantity=2)
+        poems = self.create_book(title="Poems", quantity=1, available_quantity=1)
+        items = [
+            {"isbn": atlas.isbn},
+            {"barcode": f"LIB-{atlas.isbn}-0002"},
+            {"isbn": atlas.isbn},
+            {"barcode": f"LIB-{poems.isbn}-0001", "email": "grace@example.com", "first_name": "Grace", "last_name": "H"},
+            {"isbn": "0000000000000"},
+            {},
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post_batch(action="checkout", items=items, borrower=self.borrower)
+
+        results = response.json()["results"]
+        self.assertEqual([result["status"] for result in results], ["ok", "ok", "error", "ok", "error", "error"])
+        self.assertEqual(results[0]["barcode"], f"LIB-{atlas.isbn}-0001")
+        self.assertEqual(results[2]["error"], "No copies available to check out.")
+        self.assertEqual(results[4]["error"], "Book not found in inventory.")
+        self.assertEqual(response.json()["succeeded"], 3)
+        atlas.refresh_from_db()
+        poems.refresh_from_db()
+        self.assertEqual((atlas.available_quantity, poems.available_quantity), (0, 0))
+        self.assertEqual(Loan.objects.filter(status=LoanStatus.ACTIVE).count(), 3)
+        self.assertEqual(Log.objects.filter(borrower_email="grace@example.com", book=poems).count(), 1)
+        statements = [query["sql"] for query in queries.captured_queries]
+        self.assertEqual(sum(sql.startswith('INSERT INTO "core_loan"') for sql in statements), 1)
+        self.assertEqual(sum(sql.startswith('UPDATE "bookinventory"') for sql in statements), 2)
+
+    def test_batch_counters_keep_another_desks_in_flight_delta(self):
+        book = self.create_book(quantity=3, available_quantity=3)
+        # Another desk has moved the counter by F() but its copy row change is not visible yet.
+        Bookinventory.objects.filter(pk=book.pk).update(available_quantity=F("available_quantity") - 1)
+
+        self.post_batch(action="checkout", items=[{"isbn": book.isbn}], borrower=self.borrower)
+        book.refresh_from_db()
+        self.assertEqual(book.available_quantity, 1)
+
+        self.post_batch(action="checkin", items=[{"isbn": book.isbn}])
+        book.refresh_from_db()
+        self.assertEqual(book.available_quantity, 2)
+
+    def test_batch_checkout_links_logs_when_bulk_insert_returns_no_keys(self):
+        book = self.create_book(quantity=2, available_quantity=2)
+
+        # MySQL's bulk inserts do not return primary keys.
+        features = type(connection.features)
+        with patch.object(features, "can_return_rows_from_bulk_insert", new_callable=PropertyMock, return_value=False):
+            response = self.post_batch(action="checkout", items=[{"isbn": book.isbn}] * 2, borrower=self.borrower)
+
+        results = response.json()["results"]
+        self.assertEqual([result["status"] for result in results], ["ok", "ok"])
+        loans = {loan.pk: loan for loan in Loan.objects.filter(inventory=book)}
+        self.assertEqual({result["loan_id"] for result in results}, set(loans))
+        self.assertEqual({log.loan_id for log in Log.objects.filter(book=book)}, set(loans))
+
+    def test_batch_checkin_returns_loans_and_fills_holds(self):
+        book = self.create_book(quantity=2, available_quantity=2)
+        self.post_batch(action="checkout", items=[{"isbn": book.isbn}, {"isbn": book.isbn}], borrower=self.borrower)
+        patron = get_user_model().objects.create_user(username="reader", password="pw")
+        hold = HoldRequest.objects.create(inventory=book, requester=patron)
+
+        response = self.post_batch(
+            action="checkin", items=[{"barcode": f"LIB-{book.isbn}-0002"}, {"isbn": book.isbn}, {"isbn": book.isbn}]
+        )
+
+        results = response.json()["results"]
+        self.assertEqual([result["status"] for result in results], ["ok", "ok", "error"])
+        self.assertEqual([result.get("hold_ready") for result in results[:2]], [True, False])
+        hold.refresh_from_db()
+        book.refresh_from_db()
+        self.assertEqual(hold.status, HoldStatus.READY)
+        self.assertEqual(book.available_quantity, 1)
+        self.assertFalse(Log.objects.filter(book=book, returned_date__isnull=True).exists())
+
+    def test_chunked_batch_keeps_earlier_chunks_when_a_later_one_fails(self):
+        book = self.create_book(quantity=2, available_quantity=2)
+        items = [{"isbn": book.isbn}, {"isbn": book.isbn}]
+        real_bulk_create = Loan.objects.bulk_create
+        calls = []
+
+        def fail_second_chunk(objs, *args, **kwargs):
+            calls.append(objs)
+            if len(calls) == 2:
+                raise DatabaseError("disk full")
+            return real_bulk_create(objs, *args, **kwargs)
+
+        with patch.object(Loan.objects, "bulk_create", side_effect=fail_second_chunk):
+            response = self.post_batch(action="checkout", items=items, borrower=self.borrower, chunk_size=1)
+
+        self.assertEqual([result["status"] for result in response.json()["results"]], ["ok", "error"])
+        book.refresh_from_db()
+        self.assertEqual(book.available_quantity, 1)
+
+
+class CirculationSweepTests(LibraryViewTestCase):
+    def hold_copy(self, book, requester, expires_at):
+        copy = book.copies.filter(status=CopyStatus.AVAILABLE).order_by("barcode").first()
+        copy.status = CopyStatus.ON_HOLD
+        copy.due_back_date = expires_at.date()
+        copy.save(update_fields=["status", "due_back_date"])
+        Bookinventory.objects.filter(pk=book.pk).update(available_quantity=F("available_quantity") - 1)
+        return HoldRequest.objects.create(
+            inventory=book, requester=requester, status=HoldStatus.READY, expires_at=expires_at
+        )
+
+    def test_sweep_marks_past_due_loans_overdue_in_batches(self):
+        book = self.create_book(quantity=4, available_quantity=0)
+        due_dates = [timedelta(days=-2), timedelta(days=-1), timedelta(hours=-1), timedelta(days=2)]
+        for copy, offset in zip(book.copies.order_by("barcode"), due_dates):
+            Loan.objects.create(
+                inventory=book, copy=copy, borrower_email_snapshot="a@example.com", due_at=timezone.now() + offset
+            )
+
+        out = StringIO()
+        call_command("sweep_circulation", batch_size=2, stdout=out)
+
+        self.assertIn("Marked 3 loans overdue, expired 0 holds.", out.getvalue())
+        statuses = list(book.loans.order_by("due_at").values_list("status", flat=True))
+        self.assertEqual(statuses, [LoanStatus.OVERDUE] * 3 + [LoanStatus.ACTIVE])
+
+    def test_sweep_passes_expired_holds_to_the_next_request_or_shelf(self):
+        queued = self.create_book(title="Queued", quantity=1, available_quantity=1)
+        shelved = self.create_book(title="Shelved", quantity=1, available_quantity=1)
+        late = get_user_model().objects.create_user(username="late", password="pw")
+        next_in_line = get_user_model().objects.create_user(username="next", password="pw")
+        lapsed = timezone.now() - timedelta(hours=1)
+        expired = [self.hold_copy(queued, late, lapsed), self.hold_copy(shelved, late, lapsed)]
+        waiting = HoldRequest.objects.create(inventory=queued, requester=next_in_line)
+        fresh = self.create_book(title="Fresh", quantity=1, available_quantity=1)
+        still_ready = self.hold_copy(fresh, late, timezone.now() + timedelta(days=1))
+
+        call_command("sweep_circulation", stdout=StringIO())
+
+        for hold in expired:
+            hold.refresh_from_db()
+            self.assertEqual(hold.status, HoldStatus.EXPIRED)
+        waiting.refresh_from_db()
+        still_ready.refresh_from_db()
+        self.assertEqual(waiting.status, HoldStatus.READY)
+        self.assertGreater(waiting.expires_at, timezone.now())
+        self.assertEqual(still_ready.status, HoldStatus.READY)
+        self.assertEqual(queued.copies.get().status, CopyStatus.ON_HOLD)
+        self.assertEqual(queued.copies.get().due_back_date, waiting.expires_at.date())
+        self.assertEqual(shelved.copies.get().status, CopyStatus.AVAILABLE)
+        books = Bookinventory.objects.filter(pk__in=[queued.pk, shelved.pk, fresh.pk])
+        counts = dict(books.values_list("title", "available_quantity"))
+        self.assertEqual(counts, {"Queued": 0, "Shelved": 1, "Fresh": 0})
+        self.assertEqual(list(reconcile_inventory_counts()), [])
+
 
 class SearchAndBrowseTests(LibraryViewTestCase):
     def test_index_page_loads(self):
@@ -266,6 +652,90 @@ class SearchAndBrowseTests(LibraryViewTestCase):
         self.assertContains(response, "Available Book")
         self.assertNotContains(response, "Unavailable Book")
 
+    def test_browse_pages_with_a_title_id_cursor(self):
+        for title in ["Delta", "Alpha", "Charlie", "Bravo", "Echo"]:
+            self.create_book(title=title)
+
+        seen = []
+        params = {"page_size": 2}
+        while True:
+            response = self.client.get(reverse("search_results"), params)
+            seen.extend(book["title"] for book in response.context["results"])
+            self.assertEqual(response.context["result_count"], 5)
+            if not response.context["next_page_query"]:
+                break
+            params = QueryDict(response.context["next_page_query"])
+
+        self.assertEqual(seen, ["Alpha", "Bravo", "Charlie", "Delta", "Echo"])
+
+    def test_cursors_do_not_carry_over_to_other_filters(self):
+        for title in ["Alpha", "Bravo", "Charlie", "Delta"]:
+            self.create_book(title=title, genre="History" if title in ("Alpha", "Delta") else "Poetry")
+
+        first = self.client.get(reverse("search_results"), {"page_size": 2})
+        cursor = QueryDict(first.context["next_page_query"])["cursor"]
+        history = self.client.get(reverse("search_results"), {"page_size": 2, "genre": "History", "cursor": cursor})
+        self.assertEqual([book["title"] for book in history.context["results"]], ["Alpha", "Delta"])
+
+        advanced = {"search_type": "everything", "field[]": ["genre"], "operator[]": ["exact"], "page_size": 1}
+        poetry = self.client.get(reverse("advanced_search_results"), {**advanced, "search_term[]": ["Poetry"]})
+        cursor = QueryDict(poetry.context["next_page_query"])["cursor"]
+        history = self.client.get(
+            reverse("advanced_search_results"), {**advanced, "search_term[]": ["History"], "cursor": cursor}
+        )
+        self.assertEqual([book.title for book in history.context["results"]], ["Alpha"])
+
+    def test_ranked_search_pages_follow_the_ranking(self):
+        for index in range(5):
+            self.create_book(title=f"Python Primer {index}")
+
+        first = self.client.get(reverse("search_results"), {"q": "python", "page_size": 2})
+        second = self.client.get(reverse("search_results") + "?" + first.context["next_page_query"])
+        full = search_books(query="python", limit=200)
+
+        self.assertEqual([book["id"] for book in first.context["results"]], full.ranked_ids[:2])
+        self.assertEqual([book["id"] for book in second.context["results"]], full.ranked_ids[2:4])
+
+    @override_settings(SEARCH_MAX_PAGE_SIZE=2)
+    def test_page_size_is_capped_and_bad_cursors_start_over(self):
+        for index in range(3):
+            self.create_book(title=f"Book {index}")
+
+        response = self.client.get(reverse("search_results"), {"page_size": 1000, "cursor": "forged"})
+
+        self.assertEqual([book["title"] for book in response.context["results"]], ["Book 0", "Book 1"])
+        self.assertTrue(response.context["next_page_query"])
+
+    @override_settings(SEARCH_STREAM_BATCH_SIZE=2, SEARCH_STREAM_MAX_RESULTS=4)
+    def test_streaming_mode_sends_the_shell_then_result_batches(self):
+        for index in range(5):
+            self.create_book(title=f"Python Primer {index}")
+        ranked_ids = search_books(query="python", limit=200).ranked_ids
+        books = Bookinventory.objects.in_bulk(ranked_ids)
+        ranked_titles = [books[book_id].title for book_id in ranked_ids]
+
+        response = self.client.get(reverse("search_results"), {"q": "python", "stream": "1"})
+        chunks = [chunk.decode() for chunk in response.streaming_content]
+
+        self.assertTrue(response.streaming)
+        self.assertIn("Results for “python”", chunks[0])
+        self.assertNotIn("Python Primer", chunks[0])
+        # Shell head, two batches of two, the "More results" link, shell tail.
+        self.assertEqual(len(chunks), 5)
+        page = "".join(chunks)
+        positions = [page.index(title) for title in ranked_titles[:4]]
+        self.assertEqual(positions, sorted(positions))
+        self.assertNotIn(ranked_titles[4], page)
+        self.assertIn("More results", chunks[3])
+        self.assertTrue(page.rstrip().endswith("</html>"))
+
+    @override_settings(SEARCH_STREAM_RESULTS=True)
+    def test_streaming_falls_back_to_a_full_render_without_results(self):
+        response = self.client.get(reverse("search_results"), {"q": "carthage"})
+
+        self.assertFalse(response.streaming)
+        self.assertContains(response, "No matches")
+
     def test_book_page_hides_borrower_information_from_students(self):
         book = self.create_book(quantity=2, available_quantity=1)
         self.create_log(book, borrower_email="reader@example.com")
@@ -283,6 +753,855 @@ class SearchAndBrowseTests(LibraryViewTestCase):
         self.assertEqual(response.status_code, 404)
 
 
+class FilterPlanTests(LibraryViewTestCase):
+    def test_plan_picks_predicates_per_field_and_backend(self):
+        filters = {"isbn": "978-0-306-40615-7", "title": "roman hist", "available_quantity": "1"}
+
+        sqlite_plan = {predicate.field: predicate for predicate in plan_filters(filters, vendor="sqlite")}
+        postgres_plan = {predicate.field: predicate for predicate in plan_filters(filters, vendor="postgresql")}
+
+        self.assertEqual((sqlite_plan["isbn"].strategy, sqlite_plan["isbn"].value), ("exact", "9780306406157"))
+        self.assertEqual(sqlite_plan["title"].strategy, "fts")
+        self.assertEqual(sqlite_plan["title"].value, '{title} : ("roman"* AND "hist"*)')
+        self.assertEqual(postgres_plan["title"].strategy, "trigram")
+        self.assertEqual(postgres_plan["title"].lookup, "icontains")
+        self.assertEqual((sqlite_plan["available_quantity"].lookup, sqlite_plan["available_quantity"].value), ("gte", 1))
+        self.assertEqual(plan_filters({"isbn": "0306406152"}, vendor="sqlite")[0].value, ["0306406152", "9780306406157"])
+
+    def test_text_filters_match_word_prefixes_through_fts(self):
+        roman = self.create_book(title="Roman History", author="Mary Beard")
+        self.create_book(title="Python 101", author="Jane Author")
+
+        queryset = apply_filters(Bookinventory.objects.all(), {"title": "hist rom", "author": "beard"})
+
+        self.assertEqual(list(queryset.values_list("id", flat=True)), [roman.id])
+
+    def test_available_quantity_means_at_least_one_ready_copy(self):
+        plenty = self.create_book(title="Plenty", available_quantity=3)
+        self.create_book(title="Gone", available_quantity=0)
+
+        queryset = apply_filters(Bookinventory.objects.all(), {"available_quantity": "1"})
+
+        self.assertEqual(list(queryset.values_list("id", flat=True)), [plenty.id])
+
+    def test_complete_isbn_matches_exactly_with_separators(self):
+        book = self.create_book(title="Exact", isbn="9780306406157")
+        self.create_book(title="Other", isbn="1978030640615")
+
+        queryset = apply_filters(Bookinventory.objects.all(), {"isbn": "978-0-306-40615-7"})
+
+        self.assertEqual(list(queryset.values_list("id", flat=True)), [book.id])
+
+
+class BitmapFilterTests(LibraryViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_book(title="Rome Rising", genre="Ancient History", audience="Upper School", published_date=date(2019, 3, 1))
+        self.create_book(title="Roman Roads", genre="History", available_quantity=0, published_date=date(2019, 9, 1))
+        self.create_book(title="Roman Poems", genre="Poetry", language="Latin", published_date=date(2021, 1, 1))
+
+    def test_bitmaps_match_the_sql_filter_chain(self):
+        filter_sets = [
+            {"genre": "hist"},
+            {"audience": "upper school"},
+            {"language": "Latin"},
+            {"published_date_start": "2019-06-01", "published_date_end": "2021-01-01"},
+        ]
+        for filters in filter_sets:
+            with self.subTest(filters=filters):
+                expected = sorted(apply_filters(Bookinventory.objects.all(), filters).values_list("id", flat=True))
+                self.assertEqual(bitmap_ids(get_bitmaps().match(filters)), expected)
+
+    def test_text_filters_the_bitmaps_cannot_answer_fall_back_to_sql(self):
+        self.assertIsNone(get_bitmaps().match({"title": "rome", "audience": "General"}))
+        self.assertIsNone(get_bitmaps().match({"genre": "history", "available_quantity": "available"}))
+        self.assertIsNone(get_bitmaps().match({"expression": "genre:history available:1"}))
+
+    def test_availability_filters_follow_circulation(self):
+        book = self.create_book(title="Dune", quantity=1, available_quantity=1)
+        borrower = {"first_name": "Ada", "last_name": "Lovelace", "email": "ada@example.com"}
+        self.client.post(reverse("checkout", args=[book.isbn]), borrower)
+        get_bitmaps()
+        self.assertEqual(search_books(query="dune", filters={"available_quantity": "1"}, strategy="auto").ranked_ids, [])
+        self.client.post(reverse("checkin"), {"isbn": book.isbn})
+
+        for strategy in ("auto", "inmemory", "hybrid", "indexed"):
+            with self.subTest(strategy=strategy):
+                response = search_books(query="dune", filters={"available_quantity": "1"}, strategy=strategy)
+                self.assertEqual(response.ranked_ids, [book.id])
+
+    def test_saves_keep_bitmaps_current(self):
+        get_bitmaps()
+        poems = Bookinventory.objects.get(title="Roman Poems")
+        poems.genre = "History"
+        poems.save(update_fields=["genre"])
+        Bookinventory.objects.get(title="Roman Roads").delete()
+
+        expected = sorted(Bookinventory.objects.filter(title__in=["Rome Rising", "Roman Poems"]).values_list("id", flat=True))
+        self.assertEqual(bitmap_ids(get_bitmaps().match({"genre": "history"})), expected)
+
+    def test_ranked_search_applies_filters_before_the_limit(self):
+        response = search_books(query="roman", filters={"genre": "poetry"}, strategy="inmemory", limit=1)
+
+        self.assertEqual(response.ranked_ids, [Bookinventory.objects.get(title="Roman Poems").id])
+
+    def test_stale_bitmaps_never_hide_books_from_filtered_searches(self):
+        get_bitmaps()
+        # Another worker's save: the database changes without this process's bitmaps hearing about it.
+        Bookinventory.objects.filter(title="Roman Roads").update(genre="Poetry")
+        expected = sorted(Bookinventory.objects.filter(title__startswith="Roman").values_list("id", flat=True))
+
+        for strategy in ("auto", "inmemory", "hybrid", "indexed"):
+            with self.subTest(strategy=strategy):
+                response = search_books(query="roman", filters={"genre": "poetry"}, strategy=strategy)
+                self.assertEqual(sorted(response.ranked_ids), expected)
+
+
+class FacetTests(LibraryViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_book(title="Rome Rising", genre="History", audience="Upper School", language="Latin")
+        self.create_book(title="Roman Roads", genre="History", available_quantity=0)
+        self.create_book(title="Python 101", genre="Computing", language="English")
+
+    def test_all_facets_come_from_one_grouped_query(self):
+        with self.assertNumQueries(1):
+            facets = facet_counts(Bookinventory.objects.all())
+
+        self.assertEqual(facets["genre"][0], {"value": "History", "label": "History", "count": 2})
+        self.assertEqual([entry["count"] for entry in facets["genre"]], [2, 1])
+        self.assertEqual({entry["value"]: entry["count"] for entry in facets["language"]}, {"English": 2, "Latin": 1})
+        self.assertEqual(
+            [(entry["value"], entry["count"]) for entry in facets["availability"]],
+            [("available", 2), ("0", 1)],
+        )
+
+    def test_ranked_search_facets_only_the_ranked_results(self):
+        response = search_books(query="roman", strategy="hybrid", include_facets=True)
+
+        self.assertEqual({entry["value"]: entry["count"] for entry in response.facets["genre"]}, {"History": 1})
+        self.assertGreaterEqual(response.facet_latency_ms, 0)
+        self.assertEqual(search_books(query="roman", strategy="hybrid").facets, {})
+
+    def test_search_page_links_facet_values_to_filters(self):
+        response = self.client.get(reverse("search_results"), {"language": "latin"})
+
+        self.assertEqual([book["title"] for book in response.context["results"]], ["Rome Rising"])
+        latin = response.context["facets"]["language"][0]
+        self.assertTrue(latin["selected"])
+        self.assertNotIn("language=", latin["query_string"])
+        genre = response.context["facets"]["genre"][0]
+        self.assertEqual((genre["value"], genre["count"]), ("History", 1))
+        self.assertIn("genre=History", genre["query_string"])
+
+
+class RankedFetchTests(LibraryViewTestCase):
+    def test_ranked_results_preserve_order_with_one_query(self):
+        books = [self.create_book(title=f"Book {index}") for index in range(4)]
+        ranked_ids = [books[2].id, books[0].id, books[3].id, books[1].id]
+
+        results = order_by_ranked_ids(Bookinventory.objects.all(), ranked_ids)
+
+        self.assertIsInstance(results, RankedResults)
+        with self.assertNumQueries(1):
+            self.assertEqual([book.id for book in results], ranked_ids)
+
+    def test_ranked_results_slice_refills_after_exclude(self):
+        books = [self.create_book(title=f"Book {index}") for index in range(4)]
+        ranked_ids = [book.id for book in reversed(books)]
+
+        results = order_by_ranked_ids(Bookinventory.objects.all(), ranked_ids).exclude(id=books[3].id)
+
+        self.assertEqual([book.id for book in results[:2]], [books[2].id, books[1].id])
+        self.assertEqual(results.count(), 3)
+
+
+class QueryPlannerTests(LibraryViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.rome = self.create_book(title="Rome Rising", isbn="9780306406157", audience="Upper School")
+        for index in range(3):
+            self.create_book(title=f"Python Guide {index}")
+
+    def test_queries_are_classified_and_routed(self):
+        cases = [
+            ("978-0-306-40615-7", 10, "isbn", "isbn"),
+            ("", 10, "browse", "browse"),
+            ("rome", 10, "rare_token", "indexed"),
+            ("python", 2, "common_token", "hybrid"),
+            ("python rome", 10, "phrase", "hybrid"),
+            ("carthage", 10, "unknown_token", "hybrid"),
+        ]
+        for query, limit, query_class, strategy in cases:
+            with self.subTest(query=query):
+                plan = plan_query(query, {}, limit)
+                self.assertEqual((plan.query_class, plan.strategy), (query_class, strategy))
+                self.assertGreater(plan.estimated_cost, 0)
+
+    def test_postgres_plans_from_the_lexicon_without_building_the_index(self):
+        statistics = patch("core.planner.postgres_term_statistics", return_value=(4, {"rome": 1}))
+        no_index = patch("core.discovery.inverted_index.get_index", side_effect=AssertionError("index built"))
+        with statistics as lexicon, no_index, patch.object(connection, "vendor", "postgresql"):
+            plan = plan_query("rome", {}, 10)
+
+        lexicon.assert_called_once_with(["rome"])
+        self.assertEqual((plan.query_class, plan.strategy), ("rare_token", "indexed"))
+        self.assertEqual(plan.statistics["catalog_size"], 4)
+
+    def test_filter_selectivity_scales_the_browse_estimate(self):
+        self.assertEqual(plan_query("", {}, 10).estimated_cost, 10)
+        self.assertEqual(plan_query("", {"audience": "Upper School"}, 10).estimated_cost, 40)
+
+    def test_auto_search_exposes_the_plan_and_looks_up_isbns_directly(self):
+        with self.assertNumQueries(1):
+            response = search_books(query="9780306406157")
+
+        self.assertEqual((response.strategy, response.ranked_ids), ("isbn", [self.rome.id]))
+        self.assertEqual(response.plan.query_class, "isbn")
+
+        missing = search_books(query="9780000000000")
+        self.assertEqual(missing.plan.strategy, "isbn")
+        self.assertEqual(missing.strategy, "hybrid")
+
+    def test_search_event_records_the_plan(self):
+        self.client.get(reverse("search_results"), {"q": "rome"})
+
+        metadata = ProductEvent.objects.get(event_type="search_submitted").metadata["metadata"]
+        self.assertEqual(metadata["plan"]["query_class"], "rare_token")
+        self.assertEqual(metadata["strategy"], "indexed")
+
+
+class HybridPipelineTests(LibraryViewTestCase):
+    def test_hybrid_fetches_candidate_columns_only_for_the_ranked_pool(self):
+        for number in range(5):
+            self.create_book(title=f"Python Volume {number}")
+        self.create_book(title="Roman History", description="Empire")
+        get_index()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = search_books(query="python", strategy="hybrid", limit=2)
+            titles = [book.title for book in response.queryset[:2]]
+
+        membership, columns, _hydration = [query["sql"] for query in queries.captured_queries]
+        self.assertNotIn("search_terms", membership)
+        self.assertIn("search_terms", columns)
+        self.assertEqual(len(columns.split(" IN (", 1)[1].split(")", 1)[0].split(",")), 2)
+        self.assertEqual(len(titles), 2)
+        self.assertTrue(all(title.startswith("Python") for title in titles))
+
+    def test_book_save_stores_term_vector(self):
+        book = self.create_book(title="Python Python", author="Ada", description="", publisher="")
+
+        book.refresh_from_db()
+        self.assertEqual(book.search_terms["python"], 2)
+        self.assertAlmostEqual(book.search_terms_norm, sum(c * c for c in book.search_terms.values()) ** 0.5)
+
+        book.summary = "python"
+        book.save(update_fields=["summary", "search_document"])
+        book.refresh_from_db()
+        self.assertEqual(book.search_terms["python"], 3)
+
+    @patch("core.search.semantic_score")
+    def test_hybrid_scores_from_stored_term_vectors(self, mock_semantic_score):
+        self.create_book(title="Python 101")
+
+        response = search_books(query="python", strategy="hybrid")
+
+        self.assertEqual(len(response.ranked_ids), 1)
+        mock_semantic_score.assert_not_called()
+
+    def test_hybrid_applies_filters_before_the_candidate_limit(self):
+        for index in range(3):
+            self.create_book(title=f"Python Primer {index}", audience="General")
+        upper = self.create_book(title="Python Projects", audience="Upper School")
+
+        response = search_books(query="python", filters={"audience": "Upper School"}, strategy="hybrid", limit=1)
+
+        self.assertEqual(response.ranked_ids, [upper.id])
+
+    def test_hybrid_keeps_top_k_of_a_larger_rerank_pool(self):
+        books = [self.create_book(title=f"Python Primer {index}") for index in range(6)]
+
+        with override_settings(SEARCH_RERANK_POOL=6):
+            response = search_books(query="python", strategy="hybrid", limit=2)
+        full = search_books(query="python", strategy="hybrid", limit=len(books))
+
+        self.assertEqual(response.ranked_ids, full.ranked_ids[:2])
+
+
+class TopKSelectionTests(TestCase):
+    def test_top_k_matches_a_stable_full_sort(self):
+        scored = [("a", 1.0), ("b", 3.0), ("c", 2.0), ("d", 3.0), ("e", 2.0)]
+
+        self.assertEqual(top_k(scored, 3), top_k(scored)[:3])
+        self.assertEqual(top_k(scored, 3), [("b", 3.0), ("d", 3.0), ("c", 2.0)])
+        self.assertEqual(top_k(scored, 0), [])
+
+    def test_threshold_rejects_candidates_that_cannot_place(self):
+        selector = TopK(2)
+        selector.push(5.0, "a")
+        selector.push(4.0, "b")
+
+        self.assertFalse(selector.can_admit(4.0))
+        self.assertTrue(selector.can_admit(4.5))
+
+    def test_fallback_rank_limit_returns_the_best_books(self):
+        books = [
+            SimpleNamespace(
+                id=index,
+                title=title,
+                author="",
+                genre="",
+                summary="",
+                description="",
+                metadata={},
+                available_quantity=available,
+                published_date=date(2015, 1, 1),
+            )
+            for index, (title, available) in enumerate(
+                [("Roman History", 1), ("Python Basics", 0), ("Python Python", 1), ("Cooking", 1)]
+            )
+        ]
+        intent = {"tags": [], "course_focus": ""}
+
+        ranked = fallback_rank("python", intent, books, limit=2)
+
+        self.assertEqual([book.title for book, _score, _reason in ranked], ["Python Python", "Python Basics"])
+        self.assertEqual(ranked, fallback_rank("python", intent, books)[:2])
+
+    @skipUnless(numpy_available(), "NumPy is not installed")
+    def test_top_k_indices_breaks_ties_like_a_stable_sort(self):
+        scores = np.array([0.5, 0.9, 0.5, 0.9, 0.1, 0.5])
+
+        for limit in range(len(scores) + 1):
+            self.assertEqual(top_k_indices(scores, limit).tolist(), np.argsort(-scores, kind="stable")[:limit].tolist())
+
+
+@override_settings(SEARCH_CACHE_BACKEND="local")
+class SearchResultCacheTests(LibraryViewTestCase):
+    def setUp(self):
+        super().setUp()
+        get_result_cache().clear()
+
+    def test_repeated_query_is_served_from_cache(self):
+        book = self.create_book(title="Python 101")
+
+        first = search_books(query="Python ", strategy="hybrid")
+        second = search_books(query="  python", strategy="hybrid")
+
+        self.assertEqual(first.cache_status, "miss")
+        self.assertEqual(second.cache_status, "hit")
+        self.assertEqual(second.ranked_ids, [book.id])
+        self.assertEqual([result.id for result in second.queryset], [book.id])
+        self.assertEqual(second.cache_stats["hits"] - first.cache_stats["hits"], 1)
+
+    def test_book_save_invalidates_cached_results(self):
+        self.create_book(title="Python 101")
+        search_books(query="python", strategy="hybrid")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            newer = self.create_book(title="Python Projects")
+        response = search_books(query="python", strategy="hybrid")
+
+        self.assertEqual(response.cache_status, "miss")
+        self.assertIn(newer.id, response.ranked_ids)
+
+    def test_checkout_bumps_catalog_generation(self):
+        book = self.create_book(available_quantity=2)
+        generation = catalog_generation()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("checkout", args=[book.isbn]),
+                {"first_name": "John", "last_name": "Doe", "email": "john@example.com"},
+            )
+
+        self.assertGreater(catalog_generation(), generation)
+
+    @override_settings(SEARCH_EPOCH_CHECK_SECONDS=60)
+    def test_generation_is_read_once_per_interval_until_this_process_bumps_it(self):
+        from django.core.cache import cache
+
+        bump_catalog_generation()
+        with patch("core.discovery.result_cache.cache", wraps=cache) as shared_cache:
+            generation = catalog_generation()
+            for _ in range(3):
+                self.assertEqual(catalog_generation(), generation)
+            self.assertEqual(shared_cache.get_or_set.call_count, 1)
+
+            bump_catalog_generation()
+            self.assertGreater(catalog_generation(), generation)
+            self.assertEqual(shared_cache.get_or_set.call_count, 2)
+
+    def test_startup_refuses_a_process_local_generation_cache(self):
+        local = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        shared = {"default": {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "core_cache"}}
+
+        with override_settings(CACHES=local, SHARED_CACHE_REQUIRED=True):
+            with self.assertRaises(ImproperlyConfigured):
+                require_shared_cache()
+        with override_settings(CACHES=shared, SHARED_CACHE_REQUIRED=True):
+            require_shared_cache()
+        with override_settings(CACHES=local, SHARED_CACHE_REQUIRED=False):
+            require_shared_cache()
+
+
+class InMemorySearchTests(LibraryViewTestCase):
+    def test_inmemory_strategy_ranks_title_matches_first(self):
+        title_match = self.create_book(title="Python Patterns", description="A reference")
+        body_match = self.create_book(title="Snakes", description="Mentions python once")
+        self.create_book(title="Roman History", description="Empire")
+
+        response = search_books(query="python", strategy="inmemory")
+
+        self.assertEqual(response.strategy, "inmemory")
+        self.assertEqual(response.ranked_ids, [title_match.id, body_match.id])
+        self.assertEqual([book.title for book in response.queryset], ["Python Patterns", "Snakes"])
+
+    def test_inmemory_index_tracks_saves_and_deletes(self):
+        book = self.create_book(title="Roman History")
+        self.assertEqual(search_books(query="carthage", strategy="inmemory").ranked_ids, [])
+
+        book.title = "Carthage and Rome"
+        book.save()
+        self.assertEqual(search_books(query="carthage", strategy="inmemory").ranked_ids, [book.id])
+
+        book.delete()
+        self.assertEqual(search_books(query="carthage", strategy="inmemory").ranked_ids, [])
+
+    def test_inmemory_strategy_applies_filters(self):
+        self.create_book(title="Python 101", audience="General")
+        upper = self.create_book(title="Python Projects", audience="Upper School")
+
+        response = search_books(query="python", filters={"audience": "Upper School"}, strategy="inmemory")
+
+        self.assertEqual(response.ranked_ids, [upper.id])
+
+    def test_bm25f_weights_fields_like_ts_rank(self):
+        body_match = self.create_book(title="Field Notes", description="python python python")
+        title_match = self.create_book(title="Python", description="A reference")
+
+        response = search_books(query="python", strategy="indexed")
+
+        self.assertEqual(response.ranked_ids, [title_match.id, body_match.id])
+
+    def test_bm25f_top_k_matches_exhaustive_ranking(self):
+        for index in range(12):
+            self.create_book(
+                title=f"Atlas {index}",
+                description="rare maps" if index % 4 == 0 else "common atlas atlas",
+                genre="Geography" if index % 3 else "Maps",
+            )
+        index = get_index()
+
+        for query in ["atlas", "atlas maps", "rare maps geography"]:
+            self.assertEqual(index.search(query, limit=3), index.search(query)[:3])
+
+    def test_books_saved_by_another_worker_are_found_on_sqlite(self):
+        get_index()
+        book = self.create_book(title="Zanzibar Chronicles", quantity=1, available_quantity=1)
+        # Another worker's save reaches FTS5 through the triggers but never this process's index.
+        get_index().remove(book.pk)
+
+        for strategy in ("auto", "hybrid", "inmemory", "indexed"):
+            with self.subTest(strategy=strategy):
+                self.assertEqual(search_books(query="zanzibar", strategy=strategy).ranked_ids, [book.id])
+        self.assertEqual(get_index().document_frequency("zanzibar"), 1)
+
+    def test_bm25f_drops_books_missing_from_the_database(self):
+        book = self.create_book(title="Carthage", quantity=0, available_quantity=0)
+        get_index()
+        # Bypass the delete signals, the way a rolled-back save leaves a stale entry behind.
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM bookinventory WHERE id = %s", [book.pk])
+
+        self.assertEqual(search_books(query="carthage", strategy="indexed").ranked_ids, [])
+        self.assertEqual(search_books(query="carthage", strategy="inmemory").ranked_ids, [])
+
+    def test_bm25f_membership_comes_from_the_database_without_fts5(self):
+        book = self.create_book(title="Carthage Rising")
+        self.create_book(title="Roman Roads")
+        # Another worker's save that this process's index never heard about.
+        get_index().remove(book.pk)
+
+        with patch.object(connection, "vendor", "mysql"):
+            for strategy in ("indexed", "inmemory"):
+                with self.subTest(strategy=strategy):
+                    self.assertEqual(search_books(query="carthage", strategy=strategy).ranked_ids, [book.id])
+                    self.assertEqual(
+                        search_books(query="carthage", filters={"genre": "history"}, strategy=strategy).ranked_ids,
+                        [],
+                    )
+
+
+class PhraseSearchTests(LibraryViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.phrase = self.create_book(title="The Civil War", description="A history of the war between the states")
+        self.near = self.create_book(title="Civil Rights and the Long War", description="Essays")
+        self.split = self.create_book(
+            title="Civil Engineering Handbook for Modern Bridges", author="War Historian", description="Bridges"
+        )
+
+    def test_parse_query_extracts_phrases_and_near(self):
+        parsed = parse_query('"civil war" battles civil NEAR/3 rights near misses')
+
+        self.assertEqual(parsed.text, "civil war battles civil rights near misses")
+        self.assertEqual(
+            parsed.constraints,
+            (ProximityConstraint("phrase", ("civil", "war")), ProximityConstraint("near", ("civil", "rights"), 3)),
+        )
+        self.assertEqual(parsed.free_terms, ["battles", "near", "misses"])
+
+    def test_phrases_and_near_narrow_every_sqlite_path(self):
+        cases = [
+            ("civil war", {self.phrase.id, self.near.id, self.split.id}),
+            ('"civil war"', {self.phrase.id}),
+            ("civil NEAR/4 war", {self.phrase.id, self.near.id}),
+            ("civil NEAR/1 war", {self.phrase.id}),
+        ]
+        for query, expected in cases:
+            with self.subTest(query=query):
+                self.assertEqual(set(search_books(query=query, strategy="inmemory").ranked_ids), expected)
+                self.assertEqual(set(search_books(query=query, strategy="hybrid").ranked_ids), expected)
+                self.assertEqual(set(sqlite_fts_ids(query)), expected)
+
+    def test_postgres_near_expands_to_bounded_gaps(self):
+        tsquery, params = postgres_tsquery(parse_query('"civil war" battles rome NEAR/1 carthage'))
+
+        self.assertEqual(
+            tsquery,
+            "plainto_tsquery('english', %s) && phraseto_tsquery('english', %s) && to_tsquery('english', %s)",
+        )
+        self.assertEqual(
+            params,
+            ["battles", "civil war", "rome <1> carthage | carthage <1> rome | rome <2> carthage | carthage <2> rome"],
+        )
+
+    def test_typo_correction_keeps_the_phrase_syntax(self):
+        response = search_books(query='"civil warr"', strategy="inmemory")
+
+        self.assertEqual(response.corrected_query, '"civil war"')
+        self.assertEqual(response.ranked_ids, [self.phrase.id])
+
+
+class TypoToleranceTests(LibraryViewTestCase):
+    def test_edit_distance_counts_a_transposition_once(self):
+        self.assertEqual(edit_distance("histroy", "history", 2), 1)
+        self.assertEqual(edit_distance("fantsy", "fantasy", 2), 1)
+        self.assertEqual(edit_distance("python", "history", 2), 3)
+
+    def test_misspelled_query_is_rewritten_before_ranking(self):
+        history = self.create_book(title="Roman History", description="Empire")
+        self.create_book(title="Python 101")
+
+        response = search_books(query="roman histroy", strategy="hybrid")
+
+        self.assertEqual(response.corrected_query, "roman history")
+        self.assertEqual(response.corrections, {"histroy": "history"})
+        self.assertEqual(response.ranked_ids, [history.id])
+
+    def test_correction_sees_books_added_after_the_index_was_built(self):
+        self.create_book(title="Python 101")
+        self.assertEqual(search_books(query="fantsy", strategy="indexed").ranked_ids, [])
+
+        fantasy = self.create_book(title="Fantasy Atlas", genre="Fantasy")
+        response = search_books(query="fantsy", strategy="indexed")
+
+        self.assertEqual(response.corrections, {"fantsy": "fantasy"})
+        self.assertEqual(response.ranked_ids, [fantasy.id])
+
+    def test_words_missing_from_a_stale_vocabulary_are_not_corrected(self):
+        self.create_book(title="History of Rome")
+        get_index()
+        romana = self.create_book(title="Historia Romana")
+        # Saved by another worker: FTS5 has the words, this process's vocabulary does not.
+        get_index().remove(romana.pk)
+
+        response = search_books(query="historia", strategy="auto")
+
+        self.assertEqual(response.corrections, {})
+        self.assertEqual(response.ranked_ids, [romana.id])
+
+    def test_known_and_unmatched_terms_are_left_alone(self):
+        self.create_book(title="Python 101")
+
+        self.assertEqual(search_books(query="python", strategy="hybrid").corrected_query, "")
+        self.assertEqual(search_books(query="zyxwvut", strategy="hybrid").corrections, {})
+
+    def test_search_page_reports_the_rewrite(self):
+        self.create_book(title="Roman History", description="Empire")
+
+        response = self.client.get(reverse("search_results"), {"q": "histroy"})
+
+        self.assertContains(response, "Showing results for “history”")
+        self.assertContains(response, "Roman History")
+
+
+class AutocompleteTests(LibraryViewTestCase):
+    def completions(self, prefix):
+        response = self.client.get(reverse("autocomplete"), {"q": prefix})
+        self.assertEqual(response.status_code, 200)
+        return [(item["type"], item["label"]) for item in response.json()["completions"]]
+
+    def test_completes_titles_authors_and_genres_from_any_word(self):
+        book = self.create_book(title="Roman History", author="Mary Beard", genre="History")
+        self.create_book(title="Python 101", author="Jane Author", genre="Programming")
+
+        completions = self.completions("hist")
+
+        self.assertIn(("title", "Roman History"), completions)
+        self.assertIn(("genre", "History"), completions)
+        self.assertNotIn(("title", "Python 101"), completions)
+        self.assertEqual(self.completions("bea"), [("author", "Mary Beard")])
+        title = next(item for item in self.client.get(reverse("autocomplete"), {"q": "roman"}).json()["completions"])
+        self.assertEqual(title["url"], reverse("book_page", args=[book.id]))
+
+    def test_ranks_completions_by_circulation(self):
+        quiet = self.create_book(title="Atlas of Rivers")
+        popular = self.create_book(title="Atlas of Mountains")
+        get_autocomplete()
+        self.create_log(popular)
+
+        self.assertEqual(self.completions("atlas")[:2], [("title", popular.title), ("title", quiet.title)])
+
+    def test_prefix_index_follows_saves_without_querying_per_keystroke(self):
+        book = self.create_book(title="Roman History")
+        get_autocomplete()
+        book.title = "Carthage Must Fall"
+        book.save()
+
+        with self.assertNumQueries(0):
+            self.assertIn(("title", "Carthage Must Fall"), self.completions("cart"))
+            self.assertEqual(self.completions("roman"), [])
+
+    @override_settings(SEARCH_EPOCH_CHECK_SECONDS=60)
+    def test_keystrokes_read_the_shared_epoch_at_most_once_per_interval(self):
+        self.create_book(title="Roman History")
+        epoch = get_autocomplete().epoch
+
+        with patch("core.discovery.inverted_index.cache") as shared_cache:
+            shared_cache.get.return_value = epoch
+            for prefix in ("r", "ro", "rom", "roma"):
+                self.assertEqual(self.completions(prefix), [("title", "Roman History")])
+
+        self.assertLessEqual(shared_cache.get.call_count, 1)
+
+
+@skipUnless(numpy_available(), "NumPy is not installed")
+class VectorizedSearchTests(LibraryViewTestCase):
+    def test_vectorized_strategy_matches_hybrid_ranking(self):
+        self.create_book(title="Python 101", available_quantity=0)
+        self.create_book(title="Python Python Projects", description="python practice")
+        self.create_book(title="Snakes", description="A python in the wild")
+
+        hybrid = search_books(query="python projects", strategy="hybrid")
+        vectorized = search_books(query="python projects", strategy="vectorized")
+
+        self.assertEqual(vectorized.strategy, "vectorized")
+        self.assertEqual(vectorized.ranked_ids, hybrid.ranked_ids)
+
+    def test_vectorized_strategy_sees_books_saved_after_build(self):
+        self.create_book(title="Python 101")
+        search_books(query="python", strategy="vectorized")
+
+        late = self.create_book(title="Carthage", description="Punic wars")
+        response = search_books(query="carthage punic", strategy="vectorized")
+
+        self.assertEqual(response.ranked_ids, [late.id])
+        self.assertEqual(response.ranked_ids, search_books(query="carthage punic", strategy="hybrid").ranked_ids)
+
+
+class HedgedSearchTests(LibraryViewTestCase):
+    def fake_branches(self, delays, results):
+        def run_branch(branch, query, filters, limit):
+            time.sleep(delays.get(branch, 0))
+            if isinstance(results[branch], Exception):
+                raise results[branch]
+            return results[branch]
+
+        return patch("core.discovery.hedged.run_branch", side_effect=run_branch)
+
+    def test_primary_branch_wins_when_it_answers_in_budget(self):
+        with self.fake_branches({"inmemory": 0.05, "baseline": 0.05}, {"hybrid": [1], "inmemory": [2], "baseline": [3]}):
+            self.assertEqual(hedged_search("python", {}, 10, budget_ms=500), ([1], "hybrid"))
+
+    def test_deadline_returns_best_finished_branch(self):
+        delays = {"hybrid": 0.5, "baseline": 0.01}
+        with self.fake_branches(delays, {"hybrid": [1], "inmemory": [2], "baseline": [3]}):
+            started = time.perf_counter()
+            ranked_ids, winner = hedged_search("python", {}, 10, budget_ms=50)
+
+        self.assertEqual((ranked_ids, winner), ([2], "inmemory"))
+        self.assertLess(time.perf_counter() - started, 0.4)
+
+    def test_empty_branches_fall_through_to_one_with_hits(self):
+        with self.fake_branches({}, {"hybrid": [], "inmemory": RuntimeError("boom"), "baseline": [3]}):
+            self.assertEqual(hedged_search("python", {}, 10, budget_ms=50), ([3], "baseline"))
+
+    def test_losing_and_stuck_branches_are_cancelled(self):
+        class QueuedExecutor:
+            # Only the branches in `answers` ever finish; the rest stay queued behind a busy pool.
+            def __init__(self, answers):
+                self.answers, self.futures = answers, {}
+
+            def submit(self, function, branch, *args):
+                future = self.futures[branch] = Future()
+                if branch in self.answers:
+                    future.set_result(self.answers[branch])
+                return future
+
+        won = QueuedExecutor({"hybrid": [1]})
+        with patch("core.discovery.hedged.get_executor", return_value=won):
+            self.assertEqual(hedged_search("python", {}, 10, budget_ms=50), ([1], "hybrid"))
+        self.assertTrue(won.futures["inmemory"].cancelled() and won.futures["baseline"].cancelled())
+
+        book = self.create_book(title="Python 101")
+        stuck = QueuedExecutor({})
+        started = time.perf_counter()
+        with patch("core.discovery.hedged.get_executor", return_value=stuck):
+            self.assertEqual(hedged_search("python", {}, 10, budget_ms=50), ([book.id], "inline"))
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertTrue(all(future.cancelled() for future in stuck.futures.values()))
+
+    def test_all_failed_branches_answer_inline(self):
+        book = self.create_book(title="Python 101")
+        failure = RuntimeError("no connection")
+        with self.fake_branches({}, {"hybrid": failure, "inmemory": failure, "baseline": failure}):
+            self.assertEqual(hedged_search("python", {}, 10, budget_ms=50), ([book.id], "inline"))
+
+
+@override_settings(SEARCH_CACHE_BACKEND="local")
+class HedgedSearchIntegrationTests(TransactionTestCase):
+    # Branch threads open their own connections, so the books must be committed for them to see.
+    def setUp(self):
+        reset_index()
+        reset_matrix()
+        reset_bitmaps()
+        get_result_cache().clear()
+
+    def test_hedged_strategy_records_winning_branch(self):
+        book = Bookinventory.objects.create(
+            title="Python 101",
+            author="Jane Author",
+            isbn="9780000000001",
+            published_date=date(2020, 1, 1),
+            publisher="Example Press",
+            quantity=1,
+            available_quantity=1,
+        )
+
+        response = search_books(query="python", strategy="hedged")
+
+        self.assertEqual(response.strategy, "hedged")
+        self.assertIn(response.winning_branch, HEDGE_BRANCHES + ("inline",))
+        self.assertEqual(list(response.queryset), [book])
+        cached = search_books(query="python", strategy="hedged")
+        self.assertEqual(cached.cache_status, "hit")
+        self.assertEqual(cached.winning_branch, response.winning_branch)
+
+
+class QueryLanguageTests(LibraryViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.hobbit = self.create_book(
+            title="The Hobbit", author="J. R. R. Tolkien", genre="Fantasy", published_date=date(2002, 5, 1)
+        )
+        self.dragons = self.create_book(
+            title="Dragons of Middle Earth", author="Tolkien Society", genre="Fantasy", published_date=date(2008, 1, 1)
+        )
+        self.silmarillion = self.create_book(
+            title="The Silmarillion", author="J. R. R. Tolkien", genre="Fantasy", published_date=date(1977, 9, 15)
+        )
+        self.history = self.create_book(
+            title="Roman History", author="Mary Beard", genre="History", language="Latin", published_date=date(2005, 1, 1)
+        )
+
+    def matching_titles(self, expression):
+        return set(Bookinventory.objects.filter(compile_query(expression)).values_list("title", flat=True))
+
+    def test_parse_builds_boolean_ast(self):
+        self.assertEqual(
+            parse('by:tolkien (genre:fantasy OR subject:"art history") -dragons year:2000..2010'),
+            And(
+                (
+                    Field("author", "tolkien"),
+                    Or((Field("genre", "fantasy"), Field("genre", "art history"))),
+                    Not(Term("dragons")),
+                    Field("year", "2000..2010"),
+                )
+            ),
+        )
+        self.assertEqual(parse("title:hob* lang:=latin"), And((Field("title", "hob", "prefix"), Field("language", "latin", "exact"))))
+        self.assertEqual(parse("re:union"), Term("re:union"))
+
+    def test_split_query_keeps_plain_text_for_ranking(self):
+        self.assertEqual(split_query("civil war"), ("civil war", ""))
+        self.assertEqual(split_query('"civil war" author:foote -gettysburg'), ('"civil war"', "(author:foote -gettysburg)"))
+        self.assertEqual(split_query("author:foote OR shelby"), ("", "(author:foote OR shelby)"))
+        self.assertEqual(split_query("(unbalanced author:foote"), ("(unbalanced author:foote", ""))
+
+    def test_compiled_expressions_filter_the_catalog(self):
+        self.assertEqual(
+            self.matching_titles("author:tolkien genre:fantasy -dragons year:2000..2010"), {"The Hobbit"}
+        )
+        self.assertEqual(self.matching_titles("year:..1990 OR lang:latin"), {"The Silmarillion", "Roman History"})
+        self.assertEqual(self.matching_titles("title:silm*"), set())
+        self.assertEqual(self.matching_titles("title:the* NOT genre:=history"), {"The Hobbit", "The Silmarillion"})
+        self.assertEqual(self.matching_titles("year:someday"), set())
+
+    def test_free_text_terms_compile_to_search_vector_subqueries_on_postgres(self):
+        sql = str(Bookinventory.objects.filter(compile_query('tolkien -"middle earth"', vendor="postgresql")).query)
+
+        self.assertIn("search_vector @@ plainto_tsquery('english', tolkien)", sql)
+        self.assertIn("search_vector @@ phraseto_tsquery('english', middle earth)", sql)
+
+    def test_punctuation_only_terms_match_nothing(self):
+        self.assertEqual(self.matching_titles("!!!"), set())
+        response = self.client.get(
+            reverse("advanced_search_results"),
+            {"search_type": "everything", "field[]": ["any_field"], "operator[]": ["icontains"], "search_term[]": ["!!!"]},
+        )
+        self.assertEqual(list(response.context["results"]), [])
+
+    def test_bitmaps_answer_structured_expressions(self):
+        bitmaps = get_bitmaps()
+
+        expected = {self.dragons.id, self.hobbit.id}
+        self.assertEqual(set(bitmap_ids(bitmaps.match({"expression": "genre:fantasy -year:..1990"}))), expected)
+        self.assertEqual(
+            set(bitmap_ids(bitmaps.match({"expression": "lang:latin OR year:2008"}))), {self.history.id, self.dragons.id}
+        )
+        self.assertIsNone(bitmaps.match({"expression": "author:tolkien genre:fantasy"}))
+
+    def test_search_results_route_field_syntax_to_filters(self):
+        response = self.client.get(reverse("search_results"), {"q": "tolkien genre:fantasy -dragons year:2000..2010"})
+
+        self.assertEqual([book["title"] for book in response.context["results"]], ["The Hobbit"])
+        self.assertEqual(response.context["query"], "tolkien genre:fantasy -dragons year:2000..2010")
+        event = ProductEvent.objects.filter(event_type="search_submitted").latest("id")
+        self.assertEqual(event.metadata["metadata"]["filters"]["expression"], "(genre:fantasy -dragons year:2000..2010)")
+
+        browse = self.client.get(reverse("search_results"), {"q": "author:tolkien -dragons"})
+        self.assertEqual(
+            {book["title"] for book in browse.context["results"]}, {"The Hobbit", "The Silmarillion"}
+        )
+
+    def test_advanced_search_accepts_query_language(self):
+        response = self.client.get(
+            reverse("advanced_search_results"),
+            {
+                "search_type": "everything",
+                "field[]": ["author"],
+                "operator[]": ["icontains"],
+                "search_term[]": ["tolkien"],
+                "q": "-dragons year:..1990",
+            },
+        )
+
+        self.assertEqual([book.title for book in response.context["results"]], ["The Silmarillion"])
+
+
 class AdvancedSearchTests(LibraryViewTestCase):
     def test_advanced_search_page_loads_without_results(self):
         response = self.client.get(reverse("advanced_search_results"))
@@ -309,6 +1628,25 @@ class AdvancedSearchTests(LibraryViewTestCase):
         self.assertContains(response, "Python 101")
         self.assertNotContains(response, "Roman History")
 
+    def test_advanced_search_contains_matches_inside_words(self):
+        self.create_book(title="Python 101")
+        self.create_book(title="Roman History", isbn="3210987654321")
+
+        for operator in ("contains", "icontains"):
+            with self.subTest(operator=operator):
+                response = self.client.get(
+                    reverse("advanced_search_results"),
+                    {
+                        "search_type": "everything",
+                        "field[]": ["title"],
+                        "operator[]": [operator],
+                        "search_term[]": ["YTHO"],
+                    },
+                )
+
+                self.assertContains(response, "Python 101")
+                self.assertNotContains(response, "Roman History")
+
     def test_advanced_search_accepts_isbn_field(self):
         target = self.create_book(title="Python 101")
         self.create_book(title="Roman History", isbn="3210987654321")
@@ -328,10 +1666,30 @@ class AdvancedSearchTests(LibraryViewTestCase):
         self.assertNotContains(response, "Roman History")
 
 
+    def test_advanced_search_paginates_broad_queries(self):
+        for index in range(3):
+            self.create_book(title=f"Atlas {index}")
+        params = {
+            "search_type": "everything",
+            "field[]": ["title"],
+            "operator[]": ["icontains"],
+            "search_term[]": ["a"],
+            "page_size": 2,
+        }
+
+        first = self.client.get(reverse("advanced_search_results"), params)
+        second = self.client.get(reverse("advanced_search_results") + "?" + first.context["next_page_query"])
+
+        self.assertEqual([book.title for book in first.context["results"]], ["Atlas 0", "Atlas 1"])
+        self.assertEqual([book.title for book in second.context["results"]], ["Atlas 2"])
+        self.assertEqual(second.context["result_count"], 3)
+        self.assertEqual(second.context["next_page_query"], "")
+
+
 class ErrorHandlingTests(LibraryViewTestCase):
-    @patch("core.views.Bookinventory.objects.select_for_update")
-    def test_checkout_database_error_is_handled(self, mock_select_for_update):
-        mock_select_for_update.return_value.get.side_effect = Exception("Database error")
+    @patch("core.views.Bookinventory.objects.get")
+    def test_checkout_database_error_is_handled(self, mock_get):
+        mock_get.side_effect = Exception("Database error")
 
         response = self.client.post(
             reverse("checkout", args=["1234567890123"]),
@@ -347,9 +1705,9 @@ class ErrorHandlingTests(LibraryViewTestCase):
             response, "An error occurred during checkout. Please try again."
         )
 
-    @patch("core.views.Bookinventory.objects.select_for_update")
-    def test_checkin_database_error_is_handled(self, mock_select_for_update):
-        mock_select_for_update.return_value.get.side_effect = Exception("Database error")
+    @patch("core.views.Bookinventory.objects.get")
+    def test_checkin_database_error_is_handled(self, mock_get):
+        mock_get.side_effect = Exception("Database error")
 
         response = self.client.post(reverse("checkin"), {"isbn": "1234567890123"})
 
@@ -473,12 +1831,51 @@ class ManagementCommandTests(TestCase):
             stdout=StringIO(),
         )
         out = StringIO()
-        call_command("benchmark_search", query=["atlas"], runs=2, limit=5, stdout=out)
+        call_command("benchmark_search", query=["atlas"], runs=2, limit=5, vector_sizes=[500], stdout=out)
         output = out.getvalue()
 
         self.assertIn("baseline", output)
         self.assertIn("indexed", output)
         self.assertIn("hybrid", output)
+        self.assertIn("inmemory", output)
+        self.assertIn("case_when", output)
+        self.assertIn("ranked_fetch", output)
+        self.assertIn("Vectorized vs hybrid search", output)
+        self.assertIn("cache hits=", output)
+
+    def test_benchmark_filters_reports_plans(self):
+        call_command(
+            "seed_demo_library",
+            books=8,
+            users=3,
+            loans=2,
+            holds=1,
+            wipe_existing=True,
+            stdout=StringIO(),
+        )
+        out = StringIO()
+        call_command("benchmark_filters", runs=2, stdout=out)
+        output = out.getvalue()
+
+        self.assertIn("plan isbn: exact", output)
+        self.assertIn("legacy", output)
+        self.assertIn("planned", output)
+        self.assertIn("access=index", output)
+
+    def test_rebuild_search_index_reports_counts(self):
+        Bookinventory.objects.create(
+            title="Python 101",
+            author="Jane Author",
+            isbn=str(uuid4().int)[:13],
+            published_date=date(2020, 1, 1),
+            publisher="Example Press",
+            quantity=1,
+            available_quantity=1,
+        )
+        out = StringIO()
+        call_command("rebuild_search_index", stdout=out)
+
+        self.assertIn("Indexed 1 books", out.getvalue())
 
     def test_evaluate_search_reports_metrics(self):
         Bookinventory.objects.create(
@@ -520,12 +1917,55 @@ class ManagementCommandTests(TestCase):
             audience="Upper School",
             genre="Technology",
         )
-        out = StringIO()
-        call_command("evaluate_search", stdout=out)
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = str(Path(directory) / "baseline.json")
+            with self.assertRaisesMessage(CommandError, "No baseline for [queries.json]"):
+                call_command("evaluate_search", baseline=baseline, require_baseline=True, stdout=StringIO())
+            out = StringIO()
+            call_command("evaluate_search", baseline=baseline, stdout=out)
         output = out.getvalue()
 
         self.assertIn("recall@5=", output)
         self.assertIn("precision@3=", output)
+        self.assertIn("No baseline for [queries.json]", output)
+
+    def test_ranking_metrics_use_graded_judgments(self):
+        judgments = {"A": 2, "B": 1, "C": 0}
+
+        self.assertAlmostEqual(ndcg_at_k(["A", "B", "C"], judgments), 1.0)
+        self.assertLess(ndcg_at_k(["B", "A"], judgments), 1.0)
+        self.assertEqual(ndcg_at_k(["C"], judgments), 0.0)
+        self.assertEqual(reciprocal_rank(["C", "X", "B"], judgments), 1 / 3)
+        self.assertEqual(reciprocal_rank(["C"], judgments), 0.0)
+
+    def test_evaluate_search_fails_when_synthetic_run_regresses_past_baseline(self):
+        live = Bookinventory.objects.create(
+            title="Kaloka Astronomy Studies 1",
+            author="Jane Author",
+            isbn=str(uuid4().int)[:13],
+            published_date=date(2020, 1, 1),
+            quantity=1,
+            available_quantity=1,
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = Path(directory) / "baseline.json"
+            options = {"books": 60, "queries": 4, "runs": 1, "strategy": ["inmemory"], "baseline": str(baseline)}
+            call_command("evaluate_search", write_baseline=True, stdout=StringIO(), **options)
+            report = json.loads(baseline.read_text())["synthetic-60"]["inmemory"]
+            self.assertEqual(report["ndcg@10"], 1.0)
+            self.assertEqual(report["mrr"], 1.0)
+
+            # Quality gates are exact; p95 gets the relative tolerance plus an absolute slack.
+            out = StringIO()
+            call_command("evaluate_search", latency_slack_ms=1000, stdout=out, **options)
+            self.assertIn("set aside 1 live books", out.getvalue())
+            self.assertIn("no regressions", out.getvalue())
+
+            report["ndcg@10"] = 1.5
+            baseline.write_text(json.dumps({"synthetic-60": {"inmemory": report}}))
+            with self.assertRaisesMessage(CommandError, "inmemory ndcg@10"):
+                call_command("evaluate_search", stdout=StringIO(), **options)
+        self.assertEqual(list(Bookinventory.objects.all()), [live])
 
 
 class Auth0Tests(TestCase):
@@ -11,15 +11,18 @@ from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.core.validators import validate_email
 from django.db import transaction
 from django.db.models import Q
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils.http import url_has_allowed_host_and_scheme
+from django.utils.safestring import mark_safe
 from django.utils import timezone
 from django.views.generic import ListView
 from django.conf import settings
 
 from .ai import fallback_concierge
+from .discovery.autocomplete import get_autocomplete
 from .discovery.pipeline import run_search_pipeline
 from .models import (
     BookCopy,
@@ -33,8 +36,22 @@ from .models import (
     Log,
 )
 from .openlibrary import lookup_by_isbn
+from .pagination import cursor_scope, keyset_page, page_query_string, page_size_from, ranked_page
+from .query_language import And, Field, Not, Or, QuerySyntaxError, Term, compile_node, parse, split_query
 from .presenters.books import ROLE_MANAGE_LOANS, present_book, present_books
+from .services.circulation import (
+    BATCH_ACTIONS,
+    claim_available_copy,
+    claim_open_loan,
+    lock_rows,
+    process_circulation_batch,
+)
 from .services.events import log_product_event
+from .services.inventory import (
+    adjust_available_quantity,
+    grant_ready_hold,
+    transition_copy,
+)
 from .services.homepage import build_homepage_context
 from .search import search_books
 
@@ -43,6 +60,9 @@ logger = logging.getLogger(__name__)
 CHECKOUT_TEMPLATE = "core/checkout.html"
 CHECKIN_TEMPLATE = "core/checkin.html"
 SEARCH_RESULTS_TEMPLATE = "core/search_results.html"
+SEARCH_RESULTS_BATCH_TEMPLATE = "core/search_results_batch.html"
+SEARCH_RESULTS_MORE_TEMPLATE = "core/search_results_more.html"
+SEARCH_STREAM_SLOT = "<!-- search-results-stream -->"
 BOOK_PAGE_TEMPLATE = "core/book_page.html"
 RESOURCE_TEMPLATE = "core/resource.html"
 ADVANCED_SEARCH_TEMPLATE = "core/advanced_search_results.html"
@@ -62,17 +82,21 @@ ADVANCED_SEARCH_FIELDS = {
     "genre": "genre",
     "audience": "audience",
 }
+# Builder operators map onto query-language match kinds, so both compile to the same lookups;
+# "contains" stays a substring match, as it always was in the builder.
 ADVANCED_SEARCH_OPERATORS = {
-    "contains",
-    "icontains",
-    "exact",
-    "iexact",
-    "startswith",
-    "istartswith",
-    "endswith",
-    "iendswith",
+    "contains": "contains",
+    "icontains": "contains",
+    "exact": "exact",
+    "iexact": "exact",
+    "startswith": "prefix",
+    "istartswith": "prefix",
+    "endswith": "suffix",
+    "iendswith": "suffix",
 }
 LOAN_PERIOD_DAYS = 21
+AUTOCOMPLETE_LIMIT = 8
+AUTOCOMPLETE_MAX_LIMIT = 20
 
 
 def auth0_is_enabled():
@@ -280,46 +304,15 @@ def extract_user_identity(request):
     return first_name, last_name, email
 
 
-def ensure_copy_records(book):
-    existing = book.copies.count()
-    if existing >= book.quantity:
-        return
-
-    for index in range(existing + 1, book.quantity + 1):
-        BookCopy.objects.create(
-            inventory=book,
-            barcode=f"LIB-{book.isbn}-{index:04d}",
-        )
-
-
-def sync_inventory_counts(book):
-    total_copies = book.copies.count()
-    available_copies = book.copies.filter(status=CopyStatus.AVAILABLE).count()
-    desired_quantity = max(book.quantity, total_copies)
-
-    Bookinventory.objects.filter(pk=book.pk).update(
-        quantity=desired_quantity,
-        available_quantity=available_copies,
-    )
-    book.refresh_from_db(fields=["quantity", "available_quantity"])
-
-
-def grant_ready_hold(book):
-    ready_hold = book.holds.filter(status=HoldStatus.PENDING).order_by("requested_at").first()
-    available_copy = book.copies.filter(status=CopyStatus.AVAILABLE).order_by("barcode").first()
-    if not ready_hold or not available_copy:
-        return
+def checkout(request, isbn):
+    return checkout_view(request, isbn=isbn)
 
-    ready_hold.status = HoldStatus.READY
-    ready_hold.expires_at = timezone.now() + timedelta(days=3)
-    ready_hold.save(update_fields=["status", "expires_at"])
 
-    available_copy.status = CopyStatus.ON_HOLD
-    available_copy.due_back_date = ready_hold.expires_at.date()
-    available_copy.save(update_fields=["status", "due_back_date"])
+def checkout_copy(request, barcode):
+    return checkout_view(request, barcode=barcode)
 
 
-def checkout(request, isbn):
+def checkout_view(request, isbn=None, barcode=None):
     if request.method == "POST":
         first_name, last_name, email = extract_user_identity(request)
 
@@ -343,20 +336,25 @@ def checkout(request, isbn):
 
         try:
             with transaction.atomic():
-                book = Bookinventory.objects.select_for_update().get(isbn=isbn)
-                ensure_copy_records(book)
-                available_copy = book.copies.select_for_update().filter(
-                    status=CopyStatus.AVAILABLE
-                ).order_by("barcode").first()
+                # Only the copy row is locked; the title's counters move with an F() update below.
+                if barcode:
+                    available_copy = lock_rows(
+                        BookCopy.objects.filter(barcode=barcode).select_related("inventory")
+                    ).get()
+                    book = available_copy.inventory
+                    isbn = book.isbn
+                    if available_copy.status != CopyStatus.AVAILABLE:
+                        available_copy = None
+                else:
+                    book = Bookinventory.objects.get(isbn=isbn)
+                    available_copy = claim_available_copy(book)
 
                 if not available_copy:
-                    sync_inventory_counts(book)
-                    messages.error(request, "No copies available to check out.")
-                    return render(
-                        request,
-                        CHECKOUT_TEMPLATE,
-                        {"error_message": "No copies available to check out."},
+                    error_message = (
+                        "This copy is not available to check out." if barcode else "No copies available to check out."
                     )
+                    messages.error(request, error_message)
+                    return render(request, CHECKOUT_TEMPLATE, {"error_message": error_message})
 
                 if request.user.is_authenticated and hasattr(request.user, "library_profile"):
                     active_loans = request.user.loans.filter(
@@ -397,13 +395,13 @@ def checkout(request, isbn):
                     borrowed_time=timestamp.time().replace(microsecond=0),
                 )
 
-                available_copy.status = CopyStatus.ON_LOAN
-                available_copy.due_back_date = due_at.date()
-                available_copy.last_circulated_at = timestamp
-                available_copy.save(
-                    update_fields=["status", "due_back_date", "last_circulated_at"]
+                delta = transition_copy(
+                    available_copy,
+                    CopyStatus.ON_LOAN,
+                    due_back_date=due_at.date(),
+                    last_circulated_at=timestamp,
                 )
-                sync_inventory_counts(book)
+                adjust_available_quantity(book, delta)
 
                 logger.info("Book %s checked out by %s", isbn, email)
                 log_product_event(
@@ -419,7 +417,7 @@ def checkout(request, isbn):
                 return redirect("index")
 
         except ObjectDoesNotExist:
-            logger.warning("Checkout attempted for non-existent ISBN: %s", isbn)
+            logger.warning("Checkout attempted for non-existent ISBN or barcode: %s", isbn or barcode)
             messages.error(request, "Book not found in inventory.")
             return render(
                 request,
@@ -450,8 +448,9 @@ def checkout(request, isbn):
 def checkin(request):
     if request.method == "POST":
         isbn = request.POST.get("isbn", "").strip()
+        barcode = request.POST.get("barcode", "").strip()
 
-        if not isbn:
+        if not isbn and not barcode:
             messages.error(request, "Please provide an ISBN.")
             return render(
                 request,
@@ -461,16 +460,19 @@ def checkin(request):
 
         try:
             with transaction.atomic():
-                book = Bookinventory.objects.select_for_update().get(isbn=isbn)
+                # A barcode names the exact loan; an ISBN takes the oldest loan no other desk is returning.
+                if barcode:
+                    loan = claim_open_loan(barcode=barcode)
+                    book = loan.inventory if loan else BookCopy.objects.select_related("inventory").get(
+                        barcode=barcode
+                    ).inventory
+                    isbn = book.isbn
+                else:
+                    book = Bookinventory.objects.get(isbn=isbn)
+                    loan = claim_open_loan(book=book)
                 expected_checked_out = book.available_quantity < book.quantity
-                ensure_copy_records(book)
-                loan = book.loans.select_for_update().filter(
-                    status__in=[LoanStatus.ACTIVE, LoanStatus.OVERDUE],
-                    returned_at__isnull=True,
-                ).select_related("copy").order_by("checked_out_at").first()
 
                 if not loan:
-                    sync_inventory_counts(book)
                     if expected_checked_out:
                         messages.error(request, "No check-out record found for this book.")
                         return render(
@@ -490,10 +492,12 @@ def checkin(request):
                 loan.returned_at = timestamp
                 loan.save(update_fields=["status", "returned_at"])
 
-                loan.copy.status = CopyStatus.AVAILABLE
-                loan.copy.due_back_date = None
-                loan.copy.last_circulated_at = timestamp
-                loan.copy.save(update_fields=["status", "due_back_date", "last_circulated_at"])
+                delta = transition_copy(
+                    loan.copy,
+                    CopyStatus.AVAILABLE,
+                    due_back_date=None,
+                    last_circulated_at=timestamp,
+                )
 
                 log_entry = Log.objects.filter(
                     loan=loan,
@@ -510,16 +514,16 @@ def checkin(request):
                     log_entry.returned_time = timestamp.time().replace(microsecond=0)
                     log_entry.save(update_fields=["returned_date", "returned_time"])
 
-                sync_inventory_counts(book)
-                grant_ready_hold(book)
-                sync_inventory_counts(book)
+                # The return and any hold it fills net out to a single counter update.
+                delta += grant_ready_hold(book, available_copy=loan.copy)
+                adjust_available_quantity(book, delta)
 
                 logger.info("Book %s checked in", isbn)
                 messages.success(request, "Book checked in successfully.")
                 return redirect("index")
 
         except ObjectDoesNotExist:
-            logger.warning("Checkin attempted for non-existent ISBN: %s", isbn)
+            logger.warning("Checkin attempted for non-existent ISBN or barcode: %s", isbn or barcode)
             messages.error(request, "Book not found in inventory.")
             return render(
                 request,
@@ -550,10 +554,10 @@ class AdvancedSearchResults(ListView):
         operator = self.request.GET.getlist("operator[]")
         search_term = self.request.GET.getlist("search_term[]")
         logical_operator = self.request.GET.getlist("logical_operator[]")
-        filter_query = Q()
+        expression = self.request.GET.get("q", "").strip()
+        nodes = []
 
         if search_type in ["everything", "catalog"] and field:
-            queries = []
             for i in range(len(field)):
                 if i >= len(search_term) or not search_term[i]:
                     continue
@@ -562,32 +566,32 @@ class AdvancedSearchResults(ListView):
                 if not field_name:
                     continue
 
+                logical = logical_operator[len(nodes) - 1] if 0 < len(nodes) <= len(logical_operator) else "OR"
                 if field_name == "any_field":
-                    sub_query = (
-                        Q(title__icontains=search_term[i])
-                        | Q(author__icontains=search_term[i])
-                        | Q(publisher__icontains=search_term[i])
-                        | Q(isbn__icontains=search_term[i])
-                        | Q(description__icontains=search_term[i])
-                        | Q(genre__icontains=search_term[i])
-                    )
-                    queries.append(sub_query)
+                    node = Term(search_term[i])
                 else:
                     operator_name = operator[i] if i < len(operator) else ""
-                    if operator_name not in ADVANCED_SEARCH_OPERATORS:
-                        operator_name = "icontains"
-                    queries.append(Q(**{f"{field_name}__{operator_name}": search_term[i]}))
-
-            if queries:
-                filter_query = queries[0]
-                for i in range(1, len(queries)):
-                    logical = logical_operator[i - 1] if i - 1 < len(logical_operator) else "OR"
-                    if logical == "AND":
-                        filter_query &= queries[i]
-                    elif logical == "NOT":
-                        filter_query &= ~queries[i]
-                    else:
-                        filter_query |= queries[i]
+                    node = Field(field_name, search_term[i], ADVANCED_SEARCH_OPERATORS.get(operator_name, "text"))
+                nodes.append((logical, node))
+
+        # Builder rows fold left to right into the same AST the query language parses to.
+        tree = None
+        for logical, node in nodes:
+            if tree is None:
+                tree = node
+            elif logical == "AND":
+                tree = And((tree, node))
+            elif logical == "NOT":
+                tree = And((tree, Not(node)))
+            else:
+                tree = Or((tree, node))
+        if expression:
+            try:
+                parsed = parse(expression)
+            except QuerySyntaxError:
+                parsed = Term(expression)
+            tree = parsed if tree is None else And((tree, parsed))
+        filter_query = compile_node(tree)
 
         published_date_start_filter = self.request.GET.get("published_date_start", "")
         published_date_end_filter = self.request.GET.get("published_date_end", "")
@@ -600,6 +604,7 @@ class AdvancedSearchResults(ListView):
         if any(
             [
                 search_type,
+                expression,
                 field,
                 operator,
                 search_term,
@@ -614,11 +619,51 @@ class AdvancedSearchResults(ListView):
 
         return queryset.order_by("title")
 
+    def get_context_data(self, **kwargs):
+        criteria = {key: self.request.GET.getlist(key) for key in self.request.GET if key not in ("cursor", "page_size")}
+        page = keyset_page(
+            self.object_list,
+            self.request.GET.get("cursor"),
+            page_size_from(self.request.GET.get("page_size")),
+            scope=cursor_scope(criteria),
+        )
+        context = super().get_context_data(object_list=page.items, **kwargs)
+        context["result_count"] = self.object_list.count() if page.items else 0
+        context["next_page_query"] = page_query_string(self.request, page.next_cursor) if page.has_next else ""
+        return context
+
 
 def resource_view(request):
     return render(request, RESOURCE_TEMPLATE)
 
 
+FACET_FILTER_PARAMS = {
+    "genre": "genre",
+    "audience": "audience",
+    "language": "language",
+    "availability": "available_quantity",
+}
+
+
+def facet_links(request, facets):
+    # Each facet value links to the current search with that filter toggled, starting again from page one.
+    links = {}
+    for facet, entries in facets.items():
+        param = FACET_FILTER_PARAMS[facet]
+        current = request.GET.get(param, "").strip().lower()
+        links[facet] = []
+        for entry in entries:
+            params = request.GET.copy()
+            params.pop("cursor", None)
+            selected = current == str(entry["value"]).lower()
+            if selected:
+                params.pop(param, None)
+            else:
+                params[param] = entry["value"]
+            links[facet].append({**entry, "selected": selected, "query_string": params.urlencode()})
+    return links
+
+
 def search_results(request):
     query = request.GET.get("q", "").strip()
     filters = {
@@ -631,35 +676,52 @@ def search_results(request):
         "isbn": request.GET.get("isbn", "") or request.GET.get("ISBN", ""),
         "genre": request.GET.get("genre", ""),
         "audience": request.GET.get("audience", ""),
+        "language": request.GET.get("language", ""),
     }
+    # Field syntax (author:tolkien -dragons year:2000..2010) becomes a filter; the rest is ranked text.
+    text, filters["expression"] = split_query(query)
     pipeline = run_search_pipeline(
-        query=query,
+        query=text,
         reading_goal=request.GET.get("reading_goal", "reading"),
         filters=filters,
         limit=200,
+        include_facets=True,
     )
     response = pipeline.response
-    results_queryset = response.queryset
-    active_loans = Loan.objects.filter(
-        inventory_id__in=results_queryset.values("id"),
-        status__in=[LoanStatus.ACTIVE, LoanStatus.OVERDUE],
-        returned_at__isnull=True,
+    cursor = request.GET.get("cursor")
+    result_count = len(response.ranked_ids) if text else response.queryset.count()
+    streaming = bool(result_count) and (
+        request.GET.get("stream") == "1" or getattr(settings, "SEARCH_STREAM_RESULTS", False)
     )
-    borrowed_book_ids = list(active_loans.values_list("inventory_id", flat=True))
-    results = present_books(results_queryset[:200])
+    if streaming:
+        page, results, active_loans, borrowed_book_ids = None, [], Loan.objects.none(), []
+    else:
+        page = search_page(response, text, pipeline.filters, cursor, page_size_from(request.GET.get("page_size")))
+        active_loans = Loan.objects.filter(
+            inventory_id__in=[book.id for book in page.items],
+            status__in=[LoanStatus.ACTIVE, LoanStatus.OVERDUE],
+            returned_at__isnull=True,
+        )
+        borrowed_book_ids = list(active_loans.values_list("inventory_id", flat=True))
+        results = present_books(page.items)
     log_product_event(
         "search_submitted",
         request=request,
         query_text=query,
         reading_goal=pipeline.reading_goal,
         metadata={
-            "result_count": len(results),
+            "result_count": result_count,
             "strategy": response.strategy,
             "latency_ms": round(response.latency_ms, 2),
+            "corrected_query": response.corrected_query,
+            "winning_branch": response.winning_branch,
+            "facet_latency_ms": round(response.facet_latency_ms, 2),
+            "plan": response.plan.as_dict() if response.plan else None,
+            "streamed": streaming,
             "filters": {key: value for key, value in pipeline.filters.items() if value},
         },
     )
-    if query and not results:
+    if query and not results and not streaming:
         log_product_event(
             "search_zero_results",
             request=request,
@@ -669,8 +731,10 @@ def search_results(request):
 
     context = {
         "results": results,
-        "result_count": len(results),
+        "result_count": result_count,
+        "next_page_query": page_query_string(request, page.next_cursor) if page and page.has_next else "",
         "query": query,
+        "corrected_query": response.corrected_query,
         "published_date_start_filter": pipeline.filters["published_date_start"],
         "published_date_end_filter": pipeline.filters["published_date_end"],
         "available_quantity_filter": pipeline.filters["available_quantity"],
@@ -680,14 +744,55 @@ def search_results(request):
         "isbn": pipeline.filters["isbn"],
         "genre": pipeline.filters["genre"],
         "audience": pipeline.filters["audience"],
+        "language": pipeline.filters["language"],
+        "facets": facet_links(request, response.facets),
         "borrowed_books": active_loans,
         "borrowed_book_ids": borrowed_book_ids,
         "reading_goal": pipeline.reading_goal,
-        "search_rescue": pipeline.rescue if query and not results else None,
+        "search_rescue": pipeline.rescue if query and not results and not streaming else None,
     }
+    if streaming:
+        return stream_search_results(request, context, response, text, pipeline.filters, cursor)
     return render(request, SEARCH_RESULTS_TEMPLATE, context)
 
 
+def search_page(response, query, filters, cursor, page_size):
+    scope = cursor_scope(query, {key: value for key, value in filters.items() if value})
+    if query:
+        return ranked_page(Bookinventory.objects.all(), response.ranked_ids, cursor, page_size, scope=scope)
+    return keyset_page(response.queryset, cursor, page_size, scope=scope)
+
+
+def stream_search_results(request, context, response, query, filters, cursor):
+    # The page shell is rendered once and split around the results slot; cards are then hydrated,
+    # presented and sent one batch at a time, so neither first byte nor memory waits on the whole set.
+    shell = render_to_string(
+        SEARCH_RESULTS_TEMPLATE,
+        {**context, "streaming": True, "stream_slot": mark_safe(SEARCH_STREAM_SLOT)},
+        request=request,
+    )
+    head, tail = shell.split(SEARCH_STREAM_SLOT, 1)
+    batch_size = getattr(settings, "SEARCH_STREAM_BATCH_SIZE", 24)
+    max_results = getattr(settings, "SEARCH_STREAM_MAX_RESULTS", 200)
+
+    def chunks():
+        yield head
+        page_cursor, has_next, streamed = cursor, True, 0
+        while has_next and streamed < max_results:
+            page = search_page(response, query, filters, page_cursor, batch_size)
+            if page.items:
+                yield render_to_string(
+                    SEARCH_RESULTS_BATCH_TEMPLATE, {"results": present_books(page.items)}, request=request
+                )
+            streamed += len(page.items)
+            page_cursor, has_next = page.next_cursor, page.has_next
+        next_page_query = page_query_string(request, page_cursor) if has_next else ""
+        yield render_to_string(SEARCH_RESULTS_MORE_TEMPLATE, {"next_page_query": next_page_query}, request=request)
+        yield tail
+
+    return StreamingHttpResponse(chunks(), content_type="text/html; charset=utf-8")
+
+
 def book_page(request, book_id):
     book_model = get_object_or_404(Bookinventory.objects.prefetch_related("copies", "holds"), id=book_id)
     book = present_book(book_model)
@@ -833,6 +938,72 @@ def isbn_lookup(request):
     )
 
 
+def autocomplete(request):
+    prefix = request.GET.get("q", "").strip()
+    if not prefix:
+        return JsonResponse({"query": "", "completions": []})
+
+    try:
+        limit = max(1, min(int(request.GET.get("limit", AUTOCOMPLETE_LIMIT)), AUTOCOMPLETE_MAX_LIMIT))
+    except ValueError:
+        limit = AUTOCOMPLETE_LIMIT
+    # Served entirely from the in-process prefix index: no query and no product event per keystroke.
+    completions = []
+    for completion in get_autocomplete().complete(prefix, limit=limit):
+        if completion["type"] == "title":
+            url = reverse("book_page", args=[completion["book_id"]])
+        else:
+            url = f"{reverse('search_results')}?{urlencode({'q': completion['label']})}"
+        completions.append({**completion, "url": url})
+    return JsonResponse({"query": prefix, "completions": completions})
+
+
+def circulation_batch(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "POST required."}, status=405)
+    role = getattr(getattr(request.user, "library_profile", None), "role", LibraryRole.PATRON)
+    if not request.user.is_authenticated or not (
+        role in ROLE_MANAGE_LOANS or request.user.has_perm("core.manage_loans")
+    ):
+        return JsonResponse({"error": "Circulation staff access required."}, status=403)
+
+    try:
+        payload = json.loads(request.body.decode("utf-8"))
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON payload."}, status=400)
+
+    action = str(payload.get("action", "")).strip().lower()
+    items = payload.get("items")
+    if action not in BATCH_ACTIONS:
+        return JsonResponse({"error": "Action must be checkout or checkin."}, status=400)
+    if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+        return JsonResponse({"error": "Items must be a non-empty list of objects."}, status=400)
+    max_items = getattr(settings, "CIRCULATION_BATCH_MAX_ITEMS", 500)
+    if len(items) > max_items:
+        return JsonResponse({"error": f"Batches are limited to {max_items} items."}, status=400)
+    try:
+        chunk_size = int(payload.get("chunk_size", getattr(settings, "CIRCULATION_BATCH_CHUNK_SIZE", 0)))
+    except (TypeError, ValueError):
+        return JsonResponse({"error": "chunk_size must be an integer."}, status=400)
+
+    results = process_circulation_batch(
+        action,
+        items,
+        borrower=payload.get("borrower") if isinstance(payload.get("borrower"), dict) else {},
+        processed_by=request.user,
+        chunk_size=chunk_size,
+        loan_period_days=LOAN_PERIOD_DAYS,
+    )
+    succeeded = sum(1 for result in results if result["status"] == "ok")
+    failed = len(results) - succeeded
+    log_product_event(
+        f"batch_{action}_completed",
+        request=request,
+        metadata={"items": len(items), "succeeded": succeeded, "failed": failed},
+    )
+    return JsonResponse({"action": action, "succeeded": succeeded, "failed": failed, "results": results})
+
+
 def ai_concierge(request):
     if request.method != "POST":
         return JsonResponse({"error": "POST required."}, status=405)